@@ -1,11 +1,18 @@
+import os
+
+import click
 from flask import Flask, render_template, request
 from books.books import all_books
+from books.catalog import Catalog
 from config import TITLES, BOOK_CATEGORIES, UI_CONFIG, MESSAGES
 
 app = Flask(__name__)
 
 app.static_folder = 'assets'
 
+# Built once at startup; requests only read from it
+catalog = Catalog(all_books, BOOK_CATEGORIES, UI_CONFIG['max_description_preview'])
+
 @app.context_processor
 def inject_config():
     """Make configuration variables available in all templates"""
@@ -18,42 +25,49 @@ def inject_config():
         }
     }
 
+def render_titles(category, **extra):
+    """Render the book titles page for a category"""
+    books = catalog.page(category, limit=UI_CONFIG['books_per_page'])
+    return render_template('bookTitles.html', 
+                         books=books, 
+                         book_count=len(catalog.view(category)),
+                         selected_category=category,
+                         categories=BOOK_CATEGORIES,
+                         **extra)
+
+def render_details(book_id):
+    """Render the details page for a book"""
+    book = catalog.get(book_id)
+    if book is not None:
+        return render_template('bookDetails.html', book=book)
+    return render_template('bookDetails.html', 
+                         book=None, 
+                         error_message=MESSAGES['book_not_found'])
+
 @app.route('/', methods=['GET', 'POST'])
 def book_titles():
     """Display filtered and sorted book titles with previews"""
-    category_filter = request.form.get('category', 'All')
-    
-    filtered_books = all_books
-    if category_filter != 'All':
-        filtered_books = [book for book in all_books if category_filter in book['category']]
-
-    sorted_books = sorted(filtered_books, key=lambda x: x['title'])
-
-    for i, book in enumerate(sorted_books):
-        original_index = all_books.index(book)
-        book['original_index'] = original_index
-        
-        paragraphs = book['description']
-        max_preview = UI_CONFIG['max_description_preview']
-        if len(paragraphs) > 1 and max_preview >= 2:
-            book['description_preview'] = f"{paragraphs[0]}<br><br>{paragraphs[-1]}"
-        else:
-            book['description_preview'] = paragraphs[0] if paragraphs else ""
+    return render_titles(request.form.get('category', 'All'))
 
-    return render_template('bookTitles.html', 
-                         books=sorted_books, 
-                         book_count=len(sorted_books),
-                         selected_category=category_filter,
-                         categories=BOOK_CATEGORIES)
+@app.route('/category/<category>')
+def category_titles(category):
+    """Display the book titles in one category (linked from the static export)"""
+    return render_titles(category)
 
 @app.route('/book/<int:book_id>')
 def book_details(book_id):
     """Display detailed view of a specific book"""
-    try:
-        book = all_books[book_id]
-        return render_template('bookDetails.html', book=book)
-    except IndexError:
-        return render_template('bookDetails.html', 
-                             book=None, 
-                             error_message=MESSAGES['book_not_found'])
+    return render_details(book_id)
+
+@app.cli.command('export-static')
+@click.option('--output', default=None, help='Directory to write the site to')
+@click.option('--workers', type=int, default=None, help='Worker processes (defaults to the CPU count)')
+def export_static(output, workers):
+    """Pre-render the catalog into static HTML with fingerprinted assets"""
+    from export import export_site
 
+    output = output or os.path.join(app.instance_path, 'static-site')
+    pages, manifest = export_site(app, catalog, output, workers=workers)
+    for original, hashed in sorted(manifest.items()):
+        click.echo(f"{original} -> {hashed}")
+    click.echo(f"Exported {pages} pages to {output}")
@@ -0,0 +1,92 @@
+from types import MappingProxyType
+
+
+def freeze_book(book_id, book, max_preview):
+    """
+    Build the read-only record served for one book. List fields become
+    tuples and the description preview is rendered once, so requests never
+    write to the shared catalog.
+    """
+    paragraphs = tuple(book['description'])
+    if len(paragraphs) > 1 and max_preview >= 2:
+        preview = f"{paragraphs[0]}<br><br>{paragraphs[-1]}"
+    else:
+        preview = paragraphs[0] if paragraphs else ""
+
+    record = dict(book)
+    record.update({
+        'id': book_id,
+        'genres': tuple(book['genres']),
+        'authors': tuple(book['authors']),
+        'description': paragraphs,
+        'description_preview': preview
+    })
+    return MappingProxyType(record)
+
+
+class Catalog:
+    """
+    Immutable in-memory catalog built once at startup.
+
+    Each book keeps its position in `all_books` as a stable id (the one used
+    in /book/<id> URLs), and every category offered in the filter has a
+    title-sorted view prepared up front. Serving a page is then a dict lookup
+    and a slice.
+    """
+
+    def __init__(self, books, categories, max_preview):
+        self._books = tuple(freeze_book(book_id, book, max_preview)
+                            for book_id, book in enumerate(books))
+        by_title = tuple(sorted(self._books, key=lambda book: book['title']))
+
+        views = {}
+        for value, _ in categories:
+            if value == 'All':
+                views[value] = by_title
+            else:
+                views[value] = tuple(book for book in by_title if value in book['category'])
+        self._views = MappingProxyType(views)
+
+    def __len__(self):
+        return len(self._books)
+
+    def get(self, book_id):
+        """
+        Return the book with the given id.
+
+        Args:
+            book_id: Stable id of the book
+
+        Returns:
+            The read-only book record, or None if there is no such book
+        """
+        if 0 <= book_id < len(self._books):
+            return self._books[book_id]
+        return None
+
+    def view(self, category='All'):
+        """
+        Return the title-sorted books in a category.
+
+        Args:
+            category: A category value from BOOK_CATEGORIES
+
+        Returns:
+            A tuple of book records (empty for an unknown category)
+        """
+        return self._views.get(category, ())
+
+    def page(self, category='All', start=0, limit=None):
+        """
+        Return a slice of a category view.
+
+        Args:
+            category: A category value from BOOK_CATEGORIES
+            start: Index of the first book to return
+            limit: Maximum number of books, or None for all of them
+
+        Returns:
+            A tuple of book records
+        """
+        books = self.view(category)
+        return books[start:None if limit is None else start + limit]
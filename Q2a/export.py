@@ -0,0 +1,135 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import url_for as flask_url_for
+from config import BOOK_CATEGORIES
+
+# original filename (relative to the static folder) -> fingerprinted filename
+_manifest = {}
+
+
+def _write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as handle:
+        handle.write(data)
+    os.replace(tmp_path, path)
+
+
+def fingerprint_assets(static_folder, output_dir, asset_url):
+    """
+    Copy every static file into output_dir under a content-hashed name and
+    return the filename manifest. The names change whenever the content
+    does, so a static server can cache them forever.
+
+    Args:
+        static_folder: Folder the app serves static files from
+        output_dir: Root directory of the static site
+        asset_url: Callable mapping a filename to its static URL
+    """
+    manifest = {}
+    for folder, _, files in os.walk(static_folder):
+        for name in files:
+            source = os.path.join(folder, name)
+            relative = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as handle:
+                data = handle.read()
+
+            root, ext = os.path.splitext(relative)
+            hashed = f"{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+            _write_file(os.path.join(output_dir, *asset_url(hashed).strip('/').split('/')), data)
+            manifest[relative] = hashed
+    return manifest
+
+
+def export_url_for(endpoint, **values):
+    """url_for that points static files at their fingerprinted copies"""
+    if endpoint == 'static' and values.get('filename') in _manifest:
+        values['filename'] = _manifest[values['filename']]
+    return flask_url_for(endpoint, **values)
+
+
+def page_url(kind, key):
+    """URL of a titles page (by category) or a details page (by book id)"""
+    if kind == 'details':
+        return flask_url_for('book_details', book_id=key)
+    if key == 'All':
+        return flask_url_for('book_titles')
+    return flask_url_for('category_titles', category=key)
+
+
+def page_file(output_dir, url):
+    """Map a page URL to the index.html a static server will serve for it"""
+    parts = [part for part in url.split('/') if part]
+    return os.path.join(output_dir, *parts, 'index.html')
+
+
+def _init_worker(manifest):
+    global _manifest
+    from app import app
+
+    _manifest = manifest
+    app.jinja_env.globals['url_for'] = export_url_for
+
+
+def render_pages(output_dir, jobs):
+    """
+    Render a batch of pages and write them under output_dir.
+
+    Args:
+        output_dir: Root directory of the static site
+        jobs: List of ('titles', category) or ('details', book_id) tuples
+
+    Returns:
+        The number of pages written
+    """
+    from app import app, render_titles, render_details
+    with app.test_request_context():
+        category_links = {value: page_url('titles', value) for value, _ in BOOK_CATEGORIES}
+        urls = [page_url(kind, key) for kind, key in jobs]
+
+    for (kind, key), url in zip(jobs, urls):
+        with app.test_request_context(url):
+            if kind == 'titles':
+                html = render_titles(key, category_links=category_links)
+            else:
+                html = render_details(key)
+        _write_file(page_file(output_dir, url), html.encode('utf-8'))
+    return len(jobs)
+
+
+def export_site(app, catalog, output_dir, workers=None, chunk_size=50):
+    """
+    Pre-render the catalog into a directory of static HTML.
+
+    Every category page and every book details page is written as
+    <url>/index.html, and static assets are copied under fingerprinted names.
+    Pages are rendered in parallel across a process pool.
+
+    Args:
+        app: The Flask application
+        catalog: The Catalog to export
+        output_dir: Directory to write the site to
+        workers: Number of worker processes (defaults to the CPU count)
+        chunk_size: Pages rendered per task
+
+    Returns:
+        A tuple of (pages written, asset manifest)
+    """
+    with app.test_request_context():
+        manifest = fingerprint_assets(app.static_folder, output_dir,
+                                      lambda filename: flask_url_for('static', filename=filename))
+
+    jobs = [('titles', value) for value, _ in BOOK_CATEGORIES]
+    jobs += [('details', book_id) for book_id in range(len(catalog))]
+    chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+
+    if workers == 1 or len(chunks) == 1:
+        _init_worker(manifest)
+        written = sum(render_pages(output_dir, chunk) for chunk in chunks)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(manifest,)) as pool:
+            written = sum(pool.map(render_pages, [output_dir] * len(chunks), chunks))
+    return written, manifest
@@ -1,10 +1,21 @@
-from flask import Flask
+from flask import Flask, flash, g, redirect, request, url_for
 from flask_mongoengine import MongoEngine, Document
-from flask_login import LoginManager
+from flask_login import LoginManager, login_url
+from werkzeug.middleware.proxy_fix import ProxyFix
+from app.config import mongodb_settings, TRUSTED_PROXIES, MESSAGES
+from app.services.metrics import pool_listener
 
 def create_app():
     app = Flask(__name__)
-    app.config['MONGODB_SETTINGS'] = { 'db': 'library', 'host': 'localhost', 'port': 27017 }
+    if TRUSTED_PROXIES:
+        # Take the client address and scheme from the proxy's headers
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES)
+    # Pool size, timeouts, write concern and read preference come from the
+    # APP_ENV environment profile in config.py (overridable with MONGODB_* variables)
+    settings = mongodb_settings()
+    app.config['CATALOG_READ_PREFERENCE'] = settings.pop('catalogReadPreference', 'primary')
+    settings['event_listeners'] = [pool_listener]
+    app.config['MONGODB_SETTINGS'] = settings
     app.static_folder = 'assets'
     db = MongoEngine(app)
     app.config['SECRET_KEY'] = 'isaaclim009'
@@ -21,6 +32,25 @@ app, db, login_manager = create_app()
 
 from app.models.users import User
 
+from app.services.circuit_breaker import db_breaker, DatabaseUnavailable
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.getUserById(user_id)
\ No newline at end of file
+    # While MongoDB is unavailable visitors are treated as signed out so the
+    # (possibly stale) catalog can still be served; the outage is noted so
+    # member-only pages can report it rather than ask them to log in
+    try:
+        from app.repositories import repository
+        return db_breaker.call(repository.get_user_by_id, user_id)
+    except DatabaseUnavailable:
+        g.database_unavailable = True
+        return None
+
+@login_manager.unauthorized_handler
+def unauthorized():
+    """Send anonymous visitors to the login page, unless their session could not be loaded"""
+    if g.get('database_unavailable'):
+        flash(MESSAGES['database_unavailable'], 'error')
+        return redirect(url_for('books.book_titles'))
+    flash(login_manager.login_message, login_manager.login_message_category)
+    return redirect(login_url(login_manager.login_view, next_url=request.url))
\ No newline at end of file
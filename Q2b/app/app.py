@@ -1,17 +1,36 @@
+import os
 from app import app, db
 from app.models.books import Book
-from app.config import TITLES, BOOK_CATEGORIES, UI_CONFIG, MESSAGES
+from app.models.catalog import CatalogState
+from app.config import TITLES, BOOK_CATEGORIES, UI_CONFIG, MESSAGES, AVAILABILITY_EVENTS, STORAGE, PREFORK
 from flask import render_template
-from app.models.users import User
+from app.repositories import repository
+from books.books import all_books
+from app.services.catalog_snapshot import catalog_snapshot
+from app.services.availability_events import watch_availability
 
 # Import and register the books controller (Blueprint)
 from app.controllers.booksController import books
 from app.controllers.authentication import auth
 from app.controllers.loansController import loans
+from app.controllers.coversController import covers
+from app.controllers.apiController import api, api_v1
+from app.controllers.adminController import admin
 
 app.register_blueprint(books)
 app.register_blueprint(auth)
 app.register_blueprint(loans)
+app.register_blueprint(covers)
+app.register_blueprint(api)
+app.register_blueprint(api_v1)
+app.register_blueprint(admin)
+
+# Serve static files from fingerprinted, precompressed copies
+from app.services.assets import init_assets
+init_assets(app)
+
+# Register flask CLI commands (e.g. `flask --app app.app warm-covers`)
+from app import commands
 
 # Make config variables available in all templates
 @app.context_processor
@@ -29,16 +48,36 @@ def inject_config():
 # Automatically populate the book database on startup
 try:
     with app.app_context():
-        Book.bookDatabase()
+        if STORAGE['backend'] == 'memory':
+            # The in-memory catalog starts from the bundled books on every run
+            repository.load_books(all_books)
+        else:
+            Book.bookDatabase()
+            CatalogState.rebuild_facets()
+            Book.load_autocomplete_index()
+
+            # Seed the fallback snapshot used while MongoDB is unavailable
+            rows = list(Book.catalog().order_by('title').as_pymongo())
+            if PREFORK['enabled']:
+                # Pack it into a memory-mapped file the forked workers share
+                path = PREFORK['shared_catalog_path'] or os.path.join(app.instance_path, 'shared-catalog.bin')
+                catalog_snapshot.preload_shared(path, rows, CatalogState.get_state())
+            else:
+                catalog_snapshot.replace(rows, CatalogState.get_state())
+
+            # With several workers, live availability updates come from a change stream
+            # (pre-forked workers start their own watcher, see gunicorn.conf.py)
+            if AVAILABILITY_EVENTS['source'] == 'change_stream' and not PREFORK['enabled']:
+                watch_availability(Book._get_collection())
 
         # Create admin user
-        if not User.getUser('admin@lib.sg'):
-            User.createUser('admin@lib.sg', 'Admin', '12345', is_admin=True)
+        if not repository.get_user('admin@lib.sg'):
+            repository.create_user('admin@lib.sg', 'Admin', '12345', is_admin=True)
             print("Created admin user: admin@lib.sg")
 
         # Create regular user
-        if not User.getUser('poh@lib.sg'):
-            User.createUser('poh@lib.sg', 'Peter Oh', '12345', is_admin=False)
+        if not repository.get_user('poh@lib.sg'):
+            repository.create_user('poh@lib.sg', 'Peter Oh', '12345', is_admin=False)
             print("Created regular user: poh@lib.sg")
 except Exception as e:
     print(f"Warning: Could not initialize database on startup: {e}")
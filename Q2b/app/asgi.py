@@ -0,0 +1,212 @@
+"""
+ASGI entry point with async versions of the catalog, book details and loans pages.
+
+    uvicorn app.asgi:application --workers 2
+
+GET requests for `/`, `/book/<id>` and `/loans` are answered by coroutines
+that query MongoDB through Motor, so a slow query no longer holds a worker
+thread. Everything else (forms, loan actions, login) is passed through to
+the regular Flask app.
+"""
+import asyncio
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import g, make_response, redirect, render_template, request, session, url_for
+from flask_login import current_user
+from werkzeug.routing import Map, Rule
+from werkzeug.test import EnvironBuilder
+
+from app.app import app as flask_app
+from app.controllers.booksController import (
+    CARD_KEY_FIELDS, book_etag, catalog_etag, catalog_filters, render_book_details,
+    cached_cards, render_catalog_page
+)
+from app.controllers.loansController import hold_to_dict, loan_to_dict, render_loans_page
+from app.config import MESSAGES
+from app.models.books import Book
+from app.models.catalog import CatalogState
+from app.models.holds import Hold
+from app.models.loans import Loan
+from app.models.users import User
+from app.services.async_data import AsyncLibraryData
+from app.services.http_cache import apply_validators, is_not_modified, not_modified_response
+
+
+def _build_environ(scope):
+    """Translate an ASGI HTTP scope into a WSGI environ for Flask's request context"""
+    headers = [(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']]
+    host = next((value for name, value in headers if name.lower() == 'host'), None)
+    if host is None and scope.get('server'):
+        host = f"{scope['server'][0]}:{scope['server'][1]}"
+    builder = EnvironBuilder(
+        path=scope.get('root_path', '') + scope['path'],
+        method=scope['method'],
+        query_string=scope.get('query_string', b'').decode('latin-1'),
+        base_url=f"{scope.get('scheme', 'http')}://{host or 'localhost'}{scope.get('root_path', '')}",
+        headers=[(name, value) for name, value in headers if name.lower() != 'host'],
+        environ_overrides={'REMOTE_ADDR': (scope.get('client') or ('',))[0]}
+    )
+    try:
+        return builder.get_environ()
+    finally:
+        builder.close()
+
+
+class AsyncLibraryApp:
+    """ASGI application: async handlers for the read-heavy pages, Flask for the rest"""
+
+    def __init__(self, wsgi_app):
+        self.flask_app = wsgi_app
+        self.wsgi = WsgiToAsgi(wsgi_app)
+        self.data = AsyncLibraryData(wsgi_app.config['MONGODB_SETTINGS'],
+                                     wsgi_app.config.get('CATALOG_READ_PREFERENCE', 'primary'))
+        self.routes = Map([
+            Rule('/', endpoint='book_titles', methods=['GET', 'HEAD']),
+            Rule('/book/<book_id>', endpoint='book_details', methods=['GET', 'HEAD']),
+            Rule('/loans', endpoint='view_loans', methods=['GET', 'HEAD']),
+        ])
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+
+        handler = None
+        if scope['type'] == 'http':
+            try:
+                endpoint, args = self.routes.bind('').match(scope['path'], method=scope['method'])
+                handler = getattr(self, endpoint)
+            except Exception:
+                handler = None
+
+        if handler is None:
+            return await self.wsgi(scope, receive, send)
+
+        response = None
+        with self.flask_app.request_context(_build_environ(scope)):
+            # False means e.g. a remember-me cookie that only the sync login manager handles
+            if await self._load_user():
+                try:
+                    rv = await handler(**args)
+                except Exception as e:
+                    rv = self.flask_app.handle_exception(e)
+                # Runs after_request hooks and saves the session (flashes)
+                response = self.flask_app.finalize_request(rv)
+
+        if response is None:
+            return await self.wsgi(scope, receive, send)
+        await self._send(send, response, head=scope['method'] == 'HEAD')
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.data.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def _send(send, response, head=False):
+        headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                   for name, value in response.headers.items()]
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b'' if head else response.get_data()})
+
+    async def _load_user(self):
+        """
+        Resolve flask_login's current_user from the session with Motor, so the
+        templates never trigger the synchronous user_loader.
+        """
+        login_manager = self.flask_app.login_manager
+        user_id = session.get('_user_id')
+        if user_id is None:
+            if request.cookies.get(self.flask_app.config.get('REMEMBER_COOKIE_NAME', 'remember_token')):
+                return False
+            g._login_user = login_manager.anonymous_user()
+            return True
+
+        doc = await self.data.get_user(user_id)
+        g._login_user = User._from_son(doc) if doc else login_manager.anonymous_user()
+        return True
+
+    async def _load_active_loans_count(self):
+        """
+        The sidebar's active-loan count for a signed-in member, read with
+        Motor and left in `g` so inject_loan_context does not query PyMongo
+        on the event loop.
+        """
+        if current_user.is_authenticated and not current_user.is_admin:
+            g.active_loans_count = await self.data.count_active_loans(current_user.id)
+
+    async def book_titles(self):
+        filters = catalog_filters()
+        state_doc = await self.data.catalog_state()
+        state = CatalogState._from_son(state_doc) if state_doc else CatalogState(key='catalog', categoryCounts={}, genreCounts={})
+
+        etag = catalog_etag(state)
+        if is_not_modified(etag, state.updatedAt):
+            return not_modified_response(etag, state.updatedAt)
+
+        (docs, total), _ = await asyncio.gather(
+            self.data.list_books(filters, CARD_KEY_FIELDS),
+            self._load_active_loans_count()
+        )
+        page_books = [Book._from_son(doc) for doc in docs]
+
+        # Cards are pinned here, so every card rendered below is either one of
+        # these or built from the documents loaded now - nothing is fetched synchronously
+        cached = cached_cards(page_books)
+        missing = [book.id for book in page_books if book.id not in cached]
+        full_books = [Book._from_son(doc) for doc in await self.data.get_books(missing)] if missing else []
+
+        response = make_response(render_catalog_page(state, filters, page_books, total,
+                                                     load_full=lambda ids: full_books, cached=cached))
+        return apply_validators(response, etag, state.updatedAt)
+
+    async def book_details(self, book_id):
+        # The book, its similar-books list and the sidebar's active-loan count are independent lookups
+        doc, similar, _ = await asyncio.gather(
+            self.data.get_book(book_id),
+            self.data.get_recommendations(book_id),
+            self._load_active_loans_count()
+        )
+        if doc is None:
+            return render_template('bookDetails.html', book_html=None,
+                                   error_message=MESSAGES['book_not_found'])
+
+        book = Book._from_son(doc)
+        etag = book_etag(book, similar)
+        if is_not_modified(etag, book.updatedAt):
+            return not_modified_response(etag, book.updatedAt)
+        return apply_validators(make_response(render_book_details(book, similar=similar)), etag, book.updatedAt)
+
+    async def view_loans(self):
+        if not current_user.is_authenticated:
+            return self.flask_app.login_manager.unauthorized()
+        if current_user.is_admin:
+            return redirect(url_for('admin.circulation_dashboard'))
+
+        # The loan list, the hold list and the sidebar's active-loan count are independent queries
+        loan_docs, hold_docs, active_count = await asyncio.gather(
+            self.data.get_user_loans(current_user.id),
+            self.data.get_user_holds(current_user.id),
+            self.data.count_active_loans(current_user.id)
+        )
+        g.active_loans_count = active_count
+
+        loans_data = []
+        for doc in loan_docs:
+            book = Book._from_son(doc.pop('bookDoc'))
+            loans_data.append(loan_to_dict(Loan._from_son(doc), book))
+
+        holds_data = []
+        for doc in hold_docs:
+            book = Book._from_son(doc.pop('bookDoc'))
+            ahead = doc.pop('ahead')
+            position = ahead[0]['count'] + 1 if ahead else 1
+            holds_data.append(hold_to_dict(Hold._from_son(doc), book, position))
+        return render_loans_page(loans_data, holds_data)
+
+
+application = AsyncLibraryApp(flask_app)
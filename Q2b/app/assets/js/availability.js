@@ -0,0 +1,38 @@
+// Live availability: keep the copy counts and loan/hold buttons on the page
+// in step with borrows and returns pushed over Server-Sent Events.
+(function () {
+    var script = document.currentScript;
+    var streamUrl = script && script.getAttribute('data-stream-url');
+    if (!streamUrl || !window.EventSource) { return; }
+
+    var selector = '[data-availability-count], [data-when-available], [data-when-unavailable]';
+    var ids = {};
+    document.querySelectorAll(selector).forEach(function (el) {
+        ids[el.getAttribute('data-availability-count') ||
+            el.getAttribute('data-when-available') ||
+            el.getAttribute('data-when-unavailable')] = true;
+    });
+    var bookIds = Object.keys(ids);
+    if (!bookIds.length) { return; }
+
+    var source = new EventSource(streamUrl + '?ids=' + encodeURIComponent(bookIds.join(',')));
+    source.addEventListener('availability', function (message) {
+        var data = JSON.parse(message.data);
+        var available = data.available > 0;
+
+        document.querySelectorAll('[data-availability-count="' + data.id + '"]').forEach(function (el) {
+            el.textContent = data.available;
+            el.classList.toggle('text-available', available);
+            el.classList.toggle('text-unavailable', !available);
+        });
+        document.querySelectorAll('[data-copies-count="' + data.id + '"]').forEach(function (el) {
+            el.textContent = data.copies;
+        });
+        document.querySelectorAll('[data-when-available="' + data.id + '"]').forEach(function (el) {
+            el.classList.toggle('d-none', !available);
+        });
+        document.querySelectorAll('[data-when-unavailable="' + data.id + '"]').forEach(function (el) {
+            el.classList.toggle('d-none', available);
+        });
+    });
+})();
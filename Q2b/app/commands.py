@@ -0,0 +1,131 @@
+import click
+from app import app
+from app.models.books import Book
+
+
+@app.cli.command('warm-covers')
+def warm_covers():
+    """Store every book cover locally and pre-generate its thumbnails"""
+    from app.config import COVER_CONFIG
+    from app.services.covers import FORMATS, get_cover_store
+
+    store = get_cover_store()
+    stored = failed = 0
+    for book in Book.objects.only('title', 'url'):
+        if not book.url:
+            continue
+        digest = store.store(book.url)
+        if digest is None:
+            failed += 1
+            click.echo(f"Could not cache cover for {book.title}")
+            continue
+        for width in COVER_CONFIG['widths']:
+            for fmt in FORMATS:
+                store.variant(digest, width, fmt)
+        stored += 1
+    click.echo(f"Covers cached: {stored}, failed: {failed}")
+
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Write fingerprinted and precompressed copies of the static assets"""
+    from app.services.assets import build_assets, get_build_dir
+
+    manifest = build_assets(app.static_folder, get_build_dir())
+    for original, hashed in sorted(manifest.items()):
+        click.echo(f"{original} -> {hashed}")
+
+
+@app.cli.command('reconcile-availability')
+@click.option('--dry-run', is_flag=True, help='Report drift without fixing it')
+def reconcile_availability(dry_run):
+    """Recompute available copies from open loans and report any drift"""
+    from app.models.catalog import CatalogState
+    from app.models.loans import Loan
+
+    drift = Loan.reconcile_availability(dry_run=dry_run)
+    for row in drift:
+        skipped = '' if dry_run or row['fixed'] else ' [changed during the run, skipped]'
+        click.echo(f"{row['title']}: available {row['available']} -> {row['expected']} "
+                   f"(copies {row['copies']}, open loans {row['openLoans']}, ready holds {row['readyHolds']}){skipped}")
+
+    fixed = [row for row in drift if row['fixed']]
+    if fixed:
+        # Availability changed behind the counters' back
+        CatalogState.rebuild_facets()
+    if dry_run:
+        click.echo(f"Books with drift found: {len(drift)}")
+    else:
+        click.echo(f"Books with drift fixed: {len(fixed)} of {len(drift)}")
+
+
+@app.cli.command('expire-holds')
+def expire_holds():
+    """Expire uncollected ready holds and pass their copies down the queue"""
+    from app.models.holds import Hold
+
+    expired = Hold.expire_holds()
+    click.echo(f"Holds expired: {expired}")
+
+
+@app.cli.command('build-recommendations')
+@click.option('--no-loans', is_flag=True, help='Use book metadata only, ignoring co-borrowing')
+@click.option('--top-k', type=int, default=None, help='Similar books to keep per title')
+def build_recommendations(no_loans, top_k):
+    """Precompute the "similar books" shown on book detail pages"""
+    from app.models.recommendations import Recommendation
+    from app.services.recommendations import np
+
+    count = Recommendation.rebuild(use_loans=not no_loans, top_k=top_k)
+    engine = 'NumPy' if np is not None else 'pure Python'
+    click.echo(f"Recommendations built for {count} books ({engine})")
+
+
+@app.cli.command('backfill-popularity')
+def backfill_popularity():
+    """Set borrow counts and trending scores from the existing loan history (one-off)"""
+    from app.models.loans import Loan
+
+    updated = Loan.backfill_popularity()
+    click.echo(f"Popularity backfilled for {updated} borrowed books")
+
+
+@app.cli.command('refresh-circulation-summary')
+def refresh_circulation_summary():
+    """Recompute the admin dashboard's summary tiles (schedule e.g. every few minutes)"""
+    from app.models.circulation import CirculationSummary
+
+    summary = CirculationSummary.refresh()
+    click.echo(f"Active loans: {summary.activeLoans}, overdue: {summary.overdueLoans}, "
+               f"returned recently: {summary.returnedRecently}, waiting holds: {summary.waitingHolds}, "
+               f"ready holds: {summary.readyHolds}")
+
+
+@app.cli.command('measure-catalog-memory')
+@click.option('--books', 'count', type=int, default=10000, help='Cached books to build per layout')
+def measure_catalog_memory(count):
+    """Report the bytes each cached book takes as a document, a dict and a BookView"""
+    import gc
+    import json
+    import tracemalloc
+    from bson import ObjectId
+    from books.books import all_books
+    from app.models.read_models import BookView
+
+    # Decode every row separately so each one has its own strings, as when
+    # documents are loaded from MongoDB
+    encoded = [json.dumps(all_books[i % len(all_books)]) for i in range(count)]
+
+    layouts = [
+        ('Book document', lambda row: Book(id=ObjectId(), **row)),
+        ('dict', lambda row: dict(row, id=str(ObjectId()))),
+        ('BookView', lambda row: BookView.build(ObjectId(), row))
+    ]
+    for label, build in layouts:
+        gc.collect()
+        tracemalloc.start()
+        cached = [build(json.loads(text)) for text in encoded]
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del cached
+        click.echo(f"{label:<14} {size / count:>8,.0f} bytes per book")
@@ -1,3 +1,74 @@
+import os
+from datetime import datetime
+
+APP_ENV = os.environ.get('APP_ENV', 'development')
+
+# MongoDB client settings per environment; any value can be overridden with
+# the matching MONGODB_* environment variable (see mongodb_settings below)
+MONGODB_ENVIRONMENTS = {
+    'development': {
+        'host': 'localhost',
+        'port': 27017,
+        'db': 'library',
+        'maxPoolSize': 20,
+        'minPoolSize': 0,
+        'serverSelectionTimeoutMS': 5000,
+        'connectTimeoutMS': 5000,
+        'socketTimeoutMS': 20000,
+        'retryWrites': True,
+        'w': 1,
+        'readPreference': 'primary',
+        'replicaSet': None,
+        # Read preference for catalog pages (book_titles, book_details, search)
+        'catalogReadPreference': 'primary'
+    },
+    'production': {
+        'host': 'localhost',
+        'port': 27017,
+        'db': 'library',
+        'maxPoolSize': 100,
+        'minPoolSize': 10,
+        'serverSelectionTimeoutMS': 3000,
+        'connectTimeoutMS': 3000,
+        'socketTimeoutMS': 10000,
+        'retryWrites': True,
+        'w': 'majority',
+        'readPreference': 'primary',
+        'replicaSet': None,
+        'catalogReadPreference': 'secondaryPreferred'
+    }
+}
+
+MONGODB_ENV_OVERRIDES = {
+    'host': ('MONGODB_HOST', str),
+    'port': ('MONGODB_PORT', int),
+    'db': ('MONGODB_DB', str),
+    'maxPoolSize': ('MONGODB_MAX_POOL_SIZE', int),
+    'minPoolSize': ('MONGODB_MIN_POOL_SIZE', int),
+    'serverSelectionTimeoutMS': ('MONGODB_SERVER_SELECTION_TIMEOUT_MS', int),
+    'connectTimeoutMS': ('MONGODB_CONNECT_TIMEOUT_MS', int),
+    'socketTimeoutMS': ('MONGODB_SOCKET_TIMEOUT_MS', int),
+    'retryWrites': ('MONGODB_RETRY_WRITES', lambda value: value.lower() in ('1', 'true', 'yes')),
+    'w': ('MONGODB_WRITE_CONCERN', lambda value: int(value) if value.isdigit() else value),
+    'readPreference': ('MONGODB_READ_PREFERENCE', str),
+    'replicaSet': ('MONGODB_REPLICA_SET', str),
+    'catalogReadPreference': ('MONGODB_CATALOG_READ_PREFERENCE', str)
+}
+
+
+def mongodb_settings(env=None):
+    """
+    Resolve the MongoDB settings for an environment, applying MONGODB_*
+    environment variable overrides. Unset options are left out.
+    """
+    settings = dict(MONGODB_ENVIRONMENTS.get(env or APP_ENV, MONGODB_ENVIRONMENTS['development']))
+    for key, (variable, convert) in MONGODB_ENV_OVERRIDES.items():
+        value = os.environ.get(variable)
+        if value is not None and value != '':
+            settings[key] = convert(value)
+    return {key: value for key, value in settings.items() if value is not None}
+
+
 APP_NAME = "SG Library"
 APP_DESCRIPTION = "Singapore Library Management System"
 
@@ -14,13 +85,189 @@ BOOK_CATEGORIES = [
     ('Adult', 'Adult')
 ]
 
+# Catalog sort options (value, label); 'title' is the default
+CATALOG_SORTS = [
+    ('title', 'Title'),
+    ('trending', 'Trending'),
+    ('popular', 'Most borrowed')
+]
+
+BOOK_GENRES = [
+    'Animals', 'Business', 'Comics', 'Communication', 'Dark Academia',
+    'Emotion', 'Fantasy', 'Fiction', 'Friendship', 'Graphic Novels',
+    'Grief', 'Historical Fiction', 'Indigenous', 'Inspirational', 'Magic',
+    'Mental Health', 'Nonfiction', 'Personal Development', 'Philosophy',
+    'Picture Books', 'Poetry', 'Productivity', 'Psychology', 'Romance',
+    'School', 'Self Help', 'Science', 'Technology'
+]
+
 UI_CONFIG = {
-    'books_per_page': None,
+    'books_per_page': 20,
     'max_description_preview': 2,
+    'search_results_per_page': 10,
+    'autocomplete_max_results': 8,
     'card_shadow': '4px 4px 12px 0 rgba(0,0,0,0.18)',
     'border_radius': '8px'
 }
 
+HTTP_CACHE = {
+    # Seconds a browser or shared cache may reuse an anonymous catalog page before revalidating
+    'page_max_age': 30
+}
+
+FRAGMENT_CACHE = {
+    # Rendered book cards/details kept in memory per worker process
+    'max_entries': 2000
+}
+
+COVER_CONFIG = {
+    # Where cached covers live (defaults to <instance>/covers) and where locally
+    # provided cover files can be dropped, named like the source URL's file name
+    'cache_dir': os.environ.get('COVER_CACHE_DIR'),
+    'source_dir': os.environ.get('COVER_SOURCE_DIR'),
+    'fetch_remote': os.environ.get('COVER_FETCH_REMOTE', '1') == '1',
+    'fetch_timeout': 5,
+    'max_bytes': 5 * 1024 * 1024,
+    'widths': [160, 320],
+    'quality': 82,
+    'max_age': 31536000
+}
+
+ASSET_CONFIG = {
+    # Fingerprinted copies of the static folder (defaults to <instance>/static-build)
+    'build_dir': os.environ.get('ASSET_BUILD_DIR'),
+    'max_age': 31536000,
+    # Gzip rendered HTML pages (leave off when a reverse proxy already compresses)
+    'compress_html': os.environ.get('COMPRESS_HTML', '0') == '1',
+    'compress_level': 6,
+    'compress_min_size': 1024
+}
+
+CIRCUIT_BREAKER = {
+    # Trip when at least half of the last calls in a 30s window failed or were slow
+    'failure_rate': 0.5,
+    'min_calls': 5,
+    'window_seconds': 30,
+    'open_seconds': 15,
+    'slow_call_seconds': 2.0
+}
+
+# Werkzeug password hash method per environment, with its full parameters so
+# stored hashes can be compared against it ('pbkdf2:sha256:<iterations>' or
+# 'scrypt:<n>:<r>:<p>'). Override with PASSWORD_HASH_METHOD. Hashes made with
+# weaker parameters are upgraded when their user next logs in; stronger ones
+# are never replaced. Both default to Werkzeug's own default.
+PASSWORD_HASH_METHODS = {
+    'development': 'scrypt:32768:8:1',
+    'production': 'scrypt:32768:8:1'
+}
+
+PASSWORDS = {
+    'method': os.environ.get('PASSWORD_HASH_METHOD')
+              or PASSWORD_HASH_METHODS.get(APP_ENV, PASSWORD_HASH_METHODS['development']),
+    # Hashes computed at once per process; more requests wait in a bounded queue
+    'workers': int(os.environ.get('PASSWORD_HASH_WORKERS', 2)),
+    'max_pending': int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 16)),
+    # Seconds a request waits for its hash before giving up
+    'timeout_seconds': 10
+}
+
+LOGIN_THROTTLE = {
+    # Failed logins allowed per account from one client IP, and per client IP
+    # over all accounts, within the window
+    'max_account_failures': 5,
+    'max_ip_failures': 20,
+    'window_seconds': 900
+}
+
+# Number of reverse proxies in front of the app whose X-Forwarded-For /
+# X-Forwarded-Proto headers are trusted (0 = not behind a proxy). Needed for
+# the client IP the login throttle counts by.
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+
+STORAGE = {
+    # 'mongo' (default) or 'memory': keep books, users and loans in process memory
+    # (single process only, reset on restart; holds, recommendations, the admin
+    # dashboards and the v1 JSON API still need MongoDB)
+    'backend': os.environ.get('STORAGE_BACKEND', 'mongo')
+}
+
+CONCURRENCY = {
+    # Attempts for a version-checked update before giving up on a busy document
+    'max_retries': 5,
+    # Run loan creation/return as multi-document transactions when MongoDB is a replica set
+    'transactions': os.environ.get('MONGODB_TRANSACTIONS', '1') != '0'
+}
+
+HOLDS = {
+    # Days a member has to borrow a copy set aside for their hold
+    'pickup_days': 3
+}
+
+AVAILABILITY_EVENTS = {
+    # 'process' publishes from the borrow/return code path (single worker);
+    # 'change_stream' watches the books collection so all workers see every change (replica set only)
+    'source': os.environ.get('AVAILABILITY_EVENTS_SOURCE', 'process'),
+    'queue_size': 100,           # Buffered events per connected viewer
+    'heartbeat_seconds': 15,     # Keep-alive comment interval for idle connections
+    'retry_ms': 3000,            # Browser reconnect delay after a dropped connection
+    'max_books': 100             # Most books one connection may follow
+}
+
+API_CONFIG = {
+    # Most book ids accepted by one batch availability request
+    'max_batch_ids': 100,
+    # Items per page of API lists, when the client does not ask for a `limit`
+    'page_size': 50,
+    'max_page_size': 200
+}
+
+POPULARITY = {
+    # A borrow counts half as much towards "trending" after this many days
+    'half_life_days': 7,
+    # Trending scores are stored relative to this date, so they only ever need
+    # $inc (scores grow 2x per half-life; re-base with backfill-popularity
+    # by moving the epoch forward long before ~19 years have passed)
+    'epoch': datetime(2025, 1, 1),
+    'report_size': 10            # Titles listed in each section of the admin report
+}
+
+ADMIN_DASHBOARD = {
+    'page_size': 50,                   # Loans per page of each dashboard list
+    'summary_refresh_seconds': 300,    # Age at which the summary tiles are recomputed
+    'recent_days': 30                  # Window for the "returned recently" tile
+}
+
+METRICS = {
+    # /metrics is served to admins, to requests from the server itself and to
+    # scrapers sending "Authorization: Bearer <token>" (behind a local reverse
+    # proxy, set TRUSTED_PROXIES so remote clients are not seen as loopback)
+    'token': os.environ.get('METRICS_TOKEN'),
+    'allow_loopback': os.environ.get('METRICS_ALLOW_LOOPBACK', '1') == '1'
+}
+
+RECOMMENDATIONS = {
+    'top_k': 6,                  # Similar books stored per title
+    # Relative weight of each kind of shared feature
+    'weights': {'genre': 1.0, 'category': 0.5, 'author': 2.0},
+    'co_borrow_weight': 0.3,     # Share of the score from members borrowing both books
+    'min_score': 0.05,           # Weaker matches are not shown
+    'batch_size': 512            # Books scored per matrix multiplication
+}
+
+CATALOG_SNAPSHOT = {
+    # Minimum seconds between background refreshes of the fallback catalog snapshot
+    'refresh_seconds': 60
+}
+
+PREFORK = {
+    # Set by gunicorn.conf.py: the app is loaded once in the master and workers are forked from it
+    'enabled': os.environ.get('PREFORK_PRELOAD') == '1',
+    # File the startup catalog snapshot is packed into and memory-mapped from
+    # (defaults to shared-catalog.bin in the instance folder)
+    'shared_catalog_path': os.environ.get('CATALOG_SHARED_PATH')
+}
+
 COLORS = {
     'primary': '#bed1be',
     'secondary': '#def0e2',
@@ -33,7 +280,15 @@ COLORS = {
 MESSAGES = {
     'no_books': 'No books found for the selected category.',
     'book_not_found': 'Book not found.',
-    'search_placeholder': 'Search by category...'
+    'search_placeholder': 'Search by category...',
+    'search_text_placeholder': 'Title, author or genre...',
+    'no_search_results': 'No books matched your search.',
+    'catalog_stale': 'The library database is currently unavailable. Showing the catalog as of {time}; availability may be out of date.',
+    'database_unavailable': 'The library system is temporarily unavailable. Please try again in a minute.',
+    'hold_ready': 'A copy of "{title}" is waiting for you until {date}.',
+    'holds_unsupported': 'Holds are not available with this storage backend.',
+    'login_throttled': 'Too many failed login attempts. Please wait a few minutes and try again.',
+    'password_busy': 'The server is busy. Please try again in a moment.'
 }
 
 FONTS = {
@@ -0,0 +1,158 @@
+from datetime import datetime
+from functools import wraps
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
+from flask_login import login_required, current_user
+from app.config import BOOK_CATEGORIES, POPULARITY, ADMIN_DASHBOARD
+from app.models.books import Book
+from app.models.users import User
+from app.models.loans import Loan, LOAN_PERIOD
+from app.models.circulation import CirculationSummary
+from app.services.schemas import encode_cursor, decode_cursor
+
+# Create Blueprint for admin-only reports
+admin = Blueprint('admin', __name__, url_prefix='/admin')
+
+def admin_required(view):
+    """Allow only signed-in admin users through"""
+    @wraps(view)
+    @login_required
+    def wrapper(*args, **kwargs):
+        if not current_user.is_admin:
+            flash('Access denied. Admin privileges required.', 'error')
+            return redirect(url_for('books.book_titles'))
+        return view(*args, **kwargs)
+    return wrapper
+
+def popularity_rows(books):
+    """Rows for the popularity report, with trending scores decayed to today"""
+    return [{
+        'id': str(book.id),
+        'title': book.title,
+        'authors': ', '.join(book.authors or []),
+        'category': book.category,
+        'copies': book.copies,
+        'borrow_count': book.borrowCount or 0,
+        'trending': round(Book.current_trending(book.trendingScore), 2)
+    } for book in books]
+
+@admin.route('/popularity')
+@admin_required
+def popularity_report():
+    """Most and least circulated titles, and what is trending, optionally per category"""
+    category = request.args.get('category', 'All')
+    size = POPULARITY['report_size']
+
+    # Each list is a bounded walk of a (category, score, title) index; the
+    # least borrowed walk it backwards, so their ties run Z-A
+    books = Book.catalog().filter(category=category) if category != 'All' else Book.catalog()
+    books = books.only('title', 'authors', 'category', 'copies', 'borrowCount', 'trendingScore')
+
+    return render_template('adminPopularity.html',
+                           panel="POPULARITY",
+                           categories=BOOK_CATEGORIES,
+                           selected_category=category,
+                           most_borrowed=popularity_rows(books.order_by('-borrowCount', 'title').limit(size)),
+                           least_borrowed=popularity_rows(books.order_by('borrowCount', '-title').limit(size)),
+                           trending=popularity_rows(books.order_by('-trendingScore', 'title').limit(size)))
+
+def object_id_or_404(value):
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        abort(404)
+
+def page_after():
+    """Decode the `cursor` query parameter into a (borrowDate, _id) keyset position"""
+    cursor = request.args.get('cursor')
+    if not cursor:
+        return None
+    try:
+        borrowed, last_id = decode_cursor(cursor)
+        return datetime.fromisoformat(borrowed), ObjectId(last_id)
+    except (ValueError, TypeError, InvalidId):
+        abort(400)
+
+def next_page_url(next_after):
+    """Link to the page after this one, keeping the other query parameters"""
+    if next_after is None:
+        return None
+    args = request.args.to_dict()
+    args['cursor'] = encode_cursor([next_after[0].isoformat(), str(next_after[1])])
+    return url_for(request.endpoint, **{**request.view_args, **args})
+
+def loan_rows(loans):
+    """Rows for the admin loan tables from joined raw loan documents"""
+    now = datetime.utcnow()
+    rows = []
+    for loan in loans:
+        member = loan.get('memberDoc') or {}
+        book = loan.get('bookDoc') or {}
+        due = loan['borrowDate'] + LOAN_PERIOD
+        rows.append({
+            'id': str(loan['_id']),
+            'member_id': str(loan['member']),
+            'member_name': member.get('name', 'Unknown member'),
+            'member_email': member.get('email', ''),
+            'book_id': str(loan['book']),
+            'book_title': book.get('title', 'Unknown book'),
+            'book_authors': ', '.join(book.get('authors') or []),
+            'borrow_date': loan['borrowDate'],
+            'due_date': due,
+            'return_date': loan.get('returnDate'),
+            'renew_count': loan.get('renewCount') or 0,
+            'is_overdue': loan.get('returnDate') is None and now > due
+        })
+    return rows
+
+def render_loan_list(heading, match, oldest_first=False, show_tiles=False):
+    after = page_after()
+    loans, next_after = Loan.loan_page(match, after, ADMIN_DASHBOARD['page_size'], oldest_first)
+
+    summary = None
+    if show_tiles:
+        summary = CirculationSummary.get_summary()
+        CirculationSummary.refresh_if_stale(summary)
+
+    return render_template('adminLoans.html',
+                           panel="CIRCULATION",
+                           heading=heading,
+                           loans=loan_rows(loans),
+                           summary=summary,
+                           view=request.args.get('view', 'active'),
+                           first_page_url=url_for(request.endpoint, **{
+                               **request.view_args,
+                               **{key: value for key, value in request.args.items() if key != 'cursor'}}),
+                           is_first_page=after is None,
+                           next_page_url=next_page_url(next_after))
+
+@admin.route('/loans')
+@admin_required
+def circulation_dashboard():
+    """All active loans (oldest first), or only the overdue ones with ?view=overdue"""
+    if request.args.get('view') == 'overdue':
+        match = {'returnDate': None, 'borrowDate': {'$lt': Loan.overdue_cutoff()}}
+        heading = 'Overdue loans'
+    else:
+        match = {'returnDate': None}
+        heading = 'Active loans'
+    return render_loan_list(heading, match, oldest_first=True, show_tiles=True)
+
+@admin.route('/books/<book_id>/loans')
+@admin_required
+def book_loan_history(book_id):
+    """Every loan of one book, newest first"""
+    book = Book.objects(id=object_id_or_404(book_id)).only('title').first()
+    if book is None:
+        abort(404)
+    return render_loan_list(f'Loan history: {book.title}', {'book': book.id})
+
+@admin.route('/members/<member_id>/loans')
+@admin_required
+def member_loan_history(member_id):
+    """Every loan of one member, newest first"""
+    member = User.objects(id=object_id_or_404(member_id)).only('name', 'email').first()
+    if member is None:
+        abort(404)
+    return render_loan_list(f'Loan history: {member.name} ({member.email})', {'member': member.id})
@@ -0,0 +1,422 @@
+from datetime import datetime
+from functools import wraps
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import Blueprint, request, jsonify, make_response, Response, stream_with_context, g
+from flask_login import current_user
+from pymongo.errors import PyMongoError
+from app.config import API_CONFIG, BOOK_GENRES
+from app.models.books import Book, catalog_read_preference
+from app.models.loans import Loan, LOAN_PERIOD, MAX_RENEWALS
+from app.repositories import repository
+from app.services.async_data import book_filter_query
+from app.services.http_cache import make_etag, is_not_modified
+from app.services.circuit_breaker import db_breaker, DatabaseUnavailable
+from app.services.catalog_snapshot import catalog_snapshot
+from app.services.schemas import Schema, Field, dumps, iso, encode_cursor, decode_cursor
+
+# Create Blueprint for the JSON API used by kiosks, the mobile app and staff tools
+api = Blueprint('api', __name__, url_prefix='/api')
+
+# Versioned REST API for books and the current member's loans
+api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+BOOK_SCHEMA = Schema({
+    'id': Field('_id', str),
+    'title': Field('title'),
+    'authors': Field('authors'),
+    'category': Field('category'),
+    'genres': Field('genres'),
+    'pages': Field('pages'),
+    'available': Field('available'),
+    'copies': Field('copies'),
+    'cover_url': Field('url'),
+    'description': Field('description'),
+    'updated_at': Field('updatedAt', iso)
+}, default=('id', 'title', 'authors', 'category', 'genres', 'pages', 'available', 'copies', 'cover_url'))
+
+def _loan_is_overdue(doc):
+    return doc.get('returnDate') is None and datetime.utcnow() > doc['borrowDate'] + LOAN_PERIOD
+
+LOAN_SCHEMA = Schema({
+    'id': Field('_id', str),
+    'book_id': Field('book', str),
+    'book_title': Field('bookDoc.title', requires=('book',)),
+    'book_authors': Field('bookDoc.authors', requires=('book',)),
+    'borrow_date': Field('borrowDate', iso),
+    'due_date': Field(compute=lambda doc: iso(doc['borrowDate'] + LOAN_PERIOD), requires=('borrowDate',)),
+    'return_date': Field('returnDate', iso),
+    'renew_count': Field(compute=lambda doc: doc.get('renewCount') or 0, requires=('renewCount',)),
+    'is_overdue': Field(compute=_loan_is_overdue, requires=('borrowDate', 'returnDate')),
+    'can_renew': Field(compute=lambda doc: not _loan_is_overdue(doc) and doc.get('returnDate') is None
+                       and (doc.get('renewCount') or 0) < MAX_RENEWALS,
+                       requires=('borrowDate', 'returnDate', 'renewCount')),
+    'can_return': Field(compute=lambda doc: doc.get('returnDate') is None, requires=('returnDate',))
+})
+
+def api_error(message, status):
+    """JSON error body with the given status code"""
+    return make_response(jsonify({'error': message}), status)
+
+def requested_ids():
+    """Book ids from `?ids=a,b,c` and/or repeated `?ids=` parameters, de-duplicated in order"""
+    ids = []
+    for value in request.args.getlist('ids'):
+        ids.extend(book_id.strip() for book_id in value.split(',') if book_id.strip())
+    return list(dict.fromkeys(ids))
+
+def availability_from_snapshot(book_ids):
+    """Availability read from the in-memory catalog snapshot"""
+    found = {}
+    for book_id in book_ids:
+        book = catalog_snapshot.get(book_id)
+        if book is not None:
+            found[book_id] = {'available': book.available or 0, 'copies': book.copies or 0}
+    return found
+
+def availability_from_repository(book_ids):
+    """Availability for all ids with one projected lookup in the storage backend"""
+    object_ids = []
+    for book_id in book_ids:
+        try:
+            object_ids.append(ObjectId(book_id))
+        except (InvalidId, TypeError):
+            pass  # reported back as missing
+
+    books = repository.get_books(object_ids, fields=('available', 'copies'))
+    return {str(book.id): {'available': book.available or 0, 'copies': book.copies or 0}
+            for book in books}
+
+def availability_response(state, book_ids, found, stale=False):
+    body = {
+        'version': state.version,
+        'stale': stale,
+        'books': found,
+        'missing': [book_id for book_id in book_ids if book_id not in found]
+    }
+    return make_response(jsonify(body))
+
+@api.route('/availability')
+def batch_availability():
+    """
+    Current `available`/`copies` for up to API_CONFIG['max_batch_ids'] books.
+    The ETag covers the whole batch and changes whenever any borrow or return
+    bumps the catalog version, so unchanged batches cost a single small read.
+    """
+    book_ids = requested_ids()
+    if not book_ids:
+        return api_error('Pass one or more book ids as ?ids=<id>,<id>', 400)
+    if len(book_ids) > API_CONFIG['max_batch_ids']:
+        return api_error(f"At most {API_CONFIG['max_batch_ids']} book ids per request", 400)
+
+    def lookup():
+        # Also keeps the fallback snapshot current on the MongoDB backend
+        state = repository.catalog_state()
+        etag = make_etag('availability', state.version, *book_ids)
+        if is_not_modified(etag):
+            return state, etag, None
+
+        if state.version is not None and catalog_snapshot.version == state.version:
+            # The snapshot is exactly current: no need to touch the books collection
+            found = availability_from_snapshot(book_ids)
+        else:
+            found = availability_from_repository(book_ids)
+        return state, etag, found
+
+    try:
+        state, etag, found = db_breaker.call(lookup)
+    except DatabaseUnavailable:
+        if not catalog_snapshot.available:
+            return api_error('The library database is temporarily unavailable', 503)
+        response = availability_response(catalog_snapshot.state, book_ids,
+                                          availability_from_snapshot(book_ids), stale=True)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    if found is None:
+        response = make_response('', 304)
+    else:
+        response = availability_response(state, book_ids, found)
+    response.set_etag(etag)
+    # Availability is the same for every caller, but must be revalidated on each use
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+# Let v1 clients use the batch endpoint under the same prefix
+api_v1.add_url_rule('/availability', view_func=batch_availability)
+
+class ApiError(Exception):
+    """Error returned to the client as a JSON body with the given status"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+@api_v1.errorhandler(ApiError)
+def handle_api_error(error):
+    return api_error(str(error), error.status)
+
+def api_view(view):
+    """Run a v1 view through the database circuit breaker, answering 503 while MongoDB is down"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            return db_breaker.call(view, *args, **kwargs)
+        except DatabaseUnavailable:
+            return api_error('The library database is temporarily unavailable', 503)
+    return wrapper
+
+def member_required(view):
+    """Like login_required, but answers 401/403 JSON instead of redirecting"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_user.is_authenticated:
+            if g.get('database_unavailable'):
+                return api_error('The library database is temporarily unavailable', 503)
+            return api_error('Authentication required', 401)
+        if current_user.is_admin:
+            return api_error('Admin users do not have loan records', 403)
+        return view(*args, **kwargs)
+    return wrapper
+
+def json_response(body, status=200):
+    return Response(dumps(body), status=status, mimetype='application/json')
+
+def wants_ndjson():
+    """Clients ask for a streamed list with ?format=ndjson or Accept: application/x-ndjson"""
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson'
+
+def page_limit():
+    limit = request.args.get('limit', API_CONFIG['page_size'], type=int)
+    if not limit or limit < 1:
+        raise ApiError('limit must be a positive integer')
+    return min(limit, API_CONFIG['max_page_size'])
+
+def selected_fields(schema):
+    try:
+        return schema.select(request.args.get('fields'))
+    except ValueError as e:
+        raise ApiError(str(e))
+
+def cursor_values(size):
+    """Decode the `cursor` parameter into its sort-key values (None on the first page)"""
+    cursor = request.args.get('cursor')
+    if not cursor:
+        return None
+    try:
+        values = decode_cursor(cursor)
+    except ValueError as e:
+        raise ApiError(str(e))
+    if len(values) != size:
+        raise ApiError('Invalid cursor')
+    return values
+
+def object_id_or_404(value, what):
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise ApiError(f'{what} not found', 404)
+
+def ndjson_response(documents, serialize):
+    """Stream every document as one JSON object per line"""
+    def generate():
+        for doc in documents:
+            yield dumps(serialize(doc)) + b'\n'
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def page_response(docs, names, schema, limit, make_cursor):
+    """JSON page of `limit` items; `docs` holds one extra item when there is a next page"""
+    serialize = schema.serializer(names)
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    return json_response({
+        'data': [serialize(doc) for doc in docs],
+        'fields': list(names),
+        'next_cursor': make_cursor(docs[-1]) if has_more and docs else None
+    })
+
+def books_collection():
+    """Raw books collection using the catalog read preference"""
+    return Book._get_collection().with_options(read_preference=catalog_read_preference())
+
+@api_v1.route('/books')
+@api_view
+def list_books():
+    """
+    Books sorted by title, filtered like the catalog page
+    (`category`, repeated `genres`, `available=1`), with keyset pagination.
+    """
+    names = selected_fields(BOOK_SCHEMA)
+    projection = BOOK_SCHEMA.projection(names) + ['title']
+    query = book_filter_query(
+        request.args.get('category', 'All'),
+        [genre for genre in request.args.getlist('genres') if genre in BOOK_GENRES],
+        request.args.get('available') == '1'
+    )
+    sort = [('title', 1), ('_id', 1)]
+
+    if wants_ndjson():
+        documents = books_collection().find(query, projection).sort(sort).batch_size(500)
+        return ndjson_response(documents, BOOK_SCHEMA.serializer(names))
+
+    limit = page_limit()
+    after = cursor_values(2)
+    if after is not None:
+        title, last_id = after[0], object_id_or_404(after[1], 'Cursor book')
+        query = {'$and': [query, {'$or': [
+            {'title': {'$gt': title}},
+            {'title': title, '_id': {'$gt': last_id}}
+        ]}]}
+
+    docs = list(books_collection().find(query, projection).sort(sort).limit(limit + 1))
+    return page_response(docs, names, BOOK_SCHEMA, limit,
+                         lambda doc: encode_cursor([doc.get('title'), str(doc['_id'])]))
+
+@api_v1.route('/books/search')
+@api_view
+def search_books():
+    """Full-text search ranked by relevance; the cursor is an offset into the ranking"""
+    terms = (request.args.get('q') or '').strip()
+    if not terms:
+        raise ApiError('Pass the search terms as ?q=')
+
+    names = selected_fields(BOOK_SCHEMA)
+    projection = {field: 1 for field in BOOK_SCHEMA.projection(names)}
+    projection['score'] = {'$meta': 'textScore'}
+    query = {'$text': {'$search': terms}}
+    category = request.args.get('category', 'All')
+    if category != 'All':
+        query['category'] = category
+
+    limit = page_limit()
+    after = cursor_values(1)
+    offset = int(after[0]) if after and str(after[0]).isdigit() else 0
+
+    docs = list(books_collection().find(query, projection)
+                .sort([('score', {'$meta': 'textScore'})])
+                .skip(offset).limit(limit + 1))
+    return page_response(docs, names, BOOK_SCHEMA, limit,
+                         lambda doc: encode_cursor([offset + limit]))
+
+@api_v1.route('/books/<book_id>')
+@api_view
+def get_book(book_id):
+    names = selected_fields(BOOK_SCHEMA)
+    doc = books_collection().find_one({'_id': object_id_or_404(book_id, 'Book')},
+                                      BOOK_SCHEMA.projection(names))
+    if doc is None:
+        raise ApiError('Book not found', 404)
+    return json_response({'data': BOOK_SCHEMA.serializer(names)(doc)})
+
+def loan_documents(match, names, sort=None, limit=None):
+    """
+    The member's raw loan documents, joining each book only when a book
+    field was requested.
+    """
+    pipeline = [{'$match': match}]
+    if sort:
+        pipeline.append({'$sort': sort})
+    if limit:
+        pipeline.append({'$limit': limit})
+    # borrowDate is always kept for the pagination cursor
+    pipeline.append({'$project': {field: 1 for field in LOAN_SCHEMA.projection(names) + ['borrowDate']}})
+    if any(name.startswith('book_') and name != 'book_id' for name in names):
+        pipeline.append({'$lookup': {
+            'from': Book._get_collection_name(),
+            'localField': 'book',
+            'foreignField': '_id',
+            'as': 'bookDoc'
+        }})
+        pipeline.append({'$unwind': {'path': '$bookDoc', 'preserveNullAndEmptyArrays': True}})
+    return Loan._get_collection().aggregate(pipeline)
+
+def member_loan(loan_id):
+    """The current member's loan document, or an ApiError"""
+    loan = Loan.get_loan_by_id(object_id_or_404(loan_id, 'Loan'))
+    if loan is None:
+        raise ApiError('Loan not found', 404)
+    if loan.member.id != current_user.id:
+        raise ApiError('You can only change your own loans', 403)
+    return loan
+
+def loan_result(loan, status=200):
+    names = selected_fields(LOAN_SCHEMA)
+    doc = next(loan_documents({'_id': loan.id}, names), None)
+    return json_response({'data': LOAN_SCHEMA.serializer(names)(doc)}, status)
+
+def run_loan_action(action):
+    """Apply a loan rule, turning rule violations into 409 Conflict"""
+    try:
+        return action()
+    except ApiError:
+        raise
+    except PyMongoError:
+        raise
+    except Exception as e:
+        raise ApiError(str(e), 409)
+
+@api_v1.route('/loans')
+@api_view
+@member_required
+def list_loans():
+    """The current member's loans, newest first (`status=active|returned|all`)"""
+    names = selected_fields(LOAN_SCHEMA)
+    match = {'member': current_user.id}
+    status = request.args.get('status', 'all')
+    if status == 'active':
+        match['returnDate'] = {'$exists': False}
+    elif status == 'returned':
+        match['returnDate'] = {'$exists': True}
+    elif status != 'all':
+        raise ApiError('status must be active, returned or all')
+    sort = {'borrowDate': -1, '_id': -1}
+
+    if wants_ndjson():
+        return ndjson_response(loan_documents(match, names, sort), LOAN_SCHEMA.serializer(names))
+
+    limit = page_limit()
+    after = cursor_values(2)
+    if after is not None:
+        try:
+            borrowed = datetime.fromisoformat(str(after[0]))
+        except ValueError:
+            raise ApiError('Invalid cursor')
+        last_id = object_id_or_404(after[1], 'Cursor loan')
+        match = {'$and': [match, {'$or': [
+            {'borrowDate': {'$lt': borrowed}},
+            {'borrowDate': borrowed, '_id': {'$lt': last_id}}
+        ]}]}
+
+    docs = list(loan_documents(match, names, sort, limit + 1))
+    return page_response(docs, names, LOAN_SCHEMA, limit,
+                         lambda doc: encode_cursor([doc['borrowDate'].isoformat(), str(doc['_id'])]))
+
+@api_v1.route('/loans', methods=['POST'])
+@api_view
+@member_required
+def create_loan():
+    """Borrow a book: body {"book_id": "..."}"""
+    data = request.get_json(silent=True) or {}
+    book = Book.objects(id=object_id_or_404(data.get('book_id'), 'Book')).first()
+    if book is None:
+        raise ApiError('Book not found', 404)
+    loan = run_loan_action(lambda: Loan.create_loan(current_user, book))
+    return loan_result(loan, 201)
+
+@api_v1.route('/loans/<loan_id>/renew', methods=['POST'])
+@api_view
+@member_required
+def renew_loan(loan_id):
+    loan = member_loan(loan_id)
+    run_loan_action(loan.renew_loan)
+    return loan_result(loan)
+
+@api_v1.route('/loans/<loan_id>/return', methods=['POST'])
+@api_view
+@member_required
+def return_loan(loan_id):
+    loan = member_loan(loan_id)
+    run_loan_action(loan.return_loan)
+    return loan_result(loan)
@@ -2,8 +2,12 @@ from flask_login import login_user, login_required, logout_user, current_user
 from flask import Blueprint, request, redirect, render_template, url_for, flash
 from app import app
 
+from app.config import MESSAGES
 from app.models.forms import RegisterForm, LoginForm
-from app.models.users import User
+from app.repositories import repository
+from app.services.circuit_breaker import db_breaker, DatabaseUnavailable
+from app.services.login_throttle import login_throttle
+from app.services.passwords import PasswordHashingBusy
 
 auth = Blueprint('auth', __name__)
 
@@ -12,9 +16,18 @@ def register():
     form = RegisterForm()
     if request.method == 'POST':
         if form.validate():
-            existing_user = User.getUser(email=form.email.data)
+            try:
+                existing_user = db_breaker.call(repository.get_user, form.email.data)
+                if not existing_user:
+                    db_breaker.call(repository.create_user, email=form.email.data,
+                                    password=form.password.data, name=form.name.data)
+            except PasswordHashingBusy:
+                flash(MESSAGES['password_busy'], 'error')
+                return render_template('register.html', form=form, panel="REGISTER"), 503
+            except DatabaseUnavailable:
+                flash(MESSAGES['database_unavailable'], 'error')
+                return render_template('register.html', form=form, panel="REGISTER"), 503
             if not existing_user:
-                User.createUser(email=form.email.data, password=form.password.data, name=form.name.data)
                 flash('Registration successful! Please log in.', 'success')
                 return redirect(url_for('auth.login'))
             else:
@@ -26,11 +39,35 @@ def login():
     form = LoginForm()
     if request.method == 'POST':
         if form.validate():
-            user = User.getUser(email=form.email.data)
-            if user and user.check_password(form.password.data):
+            email, ip = form.email.data, request.remote_addr
+            # Refuse throttled attempts before spending any CPU on hashing
+            if not login_throttle.allowed(email, ip):
+                flash(MESSAGES['login_throttled'], 'error')
+                return render_template('login.html', form=form, panel="LOGIN"), 429
+
+            try:
+                # Fail fast while MongoDB is down instead of waiting for server selection
+                user = db_breaker.call(repository.get_user, email)
+            except DatabaseUnavailable:
+                flash(MESSAGES['database_unavailable'], 'error')
+                return render_template('login.html', form=form, panel="LOGIN"), 503
+
+            try:
+                valid = user is not None and user.check_password(form.password.data)
+            except PasswordHashingBusy:
+                flash(MESSAGES['password_busy'], 'error')
+                return render_template('login.html', form=form, panel="LOGIN"), 503
+
+            if valid:
+                try:
+                    user.upgrade_password(form.password.data)
+                except PasswordHashingBusy:
+                    pass  # Best effort: upgraded on a later login instead
+                login_throttle.succeeded(email, ip)
                 login_user(user, remember=form.remember.data)
                 return redirect(url_for('books.book_titles'))      
             else:
+                login_throttle.failed(email, ip)
                 if user:
                     form.password.errors.append("Incorrect password")
                 else:
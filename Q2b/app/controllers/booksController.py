@@ -1,43 +1,37 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+import hmac
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, make_response, Response, abort
 from flask_login import login_required, current_user
-from app.config import TITLES, BOOK_CATEGORIES, UI_CONFIG, MESSAGES
+from app.config import TITLES, BOOK_CATEGORIES, BOOK_GENRES, CATALOG_SORTS, UI_CONFIG, MESSAGES, AVAILABILITY_EVENTS, METRICS
 from app.models.books import Book
 from app.models.forms import AddBookForm
+from app.repositories import repository
+from app.services.autocomplete import autocomplete_index
+from app.services.http_cache import conditional_page, make_etag, viewer_key
+from app.services.metrics import metrics
+from app.services.circuit_breaker import db_breaker, DatabaseUnavailable
+from app.services.catalog_snapshot import catalog_snapshot
+from app.services.fragment_cache import fragment_cache, assemble, slot
+from app.services.availability_events import availability_broker
 
 # Create Blueprint for book-related routes
 books = Blueprint('books', __name__)
 
-@books.route('/', methods=['GET', 'POST'])
-def book_titles():
-    """Display filtered and sorted book titles with previews"""
-    # Get the category filter from the form (default is 'All')
-    category_filter = request.form.get('category', 'All')
-    
-    # Filter books by category using MongoDB queries
-    if category_filter != 'All':
-        filtered_books = Book.objects(category=category_filter)
-    else:
-        filtered_books = Book.objects()
-
-    # Sort books by title (MongoDB query)
-    sorted_books = filtered_books.order_by('title')
-
-    # Convert to list and add preview descriptions
-    books_list = []
-    for book in sorted_books:
-        book_dict = {
-            'id': str(book.id),  # Use MongoDB ObjectId as identifier
-            'title': book.title,
-            'category': book.category,
-            'genres': book.genres,
-            'authors': book.authors,
-            'url': book.url,
-            'pages': book.pages,
-            'available': book.available,
-            'copies': book.copies,
-            'description': book.description
-        }
-        
+def book_to_dict(book, with_preview=False):
+    """Convert a Book document to the dict used by the book templates"""
+    book_dict = {
+        'id': str(book.id),  # Use MongoDB ObjectId as identifier
+        'title': book.title,
+        'category': book.category,
+        'genres': book.genres,
+        'authors': book.authors,
+        'url': book.url,
+        'pages': book.pages,
+        'available': book.available,
+        'copies': book.copies,
+        'description': book.description
+    }
+
+    if with_preview:
         # Create description preview
         paragraphs = book.description
         max_preview = UI_CONFIG['max_description_preview']
@@ -45,58 +39,393 @@ def book_titles():
             book_dict['description_preview'] = f"{paragraphs[0]}<br><br>{paragraphs[-1]}"
         else:
             book_dict['description_preview'] = paragraphs[0] if paragraphs else ""
-            
-        books_list.append(book_dict)
+
+    return book_dict
+
+def viewer_role():
+    """Role that decides which buttons a fragment shows ('admin' or 'reader')"""
+    return 'admin' if current_user.is_authenticated and current_user.is_admin else 'reader'
+
+# Fields needed to look up a catalog card in the fragment cache
+CARD_KEY_FIELDS = ('id', 'revision', 'available', 'copies')
+
+def cached_cards(books_page):
+    """
+    Static cards of the page that are in the fragment cache, by book id. Held
+    while the page renders, so a card evicted in the meantime is not reloaded.
+    """
+    cached = {}
+    for book in books_page:
+        html = fragment_cache.get(('card', str(book.id), book.revision or 0))
+        if html is not None:
+            cached[book.id] = html
+    return cached
+
+def build_cards(books_page, load_full=None, cached=None):
+    """
+    Assemble catalog cards from cached fragments.
+
+    Args:
+        books_page: Book objects with at least id, revision and available loaded
+        load_full: Optional callable taking a list of ids and returning full Book
+                   objects; used only for cards missing from the cache
+        cached: Optional result of cached_cards() for books_page, when the
+                caller already looked the cards up (to load the missing ones itself)
+
+    Returns:
+        List of rendered card Markup, in the same order as books_page
+    """
+    role = viewer_role()
+
+    full_books = {}
+    if load_full is not None:
+        if cached is None:
+            cached = cached_cards(books_page)
+        missing = [book.id for book in books_page if book.id not in cached]
+        if missing:
+            full_books = {book.id: book for book in load_full(missing)}
+    cached = cached or {}
+
+    cards = []
+    for book in books_page:
+        book_id = str(book.id)
+        source = full_books.get(book.id, book)
+        card = cached.get(book.id) or fragment_cache.get_or_render(
+            ('card', book_id, book.revision or 0), 'fragments/bookCard.html',
+            lambda: {'book': book_to_dict(source, with_preview=True),
+                     'availability_slot': slot('availability')})
+        actions = fragment_cache.get_or_render(
+            ('card-actions', book_id, book.available, book.copies, role), 'fragments/bookCardActions.html',
+            lambda: {'book': {'id': book_id, 'available': book.available, 'copies': book.copies},
+                     'viewer_role': role, 'holds_enabled': repository.supports_holds})
+        cards.append(assemble(card, availability=actions))
+    return cards
+
+def get_facets(state=None):
+    """
+    Build facet values with their title counts from the precomputed catalog state.
+    No books are scanned here - the counts are maintained on create/borrow/return.
+    """
+    state = state or repository.catalog_state()
+    category_counts = state.categoryCounts or {}
+    genre_counts = state.genreCounts or {}
+
+    categories = []
+    for value, label in BOOK_CATEGORIES:
+        if value == 'All':
+            count = sum(category_counts.values())
+        else:
+            count = category_counts.get(value, 0)
+        categories.append({'value': value, 'label': label, 'count': count})
+
+    genres = [{'value': genre, 'label': genre, 'count': genre_counts.get(genre, 0)}
+              for genre in BOOK_GENRES]
+
+    return {
+        'categories': categories,
+        'genres': genres,
+        'available': state.availableTitles or 0
+    }
+
+def page_links(endpoint, total_pages):
+    """Build (page number, url) pairs that keep the current query parameters"""
+    args = request.args.to_dict(flat=False)
+    links = []
+    for number in range(1, total_pages + 1):
+        args['page'] = [number]
+        links.append((number, url_for(endpoint, **args)))
+    return links
+
+def catalog_filters():
+    """Read the catalog filters and page from the query string (default category is 'All')"""
+    page = max(request.args.get('page', 1, type=int) or 1, 1)
+    per_page = UI_CONFIG['books_per_page']
+    sort = request.args.get('sort', 'title')
+    return {
+        'category': request.args.get('category', 'All'),
+        'genres': [genre for genre in request.args.getlist('genres') if genre in BOOK_GENRES],
+        'available_only': request.args.get('available') == '1',
+        'sort': sort if sort in dict(CATALOG_SORTS) else 'title',
+        'page': page,
+        'per_page': per_page,
+        'skip': (page - 1) * per_page if per_page else 0
+    }
+
+def catalog_etag(state):
+    """Validator for a catalog view: catalog version, query string and viewer"""
+    return make_etag('titles', state.version, request.query_string.decode(), viewer_key())
+
+def stale_message(stale_since):
+    """Banner text for pages served from the fallback snapshot"""
+    if stale_since is None:
+        return None
+    return MESSAGES['catalog_stale'].format(time=stale_since.strftime('%d %b %Y %H:%M UTC'))
+
+def render_catalog_page(state, filters, page_books, total, load_full, stale_since=None, cached=None):
+    """Render bookTitles.html for one page of (partially loaded) books"""
+    per_page = filters['per_page']
+    total_pages = (total + per_page - 1) // per_page if per_page else 1
+    cards = build_cards(page_books, load_full=load_full, cached=cached)
 
     return render_template('bookTitles.html', 
-                         books=books_list, 
-                         book_count=len(books_list),
-                         selected_category=category_filter,
+                         cards=cards, 
+                         book_count=total,
+                         selected_category=filters['category'],
+                         selected_genres=filters['genres'],
+                         available_only=filters['available_only'],
+                         selected_sort=filters['sort'],
+                         sorts=CATALOG_SORTS,
+                         facets=get_facets(state),
+                         page=filters['page'],
+                         total_pages=total_pages,
+                         page_links=page_links('books.book_titles', total_pages),
+                         stale_message=stale_message(stale_since),
                          categories=BOOK_CATEGORIES)
 
-@books.route('/book/<book_id>')
-def book_details(book_id):
-    """Display detailed view of a specific book"""
+def load_books(book_ids):
+    """Full books for the cards missing from the fragment cache, through the circuit breaker"""
+    return db_breaker.call(repository.get_books, book_ids)
+
+def live_catalog_page(filters):
+    """
+    Catalog page served from the storage backend (with 304s when nothing changed).
+    Only the storage calls go through the circuit breaker, so slow template
+    rendering is never counted as a slow database call.
+
+    Raises:
+        DatabaseUnavailable if the storage backend fails or the breaker is open
+    """
+    # The catalog version changes on every create/borrow/return, so it
+    # validates any catalog view without touching the books collection
+    state = db_breaker.call(repository.catalog_state)
+
+    def render():
+        # Filter books by category and genres, in the chosen order.
+        # Only the fields the cache keys need are loaded; full documents are
+        # fetched just for cards that are not cached yet
+        page_books, total = db_breaker.call(repository.find_books, filters['category'], filters['genres'],
+                                            filters['available_only'], filters['sort'],
+                                            skip=filters['skip'], limit=filters['per_page'],
+                                            fields=CARD_KEY_FIELDS)
+        return render_catalog_page(state, filters, page_books, total, load_full=load_books)
+
+    return conditional_page(catalog_etag(state), state.updatedAt, render)
+
+def stale_catalog_page(filters):
+    """Catalog page served from the last good in-memory snapshot while MongoDB is unavailable"""
+    if not catalog_snapshot.available:
+        response = make_response(render_template('bookTitles.html', cards=[], book_count=0,
+                                                 selected_category=filters['category'],
+                                                 categories=BOOK_CATEGORIES,
+                                                 stale_message=MESSAGES['database_unavailable']), 503)
+    else:
+        page_books, total = catalog_snapshot.query(filters)
+        response = make_response(render_catalog_page(catalog_snapshot.state, filters, page_books, total,
+                                                     load_full=None, stale_since=catalog_snapshot.taken_at))
+    # Never let a stale page be cached
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@books.route('/', methods=['GET', 'POST'])
+def book_titles():
+    """Display filtered and sorted book titles with previews"""
+    if request.method == 'POST':
+        # Older forms post the filter; redirect so the view has a bookmarkable URL
+        return redirect(url_for('books.book_titles',
+                                category=request.form.get('category', 'All'),
+                                genres=request.form.getlist('genres'),
+                                available=request.form.get('available')), code=303)
+
+    filters = catalog_filters()
     try:
-        # Get the book details from MongoDB using ObjectId
-        book = Book.objects.get(id=book_id)
-        
-        # Convert to dict for template compatibility
-        book_dict = {
-            'id': str(book.id),
-            'title': book.title,
-            'category': book.category,
-            'genres': book.genres,
-            'authors': book.authors,
-            'url': book.url,
-            'pages': book.pages,
-            'available': book.available,
-            'copies': book.copies,
-            'description': book.description
-        }
-        
-        return render_template('bookDetails.html', book=book_dict)
-    except Book.DoesNotExist:
-        # Handle case where book_id is invalid
-        return render_template('bookDetails.html', 
-                             book=None, 
-                             error_message=MESSAGES['book_not_found'])
+        return live_catalog_page(filters)
+    except DatabaseUnavailable:
+        return stale_catalog_page(filters)
+
+@books.route('/search')
+def search_books():
+    """Full-text search over title, authors, genres and description"""
+    query = request.args.get('q', '').strip()
+    category_filter = request.args.get('category', 'All')
+    page = max(request.args.get('page', 1, type=int) or 1, 1)
+    per_page = UI_CONFIG['search_results_per_page']
+
+    def live_search_page():
+        state = db_breaker.call(repository.catalog_state)
+        etag = make_etag('search', state.version, request.query_string.decode(), viewer_key())
+        return conditional_page(etag, state.updatedAt, render)
+
+    def render():
+        results, total = db_breaker.call(repository.search_books, query, category=category_filter,
+                                         page=page, per_page=per_page)
+        cards = build_cards(results)
+
+        total_pages = (total + per_page - 1) // per_page
+
+        return render_template('bookTitles.html',
+                             cards=cards,
+                             book_count=total,
+                             selected_category=category_filter,
+                             categories=BOOK_CATEGORIES,
+                             search_query=query,
+                             page=page,
+                             total_pages=total_pages,
+                             page_links=page_links('books.search_books', total_pages),
+                             empty_message=MESSAGES['no_search_results'] if query else None)
+
+    try:
+        return live_search_page()
+    except DatabaseUnavailable:
+        # The text index lives in MongoDB, so there is nothing to fall back to
+        response = make_response(render_template('bookTitles.html', cards=[], book_count=0,
+                                                 selected_category=category_filter,
+                                                 categories=BOOK_CATEGORIES, search_query=query,
+                                                 stale_message=MESSAGES['database_unavailable']), 503)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+@books.route('/autocomplete')
+def autocomplete():
+    """Typeahead suggestions for title and author prefixes (served from memory)"""
+    prefix = request.args.get('q', '')
+    max_results = UI_CONFIG['autocomplete_max_results']
+    limit = min(request.args.get('limit', max_results, type=int) or max_results, max_results)
+
+    if not autocomplete_index.loaded:
+        # Startup could not reach the database; build once on first use
+        try:
+            autocomplete_index.build(db_breaker.call(repository.autocomplete_rows))
+        except Exception:
+            return jsonify({'query': prefix, 'suggestions': []})
+
+    return jsonify({'query': prefix, 'suggestions': autocomplete_index.suggest(prefix, limit)})
+
+def book_etag(book, similar=None):
+    """
+    Validate on the book's own change time (falls back to its availability for
+    older documents) and on when its similar-books list was last rebuilt
+    """
+    similar_updated = similar.get('updatedAt') if similar else None
+    return make_etag('book', book.id, book.updatedAt, book.available, book.copies, similar_updated, viewer_key())
+
+def render_book_details(book, stale_since=None, similar=None):
+    """
+    Render the details page from the cached static card plus availability
+    fragments. `similar` is the book's raw recommendation document, if any.
+    """
+    book_id = str(book.id)
+    role = viewer_role()
+    availability = {'id': book_id, 'available': book.available, 'copies': book.copies}
+
+    info = fragment_cache.get_or_render(
+        ('details', book_id, book.revision or 0), 'fragments/bookInfo.html',
+        lambda: {'book': book_to_dict(book), 'copies_slot': slot('copies'), 'actions_slot': slot('actions')})
+    copies = fragment_cache.get_or_render(
+        ('details-copies', book_id, book.available, book.copies), 'fragments/bookAvailability.html',
+        lambda: {'book': availability})
+    actions = fragment_cache.get_or_render(
+        ('details-actions', book_id, int(book.available or 0) > 0, role), 'fragments/bookDetailsActions.html',
+        lambda: {'book': availability, 'viewer_role': role, 'holds_enabled': repository.supports_holds})
+
+    return render_template('bookDetails.html', book_html=assemble(info, copies=copies, actions=actions),
+                           similar_books=similar.get('similar', []) if similar else [],
+                           stale_message=stale_message(stale_since))
+
+def live_book_details(book_id):
+    """
+    Details page served from the storage backend (with 304s when the book has not changed).
+
+    Raises:
+        DatabaseUnavailable if the storage backend fails or the breaker is open
+    """
+    try:
+        book = db_breaker.call(repository.get_book, book_id, catalog=True)
+        if book is None:
+            # Handle case where book_id is invalid
+            return render_template('bookDetails.html', 
+                                 book_html=None, 
+                                 error_message=MESSAGES['book_not_found'])
+        similar = db_breaker.call(repository.similar_books, book)
+
+        return conditional_page(book_etag(book, similar), book.updatedAt,
+                                lambda: render_book_details(book, similar=similar))
+    except DatabaseUnavailable:
+        # Served from the snapshot by the caller
+        raise
     except Exception as e:
         # Handle other errors (invalid ObjectId format, etc.)
         return render_template('bookDetails.html', 
-                             book=None, 
+                             book_html=None, 
                              error_message=MESSAGES['book_not_found'])
 
+@books.route('/book/<book_id>')
+def book_details(book_id):
+    """Display detailed view of a specific book"""
+    try:
+        return live_book_details(book_id)
+    except DatabaseUnavailable:
+        book = catalog_snapshot.get(book_id)
+        if book is None:
+            response = make_response(render_template('bookDetails.html', book_html=None,
+                                                     error_message=MESSAGES['database_unavailable']), 503)
+        else:
+            response = make_response(render_book_details(book, stale_since=catalog_snapshot.taken_at))
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+@books.route('/events/availability')
+def availability_events():
+    """
+    Server-Sent Events stream of availability changes for the books listed in
+    `ids` (comma separated), so open pages update without reloading.
+    """
+    book_ids = [book_id for book_id in request.args.get('ids', '').split(',') if book_id]
+    book_ids = set(book_ids[:AVAILABILITY_EVENTS['max_books']]) or None
+
+    response = Response(
+        availability_broker.stream(book_ids, AVAILABILITY_EVENTS['heartbeat_seconds']),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @books.route('/db-status')
 def db_status():
     """Check database status"""
     try:
         # Try to count books instead of server_info which can cause socket issues
-        book_count = Book.objects.count()
+        book_count = repository.count_books()
+        if repository.name == 'memory':
+            return f"Using in-memory storage<br>Books in catalog: {book_count}"
         return f"MongoDB connected successfully<br>Books in database: {book_count}<br>Application is now using MongoDB data"
     except Exception as e:
         return f"Database error: {str(e)}<br>Try restarting the app to reinitialize the database."
 
+# Addresses of requests made from the server itself
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+
+def can_read_metrics():
+    """Check if the request is from an admin, the server itself or a scraper with the metrics token"""
+    if current_user.is_authenticated and current_user.is_admin:
+        return True
+    if METRICS['allow_loopback'] and request.remote_addr in LOOPBACK_ADDRESSES:
+        return True
+    token = METRICS['token']
+    supplied = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(supplied.encode('utf-8'), f"Bearer {token}".encode('utf-8'))
+
+@books.route('/metrics')
+def app_metrics():
+    """Process metrics (MongoDB pool utilization, counters) as JSON"""
+    if not can_read_metrics():
+        # Pool sizes and error counters help an attacker time an overload
+        abort(404)
+    response = jsonify(metrics.snapshot())
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 @books.route('/add-book', methods=['GET', 'POST'])
 @login_required
 def add_book():
@@ -169,7 +498,7 @@ def add_book():
                     # Check for potential duplicates (only if not confirming)
                     if 'confirm_duplicate' not in request.form and 'confirm_repeated_authors' not in request.form:
                         # Check if a book with same title and at least one matching author exists
-                        existing_books = Book.objects(title__iexact=form.title.data.strip())
+                        existing_books = repository.find_books_by_title(form.title.data)
                         
                         for existing_book in existing_books:
                             # Check if any author matches (case insensitive)
@@ -201,7 +530,7 @@ def add_book():
                     }
                     
                     # Save book to database
-                    Book.create_book(book_data)
+                    repository.create_book(book_data)
                     
                     # Clear session data and form data after successful submission
                     session.pop('author_count', None)
@@ -0,0 +1,67 @@
+from flask import Blueprint, abort, redirect, request, send_file, url_for
+from app.config import COVER_CONFIG
+from app.repositories import repository
+from app.services.circuit_breaker import db_breaker, DatabaseUnavailable
+from app.services.covers import can_produce, get_cover_store, source_key
+
+# Create Blueprint for locally cached cover images
+covers = Blueprint('covers', __name__)
+
+
+@covers.app_template_global()
+def cover_url(url, width=None, fmt='jpeg'):
+    """URL of a locally cached cover (or a resized variant) for a book's cover URL"""
+    if not url:
+        return ''
+    width = width or COVER_CONFIG['widths'][-1]
+    return url_for('covers.cover_image', key=source_key(url), width=width, fmt=fmt, src=url)
+
+
+@covers.app_template_global()
+def cover_format_supported(fmt):
+    """Whether covers can be offered in `fmt` (e.g. WebP sources need Pillow)"""
+    return can_produce(fmt)
+
+
+@covers.app_template_global()
+def cover_srcset(url, fmt='jpeg'):
+    """srcset attribute value listing every configured thumbnail width"""
+    if not url:
+        return ''
+    return ', '.join(f"{cover_url(url, width, fmt)} {width}w" for width in COVER_CONFIG['widths'])
+
+
+@covers.route('/covers/<key>/<int:width>.<fmt>')
+def cover_image(key, width, fmt):
+    """
+    Serve a cover thumbnail from the local store. The URL is derived from the
+    source URL, so responses are cached by browsers for a year.
+    """
+    src = request.args.get('src', '')
+    if not src or source_key(src) != key:
+        abort(404)
+
+    store = get_cover_store()
+    digest = store.digest_for(key)
+    if digest is None:
+        # Only fetch covers that belong to a book in the catalog
+        try:
+            book = db_breaker.call(repository.book_with_cover, src)
+        except DatabaseUnavailable:
+            # Cannot vet the URL right now - let the browser try the source
+            return redirect(src)
+        if book is None:
+            abort(404)
+        digest = store.store(src)
+        if digest is None:
+            # Could not cache it (offline and no local file) - let the browser try the source
+            return redirect(src)
+
+    # The variant, or the original with its real type when the variant cannot be made
+    path, mimetype = store.variant(digest, width, fmt)
+    if mimetype is None:
+        abort(404)  # The stored original is not an image
+    response = send_file(path, mimetype=mimetype, max_age=COVER_CONFIG['max_age'],
+                         etag=digest, conditional=True)
+    response.headers['Cache-Control'] = f"public, max-age={COVER_CONFIG['max_age']}, immutable"
+    return response
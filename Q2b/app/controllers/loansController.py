@@ -1,16 +1,94 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, g
 from flask_login import login_required, current_user
 from app.config import TITLES, UI_CONFIG, MESSAGES
-from app.models.loans import Loan
-from app.models.books import Book
-from app.models.users import User
+from app.models.holds import Hold
+from app.repositories import repository
 from datetime import datetime
+from functools import wraps
+from pymongo.errors import PyMongoError
+from app.services.circuit_breaker import db_breaker, DatabaseUnavailable
 
 # Create Blueprint for loan-related routes
 loans = Blueprint('loans', __name__)
 
+def requires_database(view):
+    """
+    Run a loan mutation through the database circuit breaker. While MongoDB
+    is unavailable the request fails fast with a clear message instead of
+    waiting for server selection to time out.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            return db_breaker.call(view, *args, **kwargs)
+        except DatabaseUnavailable:
+            flash(MESSAGES['database_unavailable'], 'error')
+            return redirect(url_for('books.book_titles'))
+    return wrapper
+
+def requires_holds(view):
+    """Turn hold actions away with a clear message when the storage backend has no holds"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not repository.supports_holds:
+            flash(MESSAGES['holds_unsupported'], 'error')
+            return redirect(url_for('books.book_titles'))
+        return view(*args, **kwargs)
+    return wrapper
+
+def loan_to_dict(loan, book=None):
+    """
+    Convert a Loan document to the dict used by loans.html.
+    `book` may be passed when it was already loaded (e.g. by a $lookup).
+    """
+    book = book or loan.book
+    return {
+        'id': str(loan.id),
+        'book_title': book.title,
+        'book_authors': ', '.join(book.authors),
+        'book_url': book.url,
+        'borrow_date': loan.borrowDate,
+        'due_date': loan.due_date,
+        'return_date': loan.returnDate,
+        'renew_count': loan.renewCount,
+        'is_overdue': loan.is_overdue,
+        'is_returned': loan.is_returned,
+        'can_renew': loan.can_renew,
+        'can_return': loan.can_return,
+        'can_delete': loan.can_delete
+    }
+
+def hold_to_dict(hold, book=None, position=None):
+    """
+    Convert a Hold document to the dict used by loans.html.
+    `position` may be passed when the queue position was already computed.
+    """
+    book = book or hold.book
+    if position is None:
+        position = hold.queue_position
+    return {
+        'id': str(hold.id),
+        'book_id': str(book.id),
+        'book_title': book.title,
+        'book_authors': ', '.join(book.authors),
+        'book_url': book.url,
+        'created_at': hold.createdAt,
+        'is_ready': hold.is_ready,
+        'expires_at': hold.expiresAt,
+        'position': position if not hold.is_ready else 0
+    }
+
+def render_loans_page(loans_data, holds_data=None):
+    """Render the current member's loans page"""
+    return render_template('loans.html', 
+                         loans=loans_data, 
+                         holds=holds_data or [],
+                         panel="CURRENT LOANS",
+                         no_loans_message="No loan currently" if not loans_data else None)
+
 @loans.route('/make_loan/<book_id>')
 @login_required
+@requires_database
 def make_loan(book_id):
     """
     Create a loan for the current user for the specified book.
@@ -21,12 +99,20 @@ def make_loan(book_id):
         flash('Admin users cannot borrow books.', 'error')
         return redirect(url_for('books.book_titles'))
     
+    # Get the book
+    book = repository.get_book(book_id)
+    if book is None:
+        flash('Book not found.', 'error')
+        # Redirect back to where they came from or book titles
+        referrer = request.referrer
+        if referrer and 'book_details' in referrer:
+            return redirect(url_for('books.book_details', book_id=book_id))
+        else:
+            return redirect(url_for('books.book_titles'))
+
     try:
-        # Get the book
-        book = Book.objects.get(id=book_id)
-        
         # Create the loan
-        loan = Loan.create_loan(current_user, book)
+        loan = repository.create_loan(current_user, book)
 
         # Log and flash borrow date and due date to help debug any datetime issues
         borrow_dt = loan.borrowDate
@@ -41,8 +127,8 @@ def make_loan(book_id):
         flash(f'Successfully borrowed "{book.title}". Borrow Date: {borrow_dt.strftime("%d %b %Y")}. Due Date: {due_dt.strftime("%d %b %Y")}.', 'success')
         # Redirect to the loans page so the user can immediately see their active loans
         return redirect(url_for('loans.view_loans'))
-    except Book.DoesNotExist:
-        flash('Book not found.', 'error')
+    except PyMongoError:
+        raise
     except Exception as e:
         msg = str(e)
         flash(msg, 'error')
@@ -50,61 +136,34 @@ def make_loan(book_id):
         # redirect the user to their loans page so they can see current loan state.
         return redirect(url_for('loans.view_loans'))
 
-    # If we reach here it means loan creation didn't succeed for other reasons
-    # Redirect back to where they came from or book titles
-    referrer = request.referrer
-    if referrer and 'book_details' in referrer:
-        return redirect(url_for('books.book_details', book_id=book_id))
-    else:
-        return redirect(url_for('books.book_titles'))
-
 @loans.route('/loans')
 @login_required
 def view_loans():
     """
     Display all loans for the current user with management options.
     """
-    # Check if user is admin - redirect admins away
+    # Admins have no loans of their own: show them the circulation dashboard
     if current_user.is_admin:
-        flash('Admin users do not have loan records.', 'info')
-        return redirect(url_for('books.book_titles'))
+        return redirect(url_for('admin.circulation_dashboard'))
     
     # Get all loans for the current user
-    user_loans = Loan.get_user_loans(current_user)
+    user_loans = repository.get_user_loans(current_user)
     
     # Prepare loan data for template
-    loans_data = []
-    for loan in user_loans:
-        loan_info = {
-            'id': str(loan.id),
-            'book_title': loan.book.title,
-            'book_authors': ', '.join(loan.book.authors),
-            'book_url': loan.book.url,
-            'borrow_date': loan.borrowDate,
-            'due_date': loan.due_date,
-            'return_date': loan.returnDate,
-            'renew_count': loan.renewCount,
-            'is_overdue': loan.is_overdue,
-            'is_returned': loan.is_returned,
-            'can_renew': loan.can_renew,
-            'can_return': loan.can_return,
-            'can_delete': loan.can_delete
-        }
-        loans_data.append(loan_info)
+    loans_data = [loan_to_dict(loan) for loan in user_loans]
+    holds_data = [hold_to_dict(hold) for hold in repository.get_user_holds(current_user)]
     
-    return render_template('loans.html', 
-                         loans=loans_data, 
-                         panel="CURRENT LOANS",
-                         no_loans_message="No loan currently" if not loans_data else None)
+    return render_loans_page(loans_data, holds_data)
 
 @loans.route('/renew_loan/<loan_id>')
 @login_required
+@requires_database
 def renew_loan(loan_id):
     """
     Renew a specific loan for the current user.
     """
     try:
-        loan = Loan.get_loan_by_id(loan_id)
+        loan = repository.get_loan(loan_id)
         
         if not loan:
             flash('Loan not found.', 'error')
@@ -116,10 +175,12 @@ def renew_loan(loan_id):
             return redirect(url_for('loans.view_loans'))
         
         # Renew the loan
-        loan.renew_loan()
+        loan = repository.renew_loan(loan)
         
         flash(f'Successfully renewed "{loan.book.title}". New due date: {loan.due_date.strftime("%d %b %Y")}.', 'success')
         
+    except PyMongoError:
+        raise
     except Exception as e:
         flash(str(e), 'error')
     
@@ -127,12 +188,13 @@ def renew_loan(loan_id):
 
 @loans.route('/return_loan/<loan_id>')
 @login_required
+@requires_database
 def return_loan(loan_id):
     """
     Return a specific loan for the current user.
     """
     try:
-        loan = Loan.get_loan_by_id(loan_id)
+        loan = repository.get_loan(loan_id)
         
         if not loan:
             flash('Loan not found.', 'error')
@@ -145,10 +207,12 @@ def return_loan(loan_id):
         
         # Return the loan
         book_title = loan.book.title
-        loan.return_loan()
+        repository.return_loan(loan)
         
         flash(f'Successfully returned "{book_title}".', 'success')
         
+    except PyMongoError:
+        raise
     except Exception as e:
         flash(str(e), 'error')
     
@@ -156,12 +220,13 @@ def return_loan(loan_id):
 
 @loans.route('/delete_loan/<loan_id>')
 @login_required
+@requires_database
 def delete_loan(loan_id):
     """
     Delete a specific returned loan for the current user.
     """
     try:
-        loan = Loan.get_loan_by_id(loan_id)
+        loan = repository.get_loan(loan_id)
         
         if not loan:
             flash('Loan not found.', 'error')
@@ -174,15 +239,76 @@ def delete_loan(loan_id):
         
         # Delete the loan
         book_title = loan.book.title
-        loan.delete_loan()
+        repository.delete_loan(loan)
         
         flash(f'Successfully deleted loan record for "{book_title}".', 'success')
         
+    except PyMongoError:
+        raise
     except Exception as e:
         flash(str(e), 'error')
     
     return redirect(url_for('loans.view_loans'))
 
+@loans.route('/place_hold/<book_id>')
+@login_required
+@requires_holds
+@requires_database
+def place_hold(book_id):
+    """
+    Join the queue for a title that has no copies available.
+    """
+    if current_user.is_admin:
+        flash('Admin users cannot place holds.', 'error')
+        return redirect(url_for('books.book_titles'))
+
+    try:
+        book = repository.get_book(book_id)
+        if book is None:
+            flash('Book not found.', 'error')
+            return redirect(url_for('books.book_titles'))
+        hold = Hold.place_hold(current_user, book)
+        flash(f'You are number {hold.queue_position} in the queue for "{book.title}". '
+              f'We will set a copy aside for you when one is returned.', 'success')
+    except PyMongoError:
+        raise
+    except Exception as e:
+        flash(str(e), 'error')
+
+    return redirect(url_for('loans.view_loans'))
+
+@loans.route('/cancel_hold/<hold_id>')
+@login_required
+@requires_holds
+@requires_database
+def cancel_hold(hold_id):
+    """
+    Leave the queue for a title (a copy set aside is passed to the next member).
+    """
+    try:
+        hold = Hold.get_hold_by_id(hold_id)
+
+        if not hold:
+            flash('Hold not found.', 'error')
+            return redirect(url_for('loans.view_loans'))
+
+        # Check if hold belongs to current user
+        if hold.member != current_user:
+            flash('You can only cancel your own holds.', 'error')
+            return redirect(url_for('loans.view_loans'))
+
+        book_title = hold.book.title
+        hold.cancel()
+
+        flash(f'Cancelled your hold on "{book_title}".', 'success')
+
+    except PyMongoError:
+        raise
+    except Exception as e:
+        flash(str(e), 'error')
+
+    return redirect(url_for('loans.view_loans'))
+
 # Helper function for template context
 @loans.app_template_filter('format_date')
 def format_date(date):
@@ -198,8 +324,14 @@ def inject_loan_context():
     context = {}
     
     if current_user.is_authenticated and not current_user.is_admin:
-        # Get current user's active loans count
-        active_loans = Loan.objects(member=current_user, returnDate__exists=False).count()
+        # Get current user's active loans count (the async views fetch it up front)
+        active_loans = g.get('active_loans_count')
+        if active_loans is None:
+            try:
+                active_loans = db_breaker.call(
+                    lambda: repository.count_active_loans(current_user))
+            except DatabaseUnavailable:
+                return context
         context['active_loans_count'] = active_loans
     
     return context
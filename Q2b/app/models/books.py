@@ -1,8 +1,94 @@
 from app import db
+from datetime import datetime
+from flask import current_app, has_app_context
+from pymongo.read_preferences import ReadPreference
 from books.books import all_books  # Import the global book data
+from app.config import POPULARITY
+from app.services.autocomplete import autocomplete_index
+from app.models.catalog import CatalogState
+from app.models.concurrency import versioned_update, after_commit
+from app.services.availability_events import publish_availability
+
+READ_PREFERENCES = {
+    'primary': ReadPreference.PRIMARY,
+    'primaryPreferred': ReadPreference.PRIMARY_PREFERRED,
+    'secondary': ReadPreference.SECONDARY,
+    'secondaryPreferred': ReadPreference.SECONDARY_PREFERRED,
+    'nearest': ReadPreference.NEAREST
+}
+
+# order_by() arguments for each catalog sort option (see CATALOG_SORTS)
+SORT_ORDERS = {
+    'title': ('title',),
+    'trending': ('-trendingScore', 'title'),
+    'popular': ('-borrowCount', 'title')
+}
+
+def sort_spec(sort):
+    """PyMongo sort list for a catalog sort option"""
+    return [(field.lstrip('-'), -1 if field.startswith('-') else 1)
+            for field in SORT_ORDERS.get(sort, SORT_ORDERS['title'])]
+
+def borrow_update(book, qty):
+    """
+    Fields to set when `qty` copies of a book are borrowed.
+
+    Raises:
+        Exception if fewer than `qty` copies are available
+    """
+    available = int(book.available or 0)
+    if available < qty:
+        raise Exception("Not enough available copies to borrow")
+    return {'available': max(available - qty, 0), 'updatedAt': datetime.utcnow()}
+
+def return_update(book, qty):
+    """
+    Fields to set when `qty` copies of a book come back.
+
+    Raises:
+        Exception if that many copies are not out on loan
+    """
+    total_copies = int(book.copies or 0)
+    avail = int(book.available or 0)
+
+    borrowed = total_copies - avail
+    if borrowed <= 0:
+        raise Exception("No copies of this title are currently borrowed")
+
+    if qty > borrowed:
+        raise Exception("Cannot return more copies than have been borrowed")
+
+    # ensure available does not exceed total copies
+    return {'available': min(avail + qty, total_copies), 'updatedAt': datetime.utcnow()}
+
+def catalog_read_preference():
+    """Read preference for catalog pages (may route to replica-set secondaries)"""
+    name = current_app.config.get('CATALOG_READ_PREFERENCE', 'primary') if has_app_context() else 'primary'
+    return READ_PREFERENCES.get(name, ReadPreference.PRIMARY)
 
 class Book(db.Document):
-    meta = {'collection': 'books'}
+    meta = {
+        'collection': 'books',
+        'indexes': [
+            'category',
+            'url',
+            # Keyset pagination of the API's book list
+            ('title', 'id'),
+            # "Top N (in category X)" by trending score or total borrows. The
+            # title tie-breaker of SORT_ORDERS is part of each key, so the sort
+            # is a bounded index walk (forwards, or backwards for "least")
+            ('category', '-trendingScore', 'title'),
+            ('-trendingScore', 'title'),
+            ('category', '-borrowCount', 'title'),
+            ('-borrowCount', 'title'),
+            # Full-text index used by the catalog search (see search_books)
+            {
+                'fields': ['$title', '$authors', '$genres', '$description'],
+                'default_language': 'english',
+                'weights': {'title': 10, 'authors': 6, 'genres': 3, 'description': 1}
+            }
+        ]
+    }
     genres = db.ListField(db.StringField(), required=True)
     title = db.StringField(required=True)
     category = db.StringField(required=True)  # Changed from ListField to StringField
@@ -12,6 +98,19 @@ class Book(db.Document):
     pages = db.IntField()
     available = db.IntField()
     copies = db.IntField()
+    updatedAt = db.DateTimeField()  # Last change to this book, used for HTTP validators
+    revision = db.IntField(default=0)  # Bump when descriptive fields change; keys cached fragments
+    version = db.IntField(default=0)  # Optimistic concurrency token, bumped on every availability update
+    borrowCount = db.IntField(default=0)  # Total loans ever made of this title
+    trendingScore = db.FloatField(default=0)  # Time-decayed borrows, scaled to POPULARITY['epoch'] (see trending_weight)
+
+    @staticmethod
+    def catalog():
+        """
+        QuerySet for read-only catalog views. Uses the catalog read preference,
+        so these reads can go to secondaries while loan writes stay on the primary.
+        """
+        return Book.objects.read_preference(catalog_read_preference())
 
     @staticmethod
     def getTitles(title):
@@ -33,15 +132,120 @@ class Book(db.Document):
         """
         try:
             book = Book(**book_data)
+            book.updatedAt = datetime.utcnow()
             book.save()
-            return book
         except Exception as e:
             raise Exception(f"Error creating book: {str(e)}")
 
-    def borrow(self, quantity=1):
+        CatalogState.record_book_added(book)
+
+        # Keep the in-memory typeahead index in step with the collection
+        autocomplete_index.add_book(str(book.id), book.title, book.authors)
+
+        # Recommendations are a nice-to-have: never fail adding a book over them
+        try:
+            from app.models.recommendations import Recommendation
+            Recommendation.add_book(book)
+        except Exception as e:
+            print(f"Warning: Could not update recommendations for {book.title}: {e}")
+        return book
+
+    @staticmethod
+    def load_autocomplete_index():
+        """
+        Build the typeahead index from the books collection.
+        Only the title and authors fields are fetched.
+        """
+        from app.repositories.mongo import MongoRepository
+
+        autocomplete_index.build(MongoRepository().autocomplete_rows())
+        return autocomplete_index
+
+    @staticmethod
+    def filter_books(category='All', genres=None, available_only=False, sort='title'):
+        """
+        Build a catalog queryset for any combination of category and genres.
+
+        Args:
+            category: Category to filter by ('All' means no filter)
+            genres: Optional list of genres; a book must have all of them
+            available_only: If True, only titles with a copy available
+            sort: 'title', 'trending' or 'popular' (see SORT_ORDERS)
+
+        Returns:
+            QuerySet of Book objects in the requested order
+        """
+        query = Book.catalog()
+        if category and category != 'All':
+            query = query.filter(category=category)
+        if genres:
+            query = query.filter(genres__all=list(genres))
+        if available_only:
+            query = query.filter(available__gt=0)
+        return query.order_by(*SORT_ORDERS.get(sort, SORT_ORDERS['title']))
+
+    @staticmethod
+    def search_books(query, category='All', page=1, per_page=10):
+        """
+        Search the catalog using the MongoDB text index over title, authors,
+        genres and description.
+
+        Args:
+            query: Search terms entered by the user
+            category: Optional category filter ('All' means no filter)
+            page: 1-based page number
+            per_page: Number of results per page
+
+        Returns:
+            Tuple of (list of Book objects ranked by relevance, total number of matches)
+        """
+        query = (query or '').strip()
+        if not query:
+            return [], 0
+
+        results = Book.catalog().filter(category=category) if category != 'All' else Book.catalog()
+        results = results.search_text(query)
+
+        total = results.count()
+        page = max(int(page or 1), 1)
+        ranked = results.order_by('$text_score').skip((page - 1) * per_page).limit(per_page)
+
+        return list(ranked), total
+
+    @staticmethod
+    def trending_weight(when=None):
+        """
+        Amount a borrow at `when` adds to trendingScore. Instead of decaying
+        every score over time, each new borrow is weighted up by 2^(t / half-life),
+        which keeps the ordering identical to exponentially decayed counts and
+        lets a borrow be recorded with a single $inc.
+        """
+        days = ((when or datetime.utcnow()) - POPULARITY['epoch']).total_seconds() / 86400
+        return 2 ** (days / POPULARITY['half_life_days'])
+
+    @staticmethod
+    def current_trending(score, now=None):
+        """A stored trendingScore expressed as decayed borrows as of `now`"""
+        return (score or 0) / Book.trending_weight(now)
+
+    @staticmethod
+    def record_borrow(book_id, borrow_date=None, session=None):
+        """
+        Count a new loan of a book towards its popularity and trending scores.
+        The borrow is weighted by the loan's `borrow_date` (default now), as
+        Loan.backfill_popularity weights past loans.
+        """
+        Book._get_collection().update_one(
+            {'_id': book_id},
+            {'$inc': {'borrowCount': 1, 'trendingScore': Book.trending_weight(borrow_date)}},
+            session=session
+        )
+
+    def borrow(self, quantity=1, session=None):
         """
         Borrow a given quantity of this book.
-        Decrements `available` by `quantity` and saves the document.
+        Decrements `available` by `quantity` with a version-checked update,
+        so two concurrent borrows can never both take the last copy.
 
         Sanity checks:
         - quantity must be a positive integer
@@ -58,24 +262,23 @@ class Book(db.Document):
         if qty <= 0:
             raise ValueError("Quantity to borrow must be positive")
 
-        if self.available is None:
-            self.available = 0
+        before = {}
 
-        if self.available < qty:
-            raise Exception("Not enough available copies to borrow")
+        def apply_change(book):
+            # Re-evaluated against the latest copy of the book on every retry
+            before['available'] = int(book.available or 0)
+            return borrow_update(book, qty)
 
-        # perform the borrow
-        self.available = self.available - qty
-        if self.available < 0:
-            # extra guard - should not happen because of check above
-            self.available = 0
-        self.save()
+        versioned_update(self, apply_change, 'book', session=session)
+        CatalogState.record_availability_change(before['available'], self.available, session=session)
+        # Push the new count to viewers once it is visible to everyone
+        after_commit(session, lambda: publish_availability(self))
         return self
 
-    def return_book(self, quantity=1):
+    def return_book(self, quantity=1, session=None):
         """
         Return a given quantity of this book.
-        Increments `available` by `quantity` and saves the document.
+        Increments `available` by `quantity` with a version-checked update.
 
         Sanity checks:
         - quantity must be a positive integer
@@ -92,23 +295,16 @@ class Book(db.Document):
         if qty <= 0:
             raise ValueError("Quantity to return must be positive")
 
-        # Ensure numeric fields are set
-        total_copies = int(self.copies or 0)
-        avail = int(self.available or 0)
-
-        borrowed = total_copies - avail
-        if borrowed <= 0:
-            raise Exception("No copies of this title are currently borrowed")
+        before = {}
 
-        if qty > borrowed:
-            raise Exception("Cannot return more copies than have been borrowed")
+        def apply_change(book):
+            before['available'] = int(book.available or 0)
+            return return_update(book, qty)
 
-        # perform the return
-        self.available = avail + qty
-        # ensure available does not exceed total copies
-        if self.available > total_copies:
-            self.available = total_copies
-        self.save()
+        versioned_update(self, apply_change, 'book', session=session)
+        CatalogState.record_availability_change(before['available'], self.available, session=session)
+        # Push the new count to viewers once it is visible to everyone
+        after_commit(session, lambda: publish_availability(self))
         return self
     
     @staticmethod
@@ -131,7 +327,9 @@ class Book(db.Document):
                 if not Book.objects(title=title).first():
                     # Create a new Book instance with the data
                     book = Book(**book_data)
+                    book.updatedAt = datetime.utcnow()
                     book.save()
+                    autocomplete_index.add_book(str(book.id), book.title, book.authors)
                     books_added += 1
                 else:
                     books_skipped += 1
@@ -0,0 +1,125 @@
+from app import db
+from datetime import datetime
+from pymongo.errors import PyMongoError
+from app.models.concurrency import after_commit
+
+
+class CatalogState(db.Document):
+    """
+    Single document holding catalog-wide aggregates (facet counts) so that
+    page views never need to scan the books collection to show them.
+    """
+    meta = {'collection': 'catalogState'}
+
+    key = db.StringField(required=True, unique=True, default='catalog')
+    categoryCounts = db.DictField()   # category -> number of titles
+    genreCounts = db.DictField()      # genre -> number of titles
+    availableTitles = db.IntField(default=0)  # titles with at least one copy available
+    version = db.IntField(default=0)  # bumped on every catalog change, used for HTTP validators
+    updatedAt = db.DateTimeField()
+
+    @staticmethod
+    def get_state(catalog=False):
+        """
+        Return the catalog state document, or an empty one if it has not been built yet.
+
+        Pass `catalog=True` when the state validates a page whose books are read
+        with Book.catalog(): the state is then read with the same (catalog) read
+        preference, so a lagging secondary cannot pair an old page with a new
+        version and have it served as current until the next catalog change.
+        """
+        query = CatalogState.objects(key='catalog')
+        if catalog:
+            from app.models.books import catalog_read_preference
+
+            query = query.read_preference(catalog_read_preference())
+        state = query.first()
+        return state or CatalogState(key='catalog', categoryCounts={}, genreCounts={})
+
+    @staticmethod
+    def rebuild_facets():
+        """
+        Recompute all facet counts with a single $facet aggregation and store them.
+        Run at startup (after seeding) or whenever the counts need repairing.
+        """
+        from app.models.books import Book
+
+        pipeline = [
+            {'$facet': {
+                'categories': [{'$group': {'_id': '$category', 'count': {'$sum': 1}}}],
+                'genres': [
+                    {'$unwind': '$genres'},
+                    {'$group': {'_id': '$genres', 'count': {'$sum': 1}}}
+                ],
+                'available': [
+                    {'$match': {'available': {'$gt': 0}}},
+                    {'$count': 'count'}
+                ]
+            }}
+        ]
+        result = next(Book.objects.aggregate(pipeline), {})
+
+        category_counts = {row['_id']: row['count'] for row in result.get('categories', []) if row['_id']}
+        genre_counts = {row['_id']: row['count'] for row in result.get('genres', []) if row['_id']}
+        available = result.get('available') or [{'count': 0}]
+
+        CatalogState._get_collection().update_one(
+            {'key': 'catalog'},
+            {'$set': {
+                'categoryCounts': category_counts,
+                'genreCounts': genre_counts,
+                'availableTitles': available[0]['count'],
+                'updatedAt': datetime.utcnow()
+            }, '$inc': {'version': 1}},
+            upsert=True
+        )
+        return CatalogState.get_state()
+
+    @staticmethod
+    def _increment(changes=None, session=None, bump_version=True):
+        """Apply a set of $inc changes to the catalog state document and (by default) bump its version"""
+        changes = dict(changes or {})
+        update = {}
+        if bump_version:
+            changes['version'] = 1
+            update['$set'] = {'updatedAt': datetime.utcnow()}
+        update['$inc'] = changes
+        CatalogState._get_collection().update_one({'key': 'catalog'}, update, upsert=True, session=session)
+
+    @staticmethod
+    def _bump_version():
+        """Bump the version once a change has committed (it cannot be rolled back any more)"""
+        try:
+            CatalogState._increment()
+        except PyMongoError as e:
+            # Pages showing the committed change revalidate on the next bump
+            print(f"Warning: could not bump the catalog version: {e}")
+
+    @staticmethod
+    def record_book_added(book):
+        """Update facet counts for a newly created book"""
+        changes = {f'categoryCounts.{book.category}': 1}
+        for genre in set(book.genres or []):
+            changes[f'genreCounts.{genre}'] = 1
+        if (book.available or 0) > 0:
+            changes['availableTitles'] = 1
+        CatalogState._increment(changes)
+
+    @staticmethod
+    def record_availability_change(before, after, session=None):
+        """
+        Update the 'available now' count when a borrow or return moves a
+        title between having no copies and having some, and bump the catalog
+        version since the available numbers have changed.
+
+        Only the (rarer) boundary crossings write to the catalog document
+        inside the loan's transaction. The version is bumped after commit,
+        outside it: a write in every transaction would make all loans in
+        the system conflict on this one document.
+        """
+        if before > 0 and after <= 0:
+            CatalogState._increment({'availableTitles': -1}, session=session, bump_version=False)
+        elif before <= 0 and after > 0:
+            CatalogState._increment({'availableTitles': 1}, session=session, bump_version=False)
+        # Also means pages are never validated against a version whose change is not yet visible
+        after_commit(session, CatalogState._bump_version)
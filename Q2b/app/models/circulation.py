@@ -0,0 +1,74 @@
+import threading
+from app import db
+from datetime import datetime, timedelta
+from app.config import ADMIN_DASHBOARD
+
+# Only one background refresh of the summary at a time
+_refresh_lock = threading.Lock()
+
+
+class CirculationSummary(db.Document):
+    """
+    Pre-aggregated numbers for the admin dashboard tiles. Recomputed on a
+    schedule (the `refresh-circulation-summary` command, or in the background
+    when a dashboard view finds it older than ADMIN_DASHBOARD['summary_refresh_seconds']),
+    so opening the dashboard never counts the loans collection.
+    """
+    meta = {'collection': 'circulationSummary'}
+
+    key = db.StringField(required=True, unique=True, default='summary')
+    activeLoans = db.IntField(default=0)
+    overdueLoans = db.IntField(default=0)
+    returnedRecently = db.IntField(default=0)   # returned within ADMIN_DASHBOARD['recent_days']
+    waitingHolds = db.IntField(default=0)
+    readyHolds = db.IntField(default=0)
+    updatedAt = db.DateTimeField()
+
+    @staticmethod
+    def get_summary():
+        """Return the stored summary, or an empty one if it has never been computed"""
+        summary = CirculationSummary.objects(key='summary').first()
+        return summary or CirculationSummary(key='summary')
+
+    @staticmethod
+    def refresh():
+        """
+        Recompute every tile. Each number is a count over an index range
+        (returnDate/borrowDate on loans, status on holds).
+        """
+        from app.models.loans import Loan
+        from app.models.holds import Hold
+
+        now = datetime.utcnow()
+        loans = Loan._get_collection()
+        holds = Hold._get_collection()
+        values = {
+            'activeLoans': loans.count_documents({'returnDate': None}),
+            'overdueLoans': loans.count_documents({'returnDate': None, 'borrowDate': {'$lt': Loan.overdue_cutoff(now)}}),
+            'returnedRecently': loans.count_documents(
+                {'returnDate': {'$gte': now - timedelta(days=ADMIN_DASHBOARD['recent_days'])}}),
+            'waitingHolds': holds.count_documents({'status': 'waiting'}),
+            'readyHolds': holds.count_documents({'status': 'ready'}),
+            'updatedAt': now
+        }
+        CirculationSummary._get_collection().update_one({'key': 'summary'}, {'$set': values}, upsert=True)
+        return CirculationSummary.get_summary()
+
+    @staticmethod
+    def refresh_if_stale(summary):
+        """Start a background refresh when the summary is older than the configured interval"""
+        max_age = timedelta(seconds=ADMIN_DASHBOARD['summary_refresh_seconds'])
+        if summary.updatedAt and datetime.utcnow() - summary.updatedAt < max_age:
+            return
+        if not _refresh_lock.acquire(blocking=False):
+            return  # already refreshing
+
+        def run():
+            try:
+                CirculationSummary.refresh()
+            except Exception as e:
+                print(f"Warning: Could not refresh circulation summary: {e}")
+            finally:
+                _refresh_lock.release()
+
+        threading.Thread(target=run, name='circulation-summary', daemon=True).start()
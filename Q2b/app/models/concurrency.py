@@ -0,0 +1,149 @@
+from mongoengine.connection import get_connection
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
+from app.config import CONCURRENCY
+from app.services.metrics import metrics
+
+# Topologies that accept multi-document transactions (standalone servers do not)
+TRANSACTION_TOPOLOGIES = ('ReplicaSetWithPrimary', 'Sharded')
+
+_transactions_supported = None
+
+# Callbacks waiting for the transaction on a session to commit
+_after_commit = {}
+
+
+class ConcurrentUpdateError(Exception):
+    """Raised when a versioned update keeps losing to concurrent writers"""
+
+
+def version_filter(version):
+    """Match a document's current version (documents saved before versioning have none)"""
+    if not version:
+        return {'version': {'$in': [None, 0]}}
+    return {'version': version}
+
+
+def supports_transactions():
+    """Check (once) whether the connected deployment can run multi-document transactions"""
+    global _transactions_supported
+    if _transactions_supported is None:
+        if not CONCURRENCY['transactions']:
+            _transactions_supported = False
+        else:
+            client = get_connection()
+            # The topology is only known after the first round trip to the server
+            client.admin.command('ping')
+            _transactions_supported = client.topology_description.topology_type_name in TRANSACTION_TOPOLOGIES
+    return _transactions_supported
+
+
+def run_in_transaction(callback):
+    """
+    Run `callback(session)` as a multi-document transaction when the
+    deployment supports it, retrying transient errors; otherwise run it
+    directly with `session=None`.
+
+    Returns:
+        Whatever the callback returns
+    """
+    if not supports_transactions():
+        return callback(None)
+
+    def attempt(session):
+        # Callbacks registered by an aborted attempt must not run
+        _after_commit[session] = []
+        return callback(session)
+
+    with get_connection().start_session() as session:
+        try:
+            result = session.with_transaction(
+                attempt,
+                read_concern=ReadConcern('snapshot'),
+                write_concern=WriteConcern('majority')
+            )
+            pending = _after_commit.get(session, [])
+        finally:
+            _after_commit.pop(session, None)
+
+    for after in pending:
+        after()
+    return result
+
+
+def after_commit(session, callback):
+    """Run `callback()` once the transaction on `session` has committed (immediately without one)"""
+    if session is None or session not in _after_commit:
+        callback()
+    else:
+        _after_commit[session].append(callback)
+
+
+def insert_document(document, session=None):
+    """Validate and insert a new document, optionally inside a transaction"""
+    document.validate()
+    result = type(document)._get_collection().insert_one(document.to_mongo(), session=session)
+    document.id = result.inserted_id
+    document._created = False
+    document._clear_changed_fields()
+    return document
+
+
+def refresh_document(document, session=None):
+    """Reload a document's fields, reading inside `session` when one is given"""
+    if session is None:
+        document.reload()
+        return document
+
+    raw = type(document)._get_collection().find_one({'_id': document.id}, session=session)
+    if raw is None:
+        raise type(document).DoesNotExist(f"{type(document).__name__} {document.id} no longer exists")
+    fresh = type(document)._from_son(raw)
+    for name in document._fields:
+        setattr(document, name, getattr(fresh, name))
+    document._clear_changed_fields()
+    return document
+
+
+def versioned_update(document, apply_change, label, session=None):
+    """
+    Optimistic concurrency control for a single document.
+
+    `apply_change(document)` validates the document's current state (raising
+    on invalid operations) and returns the fields to $set. The update only
+    applies if nobody else has bumped the document's version in the meantime;
+    on a conflict the document is reloaded and the change re-evaluated, up to
+    CONCURRENCY['max_retries'] times.
+
+    Inside a transaction the document is first re-read through the session,
+    so a retried transaction never works from state it had already applied.
+
+    Returns:
+        The updated document
+    """
+    collection = type(document)._get_collection()
+    if session is not None:
+        refresh_document(document, session)
+
+    for _ in range(CONCURRENCY['max_retries']):
+        changes = apply_change(document)
+        current = document.version or 0
+
+        result = collection.update_one(
+            {'_id': document.id, **version_filter(current)},
+            {'$set': changes, '$inc': {'version': 1}},
+            session=session
+        )
+        if result.modified_count == 1:
+            for field, value in changes.items():
+                setattr(document, field, value)
+            document.version = current + 1
+            document._clear_changed_fields()
+            return document
+
+        # Someone else changed the document first: re-read it and try again
+        metrics.increment(f"occ.conflicts.{label}")
+        refresh_document(document, session)
+
+    metrics.increment(f"occ.exhausted.{label}")
+    raise ConcurrentUpdateError("This record was changed by another request. Please try again.")
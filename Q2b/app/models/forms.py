@@ -1,6 +1,7 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, TextAreaField, IntegerField, SelectField, SelectMultipleField, BooleanField
-from wtforms.validators import Email, Length, InputRequired, DataRequired, NumberRange
+from wtforms.validators import Email, Length, InputRequired, DataRequired, NumberRange, Optional, URL, Regexp
+from app.config import BOOK_GENRES
 
 class RegisterForm(FlaskForm):
     email = StringField('Email', validators=[InputRequired(), Email(message='Invalid email'), Length(max=100)])
@@ -17,36 +18,7 @@ class LoginForm(FlaskForm):
 class AddBookForm(FlaskForm):    
     # Multiple genres selection
     genres = SelectMultipleField('Choose multiple Genres', 
-                                choices=[
-                                    ('Animals', 'Animals'),
-                                    ('Business', 'Business'),
-                                    ('Comics', 'Comics'),
-                                    ('Communication', 'Communication'),
-                                    ('Dark Academia', 'Dark Academia'),
-                                    ('Emotion', 'Emotion'),
-                                    ('Fantasy', 'Fantasy'),
-                                    ('Fiction', 'Fiction'),
-                                    ('Friendship', 'Friendship'),
-                                    ('Graphic Novels', 'Graphic Novels'),
-                                    ('Grief', 'Grief'),
-                                    ('Historical Fiction', 'Historical Fiction'),
-                                    ('Indigenous', 'Indigenous'),
-                                    ('Inspirational', 'Inspirational'),
-                                    ('Magic', 'Magic'),
-                                    ('Mental Health', 'Mental Health'),
-                                    ('Nonfiction', 'Nonfiction'),
-                                    ('Personal Development', 'Personal Development'),
-                                    ('Philosophy', 'Philosophy'),
-                                    ('Picture Books', 'Picture Books'),
-                                    ('Poetry', 'Poetry'),
-                                    ('Productivity', 'Productivity'),
-                                    ('Psychology', 'Psychology'),
-                                    ('Romance', 'Romance'),
-                                    ('School', 'School'),
-                                    ('Self Help', 'Self Help'),
-                                    ('Science', 'Science'),
-                                    ('Technology', 'Technology')
-                                ])
+                                choices=[(genre, genre) for genre in BOOK_GENRES])
 
     # Title
     title = StringField('Title:', validators=[InputRequired(), Length(max=200)])
@@ -61,7 +33,8 @@ class AddBookForm(FlaskForm):
                           validators=[InputRequired()])
     
     # URL for cover
-    url = StringField('URL for Cover:')
+    url = StringField('URL for Cover:', validators=[Optional(), URL(message='Invalid URL'),
+                                                    Regexp(r'^https?://', message='Cover URL must start with http:// or https://')])
     
     # Description
     description = TextAreaField('Description:', validators=[InputRequired()])
@@ -0,0 +1,221 @@
+from app import db
+from datetime import datetime, timedelta
+from mongoengine.errors import NotUniqueError
+from pymongo import ReturnDocument
+from app.config import HOLDS
+from .books import Book
+from .users import User
+from .concurrency import run_in_transaction
+
+
+class Hold(db.Document):
+    """
+    A member's place in the queue for a title with no copies available.
+    Waiting holds form a per-book FIFO queue ordered by createdAt; when a
+    copy is returned it is set aside for the first waiting member (status
+    'ready') instead of going back on the shelf.
+    """
+    meta = {
+        'collection': 'holds',
+        'indexes': [
+            # The queue: next waiting hold for a book is a single indexed pop,
+            # and a queue position one bounded count, without walking the
+            # title's fulfilled, expired and cancelled holds
+            ('book', 'status', 'createdAt'),
+            ('member', 'status'),
+            ('status', 'expiresAt'),
+            # At most one active hold per member and title, even for
+            # concurrent requests ($in in a partial index needs MongoDB 6.0+)
+            {
+                'fields': ['member', 'book'],
+                'unique': True,
+                'partialFilterExpression': {'status': {'$in': ['waiting', 'ready']}}
+            }
+        ]
+    }
+
+    member = db.ReferenceField(User, required=True)
+    book = db.ReferenceField(Book, required=True)
+    createdAt = db.DateTimeField(required=True)
+    status = db.StringField(required=True, default='waiting',
+                            choices=('waiting', 'ready', 'fulfilled', 'expired', 'cancelled'))
+    readyAt = db.DateTimeField()     # When a returned copy was set aside for this member
+    expiresAt = db.DateTimeField()   # Ready holds not collected by then go to the next member
+
+    ACTIVE_STATUSES = ('waiting', 'ready')
+
+    def __repr__(self):
+        return f'<Hold {self.member.email} - {self.book.title} ({self.status})>'
+
+    @property
+    def is_ready(self):
+        """Check if a copy is waiting to be collected for this hold"""
+        return self.status == 'ready'
+
+    @property
+    def queue_position(self):
+        """1-based position in the book's queue (0 once a copy is set aside)"""
+        if self.status != 'waiting':
+            return 0
+        ahead = Hold.objects(book=self.book, status='waiting', createdAt__lt=self.createdAt).count()
+        return ahead + 1
+
+    @staticmethod
+    def place_hold(user, book):
+        """
+        Add the user to the end of the queue for a book.
+
+        Args:
+            user: User object joining the queue
+            book: Book object with no copies available
+
+        Returns:
+            Hold object if successful
+
+        Raises:
+            Exception with appropriate error message
+        """
+        from .loans import Loan
+
+        if (book.available or 0) > 0:
+            raise Exception(f"'{book.title}' is available now, so you can borrow it straight away")
+
+        if Loan.objects(member=user, book=book, returnDate__exists=False).first():
+            raise Exception(f"You already have an unreturned loan for '{book.title}'")
+
+        if Hold.active_hold(user, book):
+            raise Exception(f"You are already in the queue for '{book.title}'")
+
+        hold = Hold(member=user, book=book, createdAt=datetime.utcnow(), status='waiting')
+        try:
+            hold.save()
+        except NotUniqueError:
+            # A concurrent request (e.g. a double click) queued the member first
+            raise Exception(f"You are already in the queue for '{book.title}'")
+        return hold
+
+    @staticmethod
+    def active_hold(user, book):
+        """The user's waiting or ready hold for a book, if any"""
+        return Hold.objects(member=user, book=book, status__in=Hold.ACTIVE_STATUSES).first()
+
+    @staticmethod
+    def get_user_holds(user):
+        """
+        Retrieve the user's waiting and ready holds.
+
+        Returns:
+            QuerySet of Hold objects, oldest first
+        """
+        return Hold.objects(member=user, status__in=Hold.ACTIVE_STATUSES).order_by('createdAt')
+
+    @staticmethod
+    def get_hold_by_id(hold_id):
+        """Retrieve a specific hold by ID, or None if not found"""
+        try:
+            return Hold.objects.get(id=hold_id)
+        except Hold.DoesNotExist:
+            return None
+
+    @staticmethod
+    def allocate_next(book, session=None):
+        """
+        Set a returned copy aside for the first waiting member of the queue.
+        The pop is one atomic find-and-modify on the (book, status, createdAt) index.
+
+        Returns:
+            The raw hold document that became ready, or None if nobody is waiting
+        """
+        now = datetime.utcnow()
+        return Hold._get_collection().find_one_and_update(
+            {'book': book.id, 'status': 'waiting'},
+            {'$set': {
+                'status': 'ready',
+                'readyAt': now,
+                'expiresAt': now + timedelta(days=HOLDS['pickup_days'])
+            }},
+            sort=[('createdAt', 1)],
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+
+    @staticmethod
+    def release_copy(book, session=None):
+        """
+        A copy of the book has come back (return, expired or cancelled hold):
+        hand it to the next member in the queue, or put it back on the shelf.
+
+        Returns:
+            The raw hold document that received the copy, or None
+        """
+        hold = Hold.allocate_next(book, session=session)
+        if hold is None:
+            book.return_book(1, session=session)
+        return hold
+
+    def claim(self, session=None):
+        """
+        Mark a ready hold as collected when its member borrows the book.
+
+        Raises:
+            Exception if the hold is no longer ready (e.g. it expired)
+        """
+        claimed = Hold._get_collection().update_one(
+            {'_id': self.id, 'status': 'ready'},
+            {'$set': {'status': 'fulfilled'}},
+            session=session
+        )
+        if claimed.modified_count != 1:
+            raise Exception("Your hold is no longer ready to collect")
+        self.status = 'fulfilled'
+
+    def cancel(self):
+        """
+        Leave the queue. Cancelling a ready hold passes its copy on.
+
+        Raises:
+            Exception if the hold is no longer active
+        """
+        def cancel_hold(session):
+            result = Hold._get_collection().find_one_and_update(
+                {'_id': self.id, 'status': {'$in': list(Hold.ACTIVE_STATUSES)}},
+                {'$set': {'status': 'cancelled'}},
+                session=session
+            )
+            if result is None:
+                raise Exception("This hold is no longer active")
+            if result['status'] == 'ready':
+                Hold.release_copy(self.book, session=session)
+
+        run_in_transaction(cancel_hold)
+        self.status = 'cancelled'
+
+    @staticmethod
+    def expire_holds(now=None):
+        """
+        Batch job: expire ready holds whose pickup window has passed and pass
+        each copy on to the next member in the queue.
+
+        Returns:
+            Number of holds expired
+        """
+        now = now or datetime.utcnow()
+        expired = 0
+
+        for hold in Hold.objects(status='ready', expiresAt__lt=now).only('id', 'book'):
+            def expire(session, hold=hold):
+                result = Hold._get_collection().update_one(
+                    {'_id': hold.id, 'status': 'ready'},
+                    {'$set': {'status': 'expired'}},
+                    session=session
+                )
+                if result.modified_count != 1:
+                    # Collected or cancelled since the query ran
+                    return False
+                Hold.release_copy(hold.book, session=session)
+                return True
+
+            if run_in_transaction(expire):
+                expired += 1
+
+        return expired
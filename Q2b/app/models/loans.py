@@ -1,28 +1,33 @@
 from app import db
+from app.config import POPULARITY
 from datetime import datetime, timedelta
 from flask import current_app
 import random
 from .books import Book
 from .users import User
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from .concurrency import versioned_update, run_in_transaction, insert_document
+from .holds import Hold
 
 
-class Loan(db.Document):
-    meta = {'collection': 'loans'}
+# Loans are due two weeks after the (latest) borrow date and can be renewed twice
+LOAN_PERIOD = timedelta(days=14)
+MAX_RENEWALS = 2
 
-    # Required fields based on class diagram
-    member = db.ReferenceField(User, required=True)  # User who borrowed the book
-    book = db.ReferenceField(Book, required=True)    # Book that was borrowed
-    borrowDate = db.DateTimeField(required=True)     # Date when book was borrowed
-    returnDate = db.DateTimeField()                  # Date when book was returned (None if not returned)
-    renewCount = db.IntField(default=0)              # Number of times loan has been renewed
 
-    def __repr__(self):
-        return f'<Loan {self.member.email} - {self.book.title}>'
+class LoanTerms:
+    """
+    Loan rules shared by every storage backend (see app.repositories). They
+    only read borrowDate, returnDate and renewCount.
+    """
+
+    __slots__ = ()
 
     @property
     def due_date(self):
         """Calculate due date (2 weeks after borrow date)"""
-        return self.borrowDate + timedelta(days=14)
+        return self.borrowDate + LOAN_PERIOD
 
     @property
     def is_overdue(self):
@@ -40,7 +45,7 @@ class Loan(db.Document):
     @property
     def can_renew(self):
         """Check if loan can be renewed (not overdue and renew count < 2)"""
-        return not self.is_returned and not self.is_overdue and self.renewCount < 2
+        return not self.is_returned and not self.is_overdue and self.renewCount < MAX_RENEWALS
 
     @property
     def can_return(self):
@@ -52,6 +57,96 @@ class Loan(db.Document):
         """Check if loan can be deleted (only returned loans)"""
         return self.is_returned
 
+
+def random_borrow_date():
+    """Borrow date for a new loan: a random 10-20 days before now (UTC)"""
+    return datetime.utcnow() - timedelta(days=random.randint(10, 20))
+
+
+def renew_update(loan):
+    """
+    Fields to set when a loan is renewed.
+
+    Raises:
+        Exception if the loan cannot be renewed
+    """
+    if not loan.can_renew:
+        if loan.is_returned:
+            raise Exception("Cannot renew a returned loan")
+        elif loan.is_overdue:
+            raise Exception("Cannot renew an overdue loan")
+        elif loan.renewCount >= MAX_RENEWALS:
+            raise Exception(f"Maximum renewal limit ({MAX_RENEWALS}) reached")
+
+    # Generate new borrow date (10-20 days after current borrow date)
+    days_to_add = random.randint(10, 20)
+    candidate = loan.borrowDate + timedelta(days=days_to_add)
+
+    # Cap the new borrow date to now (UTC) (cannot be later than now)
+    now = datetime.utcnow()
+    new_borrow_date = candidate if candidate <= now else now
+
+    # Ensure borrowDate does not move backwards (monotonic)
+    if new_borrow_date < loan.borrowDate:
+        new_borrow_date = loan.borrowDate
+
+    # Only apply and count the renewal if the borrow date actually moves forward
+    if new_borrow_date <= loan.borrowDate:
+        # No effective change possible; treat as invalid renewal attempt
+        raise Exception("Cannot renew loan because the new borrow date would not move forward")
+
+    return {'borrowDate': new_borrow_date, 'renewCount': loan.renewCount + 1}
+
+
+def close_update(loan):
+    """
+    Fields to set when a loan is returned.
+
+    Raises:
+        Exception if the loan has already been returned
+    """
+    if not loan.can_return:
+        raise Exception("Loan has already been returned")
+
+    # Set return date to now (UTC) to reflect actual return action
+    return_date = datetime.utcnow()
+
+    # Ensure return date is not earlier than borrow date
+    if return_date < loan.borrowDate:
+        return_date = loan.borrowDate
+
+    return {'returnDate': return_date}
+
+
+class Loan(LoanTerms, db.Document):
+    meta = {
+        'collection': 'loans',
+        'indexes': [
+            # Open loans per book (reconciliation)
+            ('book', 'returnDate'),
+            # One open loan per member and title: open loans have no returnDate,
+            # so they all index it as null and a second one is a duplicate key
+            # (a partial index cannot filter on a missing field)
+            {'fields': ['member', 'book', 'returnDate'], 'unique': True},
+            # Keyset-paginated histories per member and per book, newest first
+            ('member', '-borrowDate', '-id'),
+            ('book', '-borrowDate', '-id'),
+            # Active/overdue loans (returnDate missing) in borrow order, and recent returns
+            ('returnDate', 'borrowDate', 'id')
+        ]
+    }
+
+    # Required fields based on class diagram
+    member = db.ReferenceField(User, required=True)  # User who borrowed the book
+    book = db.ReferenceField(Book, required=True)    # Book that was borrowed
+    borrowDate = db.DateTimeField(required=True)     # Date when book was borrowed
+    returnDate = db.DateTimeField()                  # Date when book was returned (None if not returned)
+    renewCount = db.IntField(default=0)              # Number of times loan has been renewed
+    version = db.IntField(default=0)                 # Optimistic concurrency token, bumped on every update
+
+    def __repr__(self):
+        return f'<Loan {self.member.email} - {self.book.title}>'
+
     @staticmethod
     def create_loan(user, book, borrow_date=None):
         """
@@ -68,46 +163,73 @@ class Loan(db.Document):
         Raises:
             Exception with appropriate error message
         """
-        # Check if user already has an unreturned loan for the same book title
-        existing_loan = Loan.objects(
-            member=user,
-            book=book,
-            returnDate__exists=False  # No return date means not returned
-        ).first()
-
-        if existing_loan:
-            raise Exception(f"You already have an unreturned loan for '{book.title}'")
-
-        # Check if book is available
-        if book.available <= 0:
-            raise Exception(f"'{book.title}' is currently not available for loan")
-
         # Generate random borrow date if not provided (10-20 days before now UTC)
         if borrow_date is None:
-            days_ago = random.randint(10, 20)
-            borrow_date = datetime.utcnow() - timedelta(days=days_ago)
+            borrow_date = random_borrow_date()
 
-            # Log generated borrow date and days_ago for debugging
+            # Log generated borrow date for debugging
             try:
                 current_app.logger.info(
-                    f"create_loan: user={getattr(user, 'email', None)} book={getattr(book, 'title', None)} days_ago={days_ago} borrow_date={borrow_date}"
+                    f"create_loan: user={getattr(user, 'email', None)} book={getattr(book, 'title', None)} borrow_date={borrow_date}"
                 )
             except Exception:
                 pass
 
-        # Create the loan
-        loan = Loan(
-            member=user,
-            book=book,
-            borrowDate=borrow_date,
-            renewCount=0,
-        )
-        loan.save()
+        def create(session):
+            # The checks read through the session, so they see the same snapshot
+            # as the writes; the unique open-loan index stops a concurrent
+            # request that passed them at the same time
+
+            # Check if user already has an unreturned loan for the same book title
+            existing_loan = Loan._get_collection().find_one(
+                {'member': user.id, 'book': book.id, 'returnDate': None},  # No return date means not returned
+                {'_id': 1},
+                session=session
+            )
+            if existing_loan:
+                raise Exception(f"You already have an unreturned loan for '{book.title}'")
+
+            # A copy set aside for the user's hold can be borrowed even though it
+            # is not counted in `available`
+            ready_hold = Hold._get_collection().find_one(
+                {'member': user.id, 'book': book.id, 'status': 'ready'},
+                session=session
+            )
+
+            # Check if book is available
+            if ready_hold is None and (book.available or 0) <= 0:
+                raise Exception(f"'{book.title}' is currently not available for loan. You can place a hold to join the queue.")
+
+            # Create the loan and take the copy in one transaction (when available),
+            # so a failure between the two writes cannot leave `available` wrong
+            loan = Loan(
+                member=user,
+                book=book,
+                borrowDate=borrow_date,
+                renewCount=0,
+            )
+            try:
+                insert_document(loan, session=session)
+            except DuplicateKeyError:
+                # A concurrent request (e.g. a double click) opened the loan first
+                raise Exception(f"You already have an unreturned loan for '{book.title}'")
+
+            # Collect the held copy, or update book's available count
+            try:
+                if ready_hold is not None:
+                    Hold._from_son(ready_hold).claim(session=session)
+                else:
+                    book.borrow(1, session=session)
+                Book.record_borrow(book.id, borrow_date, session=session)
+            except Exception:
+                if session is None:
+                    # No transaction to roll back, so undo the loan by hand
+                    Loan._get_collection().delete_one({'_id': loan.id})
+                raise
 
-        # Update book's available count
-        book.borrow(1)
+            return loan
 
-        return loan
+        return run_in_transaction(create)
 
     @staticmethod
     def get_user_loans(user, include_returned=True):
@@ -144,9 +266,11 @@ class Loan(db.Document):
         except Loan.DoesNotExist:
             return None
 
-    def renew_loan(self):
+    def renew_loan(self, session=None):
         """
         Renew the loan by updating renew count and borrow date.
+        The update is version-checked, so a double-submitted renewal
+        cannot be counted twice.
 
         Returns:
             Updated Loan object
@@ -154,41 +278,16 @@ class Loan(db.Document):
         Raises:
             Exception if loan cannot be renewed
         """
-        if not self.can_renew:
-            if self.is_returned:
-                raise Exception("Cannot renew a returned loan")
-            elif self.is_overdue:
-                raise Exception("Cannot renew an overdue loan")
-            elif self.renewCount >= 2:
-                raise Exception("Maximum renewal limit (2) reached")
-
-        # Generate new borrow date (10-20 days after current borrow date)
-        days_to_add = random.randint(10, 20)
-        candidate = self.borrowDate + timedelta(days=days_to_add)
-
-        # Cap the new borrow date to now (UTC) (cannot be later than now)
-        now = datetime.utcnow()
-        new_borrow_date = candidate if candidate <= now else now
-
-        # Ensure borrowDate does not move backwards (monotonic)
-        if new_borrow_date < self.borrowDate:
-            new_borrow_date = self.borrowDate
-
-        # Only apply and count the renewal if the borrow date actually moves forward
-        if new_borrow_date > self.borrowDate:
-            self.borrowDate = new_borrow_date
-            self.renewCount += 1
-        else:
-            # No effective change possible; treat as invalid renewal attempt
-            raise Exception("Cannot renew loan because the new borrow date would not move forward")
-
-        self.save()
+        versioned_update(self, renew_update, 'loan', session=session)
 
         return self
 
-    def return_loan(self):
+    def return_loan(self, session=None):
         """
-        Return the loan by setting return date and updating book availability.
+        Return the loan by setting return date and releasing the copy to the
+        hold queue (or the shelf when nobody is waiting). Only the request
+        whose version-checked update marks the loan returned goes on to
+        release the copy, so a double-click returns it once.
 
         Returns:
             Updated Loan object
@@ -196,22 +295,16 @@ class Loan(db.Document):
         Raises:
             Exception if loan cannot be returned
         """
-        if not self.can_return:
-            raise Exception("Loan has already been returned")
-
-        # Set return date to now (UTC) to reflect actual return action
-        now = datetime.utcnow()
-        return_date = now
+        def release(session):
+            versioned_update(self, close_update, 'loan', session=session)
 
-        # Ensure return date is not earlier than borrow date
-        if return_date < self.borrowDate:
-            return_date = self.borrowDate
+            # Hand the copy to the next member waiting for it, or update book's available count
+            Hold.release_copy(self.book, session=session)
 
-        self.returnDate = return_date
-        self.save()
-
-        # Update book's available count
-        self.book.return_book(1)
+        if session is not None:
+            release(session)
+        else:
+            run_in_transaction(release)
 
         return self
 
@@ -240,6 +333,70 @@ class Loan(db.Document):
         """
         return Loan.objects(book=book).order_by('-borrowDate')
 
+    @staticmethod
+    def overdue_cutoff(now=None):
+        """Loans borrowed before this time and not returned are overdue"""
+        return (now or datetime.utcnow()) - LOAN_PERIOD
+
+    @staticmethod
+    def loan_page(match, after=None, limit=50, oldest_first=False):
+        """
+        One keyset-paginated page of raw loan documents, with the member's name
+        and email and the book's title and authors joined in the same query.
+        Pages are ordered by (borrowDate, _id), so each page is a bounded index
+        walk however many loans there are.
+
+        Args:
+            match: Raw MongoDB filter (use returnDate=None for active loans)
+            after: (borrowDate, _id) of the last loan on the previous page
+            limit: Loans per page
+            oldest_first: Sort ascending (longest-running loans first)
+
+        Returns:
+            Tuple of (list of loan dicts with 'memberDoc' and 'bookDoc',
+            (borrowDate, _id) to pass as `after` for the next page or None)
+        """
+        direction = 1 if oldest_first else -1
+        beyond = '$gt' if oldest_first else '$lt'
+        if after is not None:
+            borrowed, last_id = after
+            match = {'$and': [match, {'$or': [
+                {'borrowDate': {beyond: borrowed}},
+                {'borrowDate': borrowed, '_id': {beyond: last_id}}
+            ]}]}
+
+        pipeline = [
+            {'$match': match},
+            {'$sort': {'borrowDate': direction, '_id': direction}},
+            {'$limit': limit + 1},
+            # Joins run on the page only, never on the whole collection
+            {'$lookup': {
+                'from': User._get_collection_name(),
+                'localField': 'member',
+                'foreignField': '_id',
+                'as': 'memberDoc'
+            }},
+            {'$lookup': {
+                'from': Book._get_collection_name(),
+                'localField': 'book',
+                'foreignField': '_id',
+                'as': 'bookDoc'
+            }},
+            {'$unwind': {'path': '$memberDoc', 'preserveNullAndEmptyArrays': True}},
+            {'$unwind': {'path': '$bookDoc', 'preserveNullAndEmptyArrays': True}},
+            {'$project': {
+                'member': 1, 'book': 1, 'borrowDate': 1, 'returnDate': 1, 'renewCount': 1,
+                'memberDoc.name': 1, 'memberDoc.email': 1,
+                'bookDoc.title': 1, 'bookDoc.authors': 1
+            }}
+        ]
+        rows = list(Loan._get_collection().aggregate(pipeline))
+        next_after = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_after = (rows[-1]['borrowDate'], rows[-1]['_id'])
+        return rows, next_after
+
     @staticmethod
     def get_overdue_loans():
         """
@@ -281,3 +438,118 @@ class Loan(db.Document):
             'active_loans': active_loans,
             'returned_loans': returned_loans,
         }
+
+    @staticmethod
+    def reconcile_availability(dry_run=False):
+        """
+        Recompute every book's `available` count as copies minus open loans
+        minus copies set aside for ready holds, using a single aggregation over
+        books joined to their loans and holds, and correct any drift.
+
+        Each correction only applies if the book's version is still the one
+        the aggregation read, so a borrow or return committed in the meantime
+        is never overwritten; such books are left for the next run.
+
+        Args:
+            dry_run: If True, only report the drift without fixing it
+
+        Returns:
+            List of dicts (id, title, copies, openLoans, readyHolds, available,
+            expected, fixed) for drifted books; `fixed` is False for books that
+            changed during the run (and always with dry_run)
+        """
+        pipeline = [
+            {'$lookup': {
+                'from': Loan._get_collection_name(),
+                'let': {'bookId': '$_id'},
+                'pipeline': [
+                    {'$match': {'$expr': {'$eq': ['$book', '$$bookId']}, 'returnDate': {'$exists': False}}},
+                    {'$count': 'count'}
+                ],
+                'as': 'openLoans'
+            }},
+            {'$lookup': {
+                'from': Hold._get_collection_name(),
+                'let': {'bookId': '$_id'},
+                'pipeline': [
+                    {'$match': {'$expr': {'$eq': ['$book', '$$bookId']}, 'status': 'ready'}},
+                    {'$count': 'count'}
+                ],
+                'as': 'readyHolds'
+            }},
+            {'$project': {
+                'title': 1,
+                'version': 1,
+                'copies': {'$ifNull': ['$copies', 0]},
+                'available': {'$ifNull': ['$available', 0]},
+                'openLoans': {'$ifNull': [{'$arrayElemAt': ['$openLoans.count', 0]}, 0]},
+                'readyHolds': {'$ifNull': [{'$arrayElemAt': ['$readyHolds.count', 0]}, 0]}
+            }}
+        ]
+
+        drift = []
+        for row in Book._get_collection().aggregate(pipeline):
+            expected = max(row['copies'] - row['openLoans'] - row['readyHolds'], 0)
+            if expected != row['available']:
+                drift.append({
+                    'id': row['_id'],
+                    'title': row.get('title'),
+                    'copies': row['copies'],
+                    'openLoans': row['openLoans'],
+                    'readyHolds': row['readyHolds'],
+                    'available': row['available'],
+                    'expected': expected,
+                    'version': row.get('version'),
+                    'fixed': False
+                })
+
+        if not dry_run:
+            now = datetime.utcnow()
+            for row in drift:
+                # {'version': None} also matches books that never had a version
+                result = Book._get_collection().update_one(
+                    {'_id': row['id'], 'version': row['version']},
+                    {'$set': {'available': row['expected'], 'updatedAt': now}, '$inc': {'version': 1}}
+                )
+                row['fixed'] = result.modified_count == 1
+
+        return drift
+
+    @staticmethod
+    def backfill_popularity():
+        """
+        One-off migration: set every book's borrowCount and trendingScore from
+        the loan history (later loans keep them current incrementally).
+
+        Every book, including those never borrowed (set to zero), is written
+        by one bulk of per-book $set updates, so the catalog never shows a
+        reset score. A borrow recorded between the aggregation and its book's
+        update is still overwritten, so run this while circulation is quiet.
+
+        Returns:
+            Number of borrowed books
+        """
+        epoch = POPULARITY['epoch']
+        half_life_ms = POPULARITY['half_life_days'] * 86400 * 1000
+        pipeline = [
+            {'$group': {
+                '_id': '$book',
+                'borrowCount': {'$sum': 1},
+                'trendingScore': {'$sum': {'$pow': [
+                    2, {'$divide': [{'$subtract': ['$borrowDate', epoch]}, half_life_ms]}
+                ]}}
+            }}
+        ]
+        scores = {row['_id']: row for row in Loan._get_collection().aggregate(pipeline)}
+        collection = Book._get_collection()
+        operations = []
+        for book in collection.find({}, {'_id': 1}):
+            # Books never borrowed start from zero
+            row = scores.get(book['_id'], {})
+            operations.append(UpdateOne({'_id': book['_id']}, {'$set': {
+                'borrowCount': row.get('borrowCount', 0),
+                'trendingScore': row.get('trendingScore', 0)
+            }}))
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+        return len(scores)
@@ -0,0 +1,74 @@
+import sys
+from collections import namedtuple
+
+from app.models.loans import LoanTerms
+
+# Fields a cached book carries: everything the catalog cards, details page,
+# availability API and snapshot filters read
+BOOK_FIELDS = ('id', 'title', 'authors', 'category', 'genres', 'url', 'description', 'pages',
+               'available', 'copies', 'updatedAt', 'revision', 'borrowCount', 'trendingScore')
+
+LOAN_FIELDS = ('id', 'member', 'book', 'borrowDate', 'returnDate', 'renewCount')
+
+
+def intern_all(values):
+    """Tuple of interned strings (categories, genres and authors repeat across books)"""
+    return tuple(sys.intern(value) for value in values or ())
+
+
+class BookView(namedtuple('BookView', BOOK_FIELDS)):
+    """
+    Compact, immutable copy of a book for in-memory caches. A tuple with no
+    per-instance __dict__; list fields become tuples and repeated strings are
+    interned, so every copy of 'Fantasy' or 'Adult' is the same object.
+    Use `_replace(...)` to get an updated copy.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def build(cls, book_id, fields):
+        """
+        Build a view from any mapping of book fields.
+
+        Args:
+            book_id: The book's ObjectId
+            fields: Mapping with the Book document's field names
+        """
+        category = fields.get('category')
+        return cls(
+            id=book_id,
+            title=fields.get('title'),
+            authors=intern_all(fields.get('authors')),
+            category=sys.intern(category) if category else category,
+            genres=intern_all(fields.get('genres')),
+            url=fields.get('url'),
+            description=tuple(fields.get('description') or ()),
+            pages=fields.get('pages'),
+            available=fields.get('available'),
+            copies=fields.get('copies'),
+            updatedAt=fields.get('updatedAt'),
+            revision=fields.get('revision') or 0,
+            borrowCount=fields.get('borrowCount') or 0,
+            trendingScore=fields.get('trendingScore') or 0
+        )
+
+    @classmethod
+    def from_document(cls, book):
+        """View of a Book document"""
+        return cls.build(book.id, {name: getattr(book, name, None) for name in BOOK_FIELDS})
+
+    @classmethod
+    def from_raw(cls, row):
+        """View of a raw books collection document (e.g. from as_pymongo())"""
+        return cls.build(row['_id'], row)
+
+
+class LoanView(LoanTerms, namedtuple('LoanView', LOAN_FIELDS)):
+    """
+    Compact, immutable loan for the in-memory backend. `book` is a BookView
+    as of the last change to the loan; the LoanTerms properties apply as for
+    Loan documents.
+    """
+
+    __slots__ = ()
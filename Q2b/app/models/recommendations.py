@@ -0,0 +1,125 @@
+from app import db
+from datetime import datetime
+from pymongo import ReplaceOne, UpdateOne
+from app.config import RECOMMENDATIONS
+from app.services.recommendations import compute_similar, similarities_to
+
+# Book fields the similarity engine and the "Similar books" list need
+FEATURE_FIELDS = {'title': 1, 'authors': 1, 'genres': 1, 'category': 1, 'url': 1}
+
+
+def similar_entry(book, score):
+    """Denormalized neighbour stored in a recommendation, so the page needs no second query"""
+    return {
+        'id': book['_id'],
+        'title': book.get('title'),
+        'authors': book.get('authors') or [],
+        'url': book.get('url'),
+        'score': round(score, 4)
+    }
+
+
+class Recommendation(db.Document):
+    """
+    Precomputed "similar books" for one title, best match first. Built by the
+    `build-recommendations` job and topped up when books are added.
+    """
+    meta = {
+        'collection': 'recommendations',
+        'indexes': [
+            {'fields': ['book'], 'unique': True}
+        ]
+    }
+
+    book = db.ObjectIdField(required=True)
+    similar = db.ListField(db.DictField())  # [{id, title, authors, url, score}]
+    updatedAt = db.DateTimeField()
+
+    @staticmethod
+    def for_book(book_id):
+        """
+        Similar books for a title with one indexed lookup.
+
+        Returns:
+            Raw recommendation document (similar, updatedAt), or None
+        """
+        return Recommendation.objects(book=book_id).only('similar', 'updatedAt').as_pymongo().first()
+
+    @staticmethod
+    def rebuild(use_loans=True, top_k=None):
+        """
+        Recompute recommendations for the whole catalog, optionally blending in
+        which books the same members borrowed.
+
+        Returns:
+            Number of books with recommendations written
+        """
+        from app.models.books import Book
+        from app.models.loans import Loan
+
+        books = list(Book._get_collection().find({}, FEATURE_FIELDS))
+        borrowers = None
+        if use_loans:
+            pipeline = [{'$group': {'_id': '$book', 'members': {'$addToSet': '$member'}}}]
+            borrowers = {row['_id']: set(row['members']) for row in Loan._get_collection().aggregate(pipeline)}
+
+        similar = compute_similar(books, borrowers, top_k)
+        by_id = {book['_id']: book for book in books}
+        now = datetime.utcnow()
+
+        collection = Recommendation._get_collection()
+        operations = [
+            ReplaceOne(
+                {'book': book_id},
+                {'book': book_id,
+                 'similar': [similar_entry(by_id[other], score) for other, score in neighbours],
+                 'updatedAt': now},
+                upsert=True
+            )
+            for book_id, neighbours in similar.items()
+        ]
+        for start in range(0, len(operations), 1000):
+            collection.bulk_write(operations[start:start + 1000], ordered=False)
+        # Drop recommendations of books that no longer exist
+        collection.delete_many({'book': {'$nin': list(by_id)}})
+        return len(operations)
+
+    @staticmethod
+    def add_book(book):
+        """
+        Incrementally add a newly created book: store its own neighbours and
+        insert it into the lists of existing books it now ranks in.
+        """
+        from app.models.books import Book
+
+        top_k = RECOMMENDATIONS['top_k']
+        min_score = RECOMMENDATIONS['min_score']
+        new_book = {'_id': book.id, 'title': book.title, 'authors': book.authors,
+                    'genres': book.genres, 'category': book.category, 'url': book.url}
+
+        others = list(Book._get_collection().find({'_id': {'$ne': book.id}}, FEATURE_FIELDS))
+        scores = [(other, score) for other, (_, score) in zip(others, similarities_to(new_book, others))
+                  if score >= min_score]
+        scores.sort(key=lambda pair: -pair[1])
+        now = datetime.utcnow()
+
+        collection = Recommendation._get_collection()
+        operations = [ReplaceOne(
+            {'book': book.id},
+            {'book': book.id, 'similar': [similar_entry(other, score) for other, score in scores[:top_k]],
+             'updatedAt': now},
+            upsert=True
+        )]
+
+        # Existing lists the new book may enter
+        score_by_id = {other['_id']: score for other, score in scores}
+        for existing in collection.find({'book': {'$in': list(score_by_id)}}, {'book': 1, 'similar': 1}):
+            similar = existing.get('similar') or []
+            score = score_by_id[existing['book']]
+            if len(similar) >= top_k and score <= similar[-1]['score']:
+                continue
+            similar = sorted(similar + [similar_entry(new_book, score)], key=lambda entry: -entry['score'])[:top_k]
+            operations.append(UpdateOne({'_id': existing['_id']},
+                                        {'$set': {'similar': similar, 'updatedAt': now}}))
+
+        collection.bulk_write(operations, ordered=False)
@@ -1,6 +1,6 @@
 from app import db
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.services.passwords import password_hasher
 
 class User(UserMixin, db.Document):
     meta = {'collection': 'libraryUsers'}
@@ -10,12 +10,21 @@ class User(UserMixin, db.Document):
     is_admin = db.BooleanField(default=False)
     
     def set_password(self, password):
-        """Hash and set password"""
-        self.password = generate_password_hash(password)
+        """Hash and set password (raises PasswordHashingBusy when overloaded)"""
+        self.password = password_hasher.hash(password)
     
     def check_password(self, password):
         """Check if provided password matches the hashed password"""
-        return check_password_hash(self.password, password)
+        return password_hasher.verify(self.password, password)
+
+    def upgrade_password(self, password):
+        """
+        Re-hash a just-verified password if it was stored with an older hash
+        method or cost (see PASSWORDS['method']).
+        """
+        if password_hasher.needs_rehash(self.password):
+            self.set_password(password)
+            User.objects(id=self.id).update_one(set__password=self.password)
     
     @staticmethod
     def getUser(email):
@@ -0,0 +1,22 @@
+from app.config import STORAGE
+
+
+def create_repository(backend=None):
+    """
+    Build the storage backend named in STORAGE['backend'] ('mongo' or 'memory').
+
+    Raises:
+        Exception for an unknown backend name
+    """
+    backend = backend or STORAGE['backend']
+    if backend == 'mongo':
+        from app.repositories.mongo import MongoRepository
+        return MongoRepository()
+    if backend == 'memory':
+        from app.repositories.memory import MemoryRepository
+        return MemoryRepository()
+    raise Exception(f"Unknown storage backend '{backend}'")
+
+
+# Shared by the controllers
+repository = create_repository()
@@ -0,0 +1,170 @@
+from abc import ABC, abstractmethod
+
+
+class LibraryRepository(ABC):
+    """
+    Storage operations used by the catalog, account and loan controllers.
+
+    Books, users and loans returned by a repository expose the same attributes
+    as the MongoEngine documents (id, title, available, borrowDate, ...), and
+    loans have the LoanTerms properties, so templates and controllers do not
+    depend on the backend. Records may be immutable: use the object a
+    renew/return returns rather than the one passed in. Errors are raised as
+    Exception with a message fit for flashing, as the models do.
+    """
+
+    name = None
+
+    # Whether holds (kept in MongoDB only) can be placed alongside this backend
+    supports_holds = False
+
+    # Catalog
+
+    @abstractmethod
+    def catalog_state(self):
+        """
+        Catalog-wide aggregates: categoryCounts, genreCounts, availableTitles,
+        plus a version and updatedAt that change with every catalog change.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def find_books(self, category='All', genres=None, available_only=False, sort='title',
+                   skip=0, limit=None, fields=None):
+        """
+        Filtered catalog page.
+
+        Args:
+            category: Category to filter by ('All' means no filter)
+            genres: Optional list of genres; a book must have all of them
+            available_only: If True, only titles with a copy available
+            sort: 'title', 'trending' or 'popular' (see SORT_ORDERS)
+            skip: Number of books to skip
+            limit: Maximum number of books, or None for all of them
+            fields: Optional field names to load (others may be missing)
+
+        Returns:
+            Tuple of (list of books, total number of matching books)
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_books(self, book_ids, fields=None):
+        """
+        Books with the given ids (in no particular order). `fields` optionally
+        names the fields to load (others may be missing).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_book(self, book_id, catalog=False):
+        """
+        Book by id, or None if there is no such book (or the id is malformed).
+        `catalog=True` marks a read-only page view, which may be served from
+        a replica.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def search_books(self, query, category='All', page=1, per_page=10):
+        """
+        Full-text search over title, authors, genres and description.
+
+        Returns:
+            Tuple of (list of books ranked by relevance, total number of matches)
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def find_books_by_title(self, title):
+        """Books whose title matches `title` ignoring case"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def count_books(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def autocomplete_rows(self):
+        """(id, title, authors) of every book, for building the typeahead index"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_book(self, book_data):
+        """Add a book (all copies available) and return it"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def book_with_cover(self, url):
+        """A book whose cover image is `url`, or None (vets cover fetches)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def similar_books(self, book):
+        """Precomputed similar-books document for a book, or None"""
+        raise NotImplementedError
+
+    # Users
+
+    @abstractmethod
+    def get_user(self, email):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_user_by_id(self, user_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_user(self, email, name, password, is_admin=False):
+        """Create a user unless the email is taken; return the user with that email"""
+        raise NotImplementedError
+
+    # Loans and holds
+
+    @abstractmethod
+    def get_user_loans(self, user):
+        """All of a user's loans, most recently borrowed first"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_loan(self, loan_id):
+        """Loan by id, or None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def count_active_loans(self, user):
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_loan(self, user, book):
+        """
+        Lend a copy of a book to a user. Checking availability and taking the
+        copy happen atomically, so two members can never take the last copy.
+
+        Raises:
+            Exception if the user already has the book or no copy is available
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def renew_loan(self, loan):
+        """Renew a loan (see renew_update); raises Exception if it cannot be renewed"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def return_loan(self, loan):
+        """
+        Return a loan and release its copy. Only one of several concurrent
+        returns of the same loan succeeds.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_loan(self, loan):
+        """Delete a returned loan; raises Exception for an open one"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_user_holds(self, user):
+        """The user's waiting and ready holds"""
+        raise NotImplementedError
@@ -0,0 +1,302 @@
+import re
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime
+from types import SimpleNamespace
+
+from bson import ObjectId
+from flask_login import UserMixin
+
+from app.models.books import Book, sort_spec, borrow_update, return_update
+from app.models.loans import random_borrow_date, renew_update, close_update
+from app.models.read_models import BookView, LoanView
+from app.repositories.base import LibraryRepository
+from app.services.autocomplete import autocomplete_index
+from app.services.availability_events import publish_availability
+from app.services.passwords import password_hasher
+
+# Field weights for search, as in the books text index
+SEARCH_WEIGHTS = {'title': 10, 'authors': 6, 'genres': 3, 'description': 1}
+
+WORD = re.compile(r'\w+')
+
+
+def search_terms(value):
+    """Lowercase words in a string or list of strings"""
+    if isinstance(value, (list, tuple)):
+        value = ' '.join(value)
+    return set(WORD.findall((value or '').lower()))
+
+
+class MemoryUser(UserMixin):
+    """In-memory counterpart of the User document"""
+
+    def __init__(self, email, name, is_admin=False):
+        self.id = ObjectId()
+        self.email = email
+        self.name = name
+        self.is_admin = is_admin
+        self.password = None
+
+    def set_password(self, password):
+        """Hash and set password (raises PasswordHashingBusy when overloaded)"""
+        self.password = password_hasher.hash(password)
+
+    def check_password(self, password):
+        """Check if provided password matches the hashed password"""
+        return password_hasher.verify(self.password, password)
+
+    def upgrade_password(self, password):
+        """Re-hash a just-verified password stored with an older method or cost"""
+        if password_hasher.needs_rehash(self.password):
+            self.set_password(password)
+
+    def __repr__(self):
+        return f'<MemoryUser {self.email}>'
+
+
+class MemoryRepository(LibraryRepository):
+    """
+    Books, users and loans held in process memory. Books and loans are
+    immutable BookView/LoanView tuples that are replaced on every change, and
+    one lock guards every change, so check-then-update sequences (taking the
+    last copy, returning a loan once) are atomic just as the version-checked
+    MongoDB updates are. Data lives for the life of the process; run a single
+    worker.
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._books = {}           # str(id) -> BookView
+        self._search_terms = {}    # str(id) -> {field: set of words}
+        self._users = {}           # email -> MemoryUser
+        self._users_by_id = {}     # str(id) -> MemoryUser
+        self._loans = {}           # str(id) -> LoanView
+        self._member_loans = defaultdict(list)  # str(member id) -> [str(loan id)]
+        self._version = 0
+        self._updated_at = datetime.utcnow()
+        self._state = None
+
+    def _changed(self):
+        # Called with the lock held after every catalog change
+        self._version += 1
+        self._updated_at = datetime.utcnow()
+
+    def _add_book(self, book_data):
+        book = BookView.build(ObjectId(), dict(book_data, updatedAt=datetime.utcnow()))
+        book_id = str(book.id)
+        self._books[book_id] = book
+        self._search_terms[book_id] = {field: search_terms(getattr(book, field))
+                                       for field in SEARCH_WEIGHTS}
+        return book
+
+    def load_books(self, books):
+        """Add every book whose title is not in the catalog yet (see Book.bookDatabase)"""
+        with self._lock:
+            titles = {book.title for book in self._books.values()}
+            for book_data in books:
+                if book_data.get('title') not in titles:
+                    self._add_book(book_data)
+                    titles.add(book_data.get('title'))
+            self._changed()
+        autocomplete_index.build(self.autocomplete_rows())
+
+    # Catalog
+
+    def catalog_state(self):
+        with self._lock:
+            if self._state is None or self._state.version != self._version:
+                books = list(self._books.values())
+                self._state = SimpleNamespace(
+                    categoryCounts=dict(Counter(book.category for book in books if book.category)),
+                    genreCounts=dict(Counter(genre for book in books for genre in book.genres)),
+                    availableTitles=sum(1 for book in books if (book.available or 0) > 0),
+                    version=self._version,
+                    updatedAt=self._updated_at
+                )
+            return self._state
+
+    def find_books(self, category='All', genres=None, available_only=False, sort='title',
+                   skip=0, limit=None, fields=None):
+        with self._lock:
+            books = list(self._books.values())
+
+        if category and category != 'All':
+            books = [book for book in books if book.category == category]
+        if genres:
+            books = [book for book in books if set(genres).issubset(book.genres)]
+        if available_only:
+            books = [book for book in books if (book.available or 0) > 0]
+
+        # Stable sorts from the last key to the first give the compound order
+        for field, direction in reversed(sort_spec(sort)):
+            empty = '' if field == 'title' else 0
+            books.sort(key=lambda book: getattr(book, field) or empty, reverse=direction < 0)
+
+        total = len(books)
+        if limit:
+            books = books[skip:skip + limit]
+        return books, total
+
+    def get_books(self, book_ids, fields=None):
+        with self._lock:
+            return [self._books[str(book_id)] for book_id in book_ids if str(book_id) in self._books]
+
+    def get_book(self, book_id, catalog=False):
+        with self._lock:
+            return self._books.get(str(book_id))
+
+    def search_books(self, query, category='All', page=1, per_page=10):
+        terms = search_terms((query or '').strip())
+        if not terms:
+            return [], 0
+
+        with self._lock:
+            candidates = [(self._books[book_id], fields) for book_id, fields in self._search_terms.items()]
+
+        ranked = []
+        for book, fields in candidates:
+            if category != 'All' and book.category != category:
+                continue
+            score = sum(weight * len(terms & fields[field]) for field, weight in SEARCH_WEIGHTS.items())
+            if score:
+                ranked.append((-score, book.title or '', book))
+        ranked.sort(key=lambda row: row[:2])
+
+        page = max(int(page or 1), 1)
+        start = (page - 1) * per_page
+        return [book for _, _, book in ranked[start:start + per_page]], len(ranked)
+
+    def find_books_by_title(self, title):
+        title = title.strip().lower()
+        with self._lock:
+            return [book for book in self._books.values() if (book.title or '').lower() == title]
+
+    def count_books(self):
+        with self._lock:
+            return len(self._books)
+
+    def autocomplete_rows(self):
+        with self._lock:
+            return [(book_id, book.title, book.authors) for book_id, book in self._books.items()]
+
+    def create_book(self, book_data):
+        with self._lock:
+            book = self._add_book(book_data)
+            self._changed()
+        autocomplete_index.add_book(str(book.id), book.title, book.authors)
+        return book
+
+    def book_with_cover(self, url):
+        with self._lock:
+            return next((book for book in self._books.values() if book.url == url), None)
+
+    def similar_books(self, book):
+        return None
+
+    # Users
+
+    def get_user(self, email):
+        with self._lock:
+            return self._users.get(email)
+
+    def get_user_by_id(self, user_id):
+        with self._lock:
+            return self._users_by_id.get(str(user_id))
+
+    def create_user(self, email, name, password, is_admin=False):
+        existing = self.get_user(email)
+        if existing:
+            return existing
+        # Hash outside the lock: borrows, returns and catalog reads must not
+        # wait behind a (deliberately slow) password hash
+        user = MemoryUser(email, name, is_admin=is_admin)
+        user.set_password(password)
+        with self._lock:
+            # Someone may have registered the email while we were hashing
+            existing = self._users.get(email)
+            if existing:
+                return existing
+            self._users[email] = user
+            self._users_by_id[str(user.id)] = user
+            return user
+
+    # Loans and holds
+
+    def _user_loans(self, user):
+        # Called with the lock held
+        return [self._loans[loan_id] for loan_id in self._member_loans[str(user.id)]]
+
+    def get_user_loans(self, user):
+        with self._lock:
+            loans = self._user_loans(user)
+        return sorted(loans, key=lambda loan: loan.borrowDate, reverse=True)
+
+    def get_loan(self, loan_id):
+        with self._lock:
+            return self._loans.get(str(loan_id))
+
+    def count_active_loans(self, user):
+        with self._lock:
+            return sum(1 for loan in self._user_loans(user) if not loan.is_returned)
+
+    def create_loan(self, user, book):
+        with self._lock:
+            book = self._books[str(book.id)]
+            if any(loan.book.id == book.id and not loan.is_returned for loan in self._user_loans(user)):
+                raise Exception(f"You already have an unreturned loan for '{book.title}'")
+            if (book.available or 0) <= 0:
+                raise Exception(f"'{book.title}' is currently not available for loan.")
+
+            borrow_date = random_borrow_date()
+            book = book._replace(borrowCount=book.borrowCount + 1,
+                                 trendingScore=book.trendingScore + Book.trending_weight(borrow_date),
+                                 **borrow_update(book, 1))
+            self._books[str(book.id)] = book
+
+            loan = LoanView(id=ObjectId(), member=user, book=book, borrowDate=borrow_date,
+                            returnDate=None, renewCount=0)
+            self._loans[str(loan.id)] = loan
+            self._member_loans[str(user.id)].append(str(loan.id))
+            self._changed()
+
+        publish_availability(book)
+        return loan
+
+    def renew_loan(self, loan):
+        with self._lock:
+            # Always start from the stored loan: `loan` may be an older copy
+            loan = self._loans[str(loan.id)]
+            loan = loan._replace(**renew_update(loan))
+            self._loans[str(loan.id)] = loan
+        return loan
+
+    def return_loan(self, loan):
+        with self._lock:
+            loan = self._loans[str(loan.id)]
+            book = self._books[str(loan.book.id)]
+            changes = close_update(loan)
+            book = book._replace(**return_update(book, 1))
+            self._books[str(book.id)] = book
+            loan = loan._replace(book=book, **changes)
+            self._loans[str(loan.id)] = loan
+            self._changed()
+
+        publish_availability(book)
+        return loan
+
+    def delete_loan(self, loan):
+        with self._lock:
+            loan = self._loans.get(str(loan.id))
+            if loan is None:
+                return
+            if not loan.can_delete:
+                raise Exception("Only returned loans can be deleted")
+            del self._loans[str(loan.id)]
+            self._member_loans[str(loan.member.id)].remove(str(loan.id))
+
+    def get_user_holds(self, user):
+        # Holds are kept in MongoDB only
+        return []
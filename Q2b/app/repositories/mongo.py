@@ -0,0 +1,105 @@
+from mongoengine.errors import ValidationError
+from app.models.books import Book
+from app.models.catalog import CatalogState
+from app.models.holds import Hold
+from app.models.loans import Loan
+from app.models.recommendations import Recommendation
+from app.models.users import User
+from app.repositories.base import LibraryRepository
+from app.services.catalog_snapshot import catalog_snapshot
+from app.services.circuit_breaker import db_breaker
+
+
+class MongoRepository(LibraryRepository):
+    """The MongoEngine models behind the repository interface"""
+
+    name = 'mongo'
+    supports_holds = True
+
+    def catalog_state(self):
+        state = CatalogState.get_state(catalog=True)
+        # Keep the fallback snapshot current (refreshes in the background)
+        catalog_snapshot.refresh_if_needed(
+            state, lambda: db_breaker.call(lambda: list(Book.catalog().order_by('title').as_pymongo())))
+        return state
+
+    def find_books(self, category='All', genres=None, available_only=False, sort='title',
+                   skip=0, limit=None, fields=None):
+        query = Book.filter_books(category, genres, available_only, sort)
+        total = query.count()
+        if limit:
+            query = query.skip(skip).limit(limit)
+        if fields:
+            query = query.only(*fields)
+        return list(query), total
+
+    def get_books(self, book_ids, fields=None):
+        query = Book.catalog().filter(id__in=list(book_ids))
+        if fields:
+            query = query.only(*fields)
+        return list(query)
+
+    def get_book(self, book_id, catalog=False):
+        query = Book.catalog() if catalog else Book.objects
+        try:
+            return query.get(id=book_id)
+        except (Book.DoesNotExist, ValidationError):
+            return None
+
+    def search_books(self, query, category='All', page=1, per_page=10):
+        return Book.search_books(query, category=category, page=page, per_page=per_page)
+
+    def find_books_by_title(self, title):
+        return list(Book.objects(title__iexact=title.strip()))
+
+    def count_books(self):
+        return Book.objects.count()
+
+    def autocomplete_rows(self):
+        rows = Book.catalog().only('title', 'authors').as_pymongo()
+        return [(str(row['_id']), row.get('title'), row.get('authors')) for row in rows]
+
+    def create_book(self, book_data):
+        return Book.create_book(book_data)
+
+    def book_with_cover(self, url):
+        return Book.objects(url=url).only('id').first()
+
+    def similar_books(self, book):
+        return Recommendation.for_book(book.id)
+
+    def get_user(self, email):
+        return User.getUser(email)
+
+    def get_user_by_id(self, user_id):
+        return User.getUserById(user_id)
+
+    def create_user(self, email, name, password, is_admin=False):
+        return User.createUser(email, name, password, is_admin=is_admin)
+
+    def get_user_loans(self, user):
+        return Loan.get_user_loans(user)
+
+    def get_loan(self, loan_id):
+        try:
+            return Loan.get_loan_by_id(loan_id)
+        except ValidationError:
+            return None
+
+    def count_active_loans(self, user):
+        return Loan.objects(member=user, returnDate__exists=False).count()
+
+    def create_loan(self, user, book):
+        return Loan.create_loan(user, book)
+
+    def renew_loan(self, loan):
+        return loan.renew_loan()
+
+    def return_loan(self, loan):
+        return loan.return_loan()
+
+    def delete_loan(self, loan):
+        loan.delete_loan()
+
+    def get_user_holds(self, user):
+        return Hold.get_user_holds(user)
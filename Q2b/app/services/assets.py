@@ -0,0 +1,143 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import Blueprint, current_app, request, send_from_directory, url_for as flask_url_for
+from app.config import ASSET_CONFIG
+
+try:
+    import brotli  # Optional: .br variants are skipped without it
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html')
+
+# Blueprint serving the fingerprinted copies written by build_assets
+assets = Blueprint('assets', __name__)
+
+# original filename (relative to the static folder) -> fingerprinted filename
+_manifest = {}
+
+
+def _fingerprinted_name(relative_path, digest):
+    root, ext = os.path.splitext(relative_path)
+    return f"{root}.{digest}{ext}"
+
+
+def _write_if_missing(path, data):
+    if os.path.isfile(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as handle:
+        handle.write(data)
+    os.replace(tmp_path, path)
+
+
+def build_assets(static_folder, build_dir):
+    """
+    Write content-hashed copies of every static file (plus .gz/.br variants
+    of text assets) into build_dir and return the filename manifest.
+    Unchanged files keep their name, so rebuilding is cheap.
+    """
+    manifest = {}
+    for folder, _, files in os.walk(static_folder):
+        for name in files:
+            source = os.path.join(folder, name)
+            relative = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as handle:
+                data = handle.read()
+
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            hashed = _fingerprinted_name(relative, digest)
+            target = os.path.join(build_dir, hashed)
+            _write_if_missing(target, data)
+
+            if relative.endswith(COMPRESSIBLE):
+                _write_if_missing(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    _write_if_missing(target + '.br', brotli.compress(data, quality=11))
+
+            manifest[relative] = hashed
+
+    os.makedirs(build_dir, exist_ok=True)
+    manifest_path = os.path.join(build_dir, 'manifest.json')
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+    return manifest
+
+
+def asset_url_for(endpoint, **values):
+    """url_for that points static files at their fingerprinted copies"""
+    if endpoint == 'static' and values.get('filename') in _manifest:
+        values['filename'] = _manifest[values['filename']]
+        return flask_url_for('assets.fingerprinted', **values)
+    return flask_url_for(endpoint, **values)
+
+
+@assets.route('/static-build/<path:filename>')
+def fingerprinted(filename):
+    """
+    Serve a fingerprinted asset. The name changes whenever the content does,
+    so it can be cached forever; precompressed variants are used when accepted.
+    """
+    build_dir = get_build_dir()
+    encodings = request.accept_encodings
+    response = None
+
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encodings[encoding] and os.path.isfile(os.path.join(build_dir, filename + suffix)):
+            response = send_from_directory(build_dir, filename + suffix)
+            response.headers['Content-Encoding'] = encoding
+            # Keep the real type, not the one guessed from .gz/.br
+            response.mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            break
+
+    if response is None:
+        response = send_from_directory(build_dir, filename)
+
+    response.headers['Cache-Control'] = f"public, max-age={ASSET_CONFIG['max_age']}, immutable"
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def compress_response(response):
+    """Gzip HTML responses when enabled in config and accepted by the client"""
+    if (not ASSET_CONFIG['compress_html']
+            or response.status_code != 200
+            or response.direct_passthrough
+            or response.mimetype != 'text/html'
+            or 'Content-Encoding' in response.headers
+            or not request.accept_encodings['gzip']):
+        return response
+
+    data = response.get_data()
+    if len(data) < ASSET_CONFIG['compress_min_size']:
+        return response
+
+    response.set_data(gzip.compress(data, compresslevel=ASSET_CONFIG['compress_level']))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    # The compressed body is a different representation of the same page
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def get_build_dir():
+    return ASSET_CONFIG['build_dir'] or os.path.join(current_app.instance_path, 'static-build')
+
+
+def init_assets(app):
+    """Build fingerprinted assets at startup and hook them into templates"""
+    global _manifest
+    with app.app_context():
+        _manifest = build_assets(app.static_folder, get_build_dir())
+    app.register_blueprint(assets)
+    app.jinja_env.globals['url_for'] = asset_url_for
+    app.after_request(compress_response)
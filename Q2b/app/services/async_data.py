@@ -0,0 +1,168 @@
+import asyncio
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.read_preferences import ReadPreference
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient  # Optional: only the async mode needs Motor
+except ImportError:
+    AsyncIOMotorClient = None
+
+from app.models.books import Book, READ_PREFERENCES, sort_spec
+from app.models.catalog import CatalogState
+from app.models.holds import Hold
+from app.models.loans import Loan
+from app.models.recommendations import Recommendation
+from app.models.users import User
+
+
+def _object_id(value):
+    try:
+        return ObjectId(str(value))
+    except (InvalidId, TypeError):
+        return None
+
+
+def book_filter_query(category='All', genres=None, available_only=False):
+    """Raw MongoDB filter equivalent to Book.filter_books"""
+    query = {}
+    if category and category != 'All':
+        query['category'] = category
+    if genres:
+        query['genres'] = {'$all': list(genres)}
+    if available_only:
+        query['available'] = {'$gt': 0}
+    return query
+
+
+class AsyncLibraryData:
+    """
+    Motor-backed mirror of the Book, Loan and User queries used by the
+    catalog and loans pages. Returns raw documents; callers turn them into
+    model instances with `_from_son` so templates and helpers are shared
+    with the synchronous views.
+    """
+
+    def __init__(self, mongodb_settings, catalog_read_preference='primary'):
+        if AsyncIOMotorClient is None:
+            raise RuntimeError("The async data layer requires the 'motor' package")
+        settings = dict(mongodb_settings)
+        self.db_name = settings.pop('db', 'library')
+        settings.pop('alias', None)
+        self._settings = settings
+        self._catalog_read_preference = READ_PREFERENCES.get(catalog_read_preference, ReadPreference.PRIMARY)
+        self._client = None
+
+    @property
+    def db(self):
+        # Created on first use so the client binds to the server's event loop
+        if self._client is None:
+            self._client = AsyncIOMotorClient(**self._settings)
+        return self._client[self.db_name]
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    def _catalog_books(self):
+        """Books collection using the catalog read preference"""
+        return self.db[Book._get_collection_name()].with_options(read_preference=self._catalog_read_preference)
+
+    async def catalog_state(self):
+        # Same read preference as the books, so the version never runs ahead of the page
+        collection = self.db[CatalogState._get_collection_name()]
+        return await collection.with_options(read_preference=self._catalog_read_preference).find_one({'key': 'catalog'})
+
+    async def list_books(self, filters, fields):
+        """
+        One page of books for the catalog plus the total count, queried concurrently.
+        """
+        books = self._catalog_books()
+        query = book_filter_query(filters['category'], filters['genres'], filters['available_only'])
+        projection = {field: 1 for field in fields if field != 'id'}
+
+        cursor = books.find(query, projection).sort(sort_spec(filters.get('sort'))).skip(filters['skip'])
+        if filters['per_page']:
+            cursor = cursor.limit(filters['per_page'])
+
+        docs, total = await asyncio.gather(cursor.to_list(length=None), books.count_documents(query))
+        return docs, total
+
+    async def get_books(self, book_ids):
+        cursor = self._catalog_books().find({'_id': {'$in': list(book_ids)}})
+        return await cursor.to_list(length=None)
+
+    async def get_book(self, book_id):
+        oid = _object_id(book_id)
+        if oid is None:
+            return None
+        return await self._catalog_books().find_one({'_id': oid})
+
+    async def get_recommendations(self, book_id):
+        oid = _object_id(book_id)
+        if oid is None:
+            return None
+        return await self.db[Recommendation._get_collection_name()].find_one(
+            {'book': oid}, {'similar': 1, 'updatedAt': 1})
+
+    async def get_user(self, user_id):
+        oid = _object_id(user_id)
+        if oid is None:
+            return None
+        return await self.db[User._get_collection_name()].find_one({'_id': oid})
+
+    async def get_user_loans(self, user_id):
+        """
+        A member's loans, newest first, with each book joined in the same query
+        (stored under 'bookDoc').
+        """
+        pipeline = [
+            {'$match': {'member': _object_id(user_id)}},
+            {'$sort': {'borrowDate': -1}},
+            {'$lookup': {
+                'from': Book._get_collection_name(),
+                'localField': 'book',
+                'foreignField': '_id',
+                'as': 'bookDoc'
+            }},
+            {'$unwind': '$bookDoc'}
+        ]
+        cursor = self.db[Loan._get_collection_name()].aggregate(pipeline)
+        return await cursor.to_list(length=None)
+
+    async def get_user_holds(self, user_id):
+        """
+        A member's active holds, oldest first, with the book joined (under
+        'bookDoc') and the number of waiting holds ahead of each (under 'ahead').
+        """
+        pipeline = [
+            {'$match': {'member': _object_id(user_id), 'status': {'$in': list(Hold.ACTIVE_STATUSES)}}},
+            {'$sort': {'createdAt': 1}},
+            {'$lookup': {
+                'from': Book._get_collection_name(),
+                'localField': 'book',
+                'foreignField': '_id',
+                'as': 'bookDoc'
+            }},
+            {'$unwind': '$bookDoc'},
+            {'$lookup': {
+                'from': Hold._get_collection_name(),
+                'let': {'bookId': '$book', 'createdAt': '$createdAt'},
+                'pipeline': [
+                    {'$match': {'status': 'waiting', '$expr': {'$and': [
+                        {'$eq': ['$book', '$$bookId']},
+                        {'$lt': ['$createdAt', '$$createdAt']}
+                    ]}}},
+                    {'$count': 'count'}
+                ],
+                'as': 'ahead'
+            }}
+        ]
+        cursor = self.db[Hold._get_collection_name()].aggregate(pipeline)
+        return await cursor.to_list(length=None)
+
+    async def count_active_loans(self, user_id):
+        return await self.db[Loan._get_collection_name()].count_documents(
+            {'member': _object_id(user_id), 'returnDate': {'$exists': False}})
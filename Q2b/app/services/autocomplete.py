@@ -0,0 +1,99 @@
+import threading
+from bisect import bisect_left
+
+
+def _normalize(text):
+    """Lower-case and collapse whitespace so prefixes match regardless of case"""
+    return ' '.join((text or '').lower().split())
+
+
+class AutocompleteIndex:
+    """
+    In-memory prefix index over book titles and author names.
+
+    Entries are kept in a sorted array so a lookup is one binary search plus a
+    bounded scan. Writers rebuild the arrays copy-on-write under a lock, so
+    readers never block and never see a half-updated index.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (sorted normalized keys, parallel (label, kind, book_id) entries),
+        # swapped as a single tuple so readers always see a matching pair
+        self._snapshot = ([], [])
+        self.loaded = False
+
+    @staticmethod
+    def _book_entries(book_id, title, authors):
+        entries = []
+        if title:
+            entries.append((_normalize(title), (title, 'title', book_id)))
+        for author in authors or []:
+            name = author.replace(' (Illustrator)', '').strip()
+            if name:
+                # Authors are shared across books, so they are stored without a book id
+                entries.append((_normalize(name), (name, 'author', None)))
+        return entries
+
+    def build(self, books):
+        """
+        Rebuild the index from an iterable of (book_id, title, authors) tuples.
+        """
+        pairs = {}
+        for book_id, title, authors in books:
+            for key, entry in self._book_entries(book_id, title, authors):
+                pairs[(key, entry)] = None
+
+        ordered = sorted(pairs)
+        with self._lock:
+            self._snapshot = ([key for key, _ in ordered], [entry for _, entry in ordered])
+            self.loaded = True
+
+    def add_book(self, book_id, title, authors):
+        """Insert a single book's title and authors into the index"""
+        new_pairs = self._book_entries(book_id, title, authors)
+
+        with self._lock:
+            keys, entries = (list(part) for part in self._snapshot)
+            for key, entry in new_pairs:
+                pos = bisect_left(keys, key)
+                # Skip exact duplicates (e.g. an author who already has other books)
+                duplicate = False
+                i = pos
+                while i < len(keys) and keys[i] == key:
+                    if entries[i] == entry:
+                        duplicate = True
+                        break
+                    i += 1
+                if not duplicate:
+                    keys.insert(pos, key)
+                    entries.insert(pos, entry)
+            self._snapshot = (keys, entries)
+
+    def suggest(self, prefix, limit=8):
+        """
+        Return up to `limit` suggestions whose title or author starts with `prefix`.
+
+        Returns:
+            List of dicts with 'label', 'type' and 'id' keys
+        """
+        prefix = _normalize(prefix)
+        if not prefix or limit <= 0:
+            return []
+
+        keys, entries = self._snapshot
+
+        results = []
+        seen = set()
+        pos = bisect_left(keys, prefix)
+        while pos < len(keys) and len(results) < limit and keys[pos].startswith(prefix):
+            label, kind, book_id = entries[pos]
+            if (label, kind) not in seen:
+                seen.add((label, kind))
+                results.append({'label': label, 'type': kind, 'id': book_id})
+            pos += 1
+        return results
+
+
+# Shared index for the running process, built at startup from the books collection
+autocomplete_index = AutocompleteIndex()
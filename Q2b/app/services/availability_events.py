@@ -0,0 +1,126 @@
+import itertools
+import json
+import queue
+import threading
+
+from app.config import AVAILABILITY_EVENTS
+from app.services.metrics import metrics
+
+
+class AvailabilityBroker:
+    """
+    In-process pub/sub for book availability changes. Each Server-Sent Events
+    connection subscribes with a bounded queue; publishing never blocks, and a
+    subscriber that falls behind loses its oldest events rather than holding
+    up borrows and returns.
+    """
+
+    def __init__(self, queue_size=100):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._queue_size = queue_size
+        self._ids = itertools.count(1)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=self._queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        metrics.add_to_gauge('sse.availability.subscribers', 1)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+        metrics.add_to_gauge('sse.availability.subscribers', -1)
+
+    def publish(self, book_id, available, copies):
+        event = {'id': str(book_id), 'available': int(available or 0), 'copies': int(copies or 0)}
+        event_id = next(self._ids)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((event_id, event))
+            except queue.Full:
+                # Drop the oldest event for this slow client and keep the newest
+                try:
+                    subscriber.get_nowait()
+                    subscriber.put_nowait((event_id, event))
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def stream(self, book_ids=None, heartbeat_seconds=15):
+        """
+        Generator of Server-Sent Events for the given books (all books if None).
+        Sends a comment line as a heartbeat so proxies keep the connection open.
+        """
+        subscriber = self.subscribe()
+        try:
+            yield f"retry: {AVAILABILITY_EVENTS['retry_ms']}\n\n"
+            while True:
+                try:
+                    event_id, event = subscriber.get(timeout=heartbeat_seconds)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if book_ids is not None and event['id'] not in book_ids:
+                    continue
+                yield f"id: {event_id}\nevent: availability\ndata: {json.dumps(event)}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+
+availability_broker = AvailabilityBroker(AVAILABILITY_EVENTS['queue_size'])
+
+
+def publish_availability(book):
+    """
+    Announce a committed availability change made by this process. When the
+    change stream feeds the broker instead, every process (this one included)
+    learns about it from MongoDB, so nothing is published here.
+    """
+    if AVAILABILITY_EVENTS['source'] == 'process':
+        availability_broker.publish(book.id, book.available, book.copies)
+
+
+def watch_availability(collection):
+    """
+    Feed the broker from a MongoDB change stream on the books collection, so
+    changes made by other worker processes reach this process's viewers too.
+    Requires a replica set. Runs in a daemon thread and restarts after errors.
+    """
+    from pymongo.errors import PyMongoError
+
+    pipeline = [
+        {'$match': {
+            'operationType': 'update',
+            'updateDescription.updatedFields.available': {'$exists': True}
+        }},
+        {'$project': {
+            'documentKey': 1,
+            'fullDocument.available': 1,
+            'fullDocument.copies': 1
+        }}
+    ]
+
+    def run():
+        while True:
+            try:
+                # PyMongo resumes transient interruptions itself; anything it gives up on
+                # restarts the stream from now, since viewers only need the latest counts
+                with collection.watch(pipeline, full_document='updateLookup') as stream:
+                    for change in stream:
+                        document = change.get('fullDocument') or {}
+                        availability_broker.publish(change['documentKey']['_id'],
+                                                    document.get('available'), document.get('copies'))
+            except PyMongoError as e:
+                print(f"Warning: availability change stream interrupted: {e}")
+                threading.Event().wait(AVAILABILITY_EVENTS['retry_ms'] / 1000)
+
+    thread = threading.Thread(target=run, name='availability-change-stream', daemon=True)
+    thread.start()
+    return thread
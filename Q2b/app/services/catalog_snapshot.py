@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+from app.config import CATALOG_SNAPSHOT
+from app.models.read_models import BookView
+from app.services.shared_catalog import SharedCatalog, write_shared_catalog
+
+
+def as_book_view(book):
+    """BookView of a view, a raw books document or a Book document"""
+    if isinstance(book, BookView):
+        return book
+    if isinstance(book, dict):
+        return BookView.from_raw(book)
+    return BookView.from_document(book)
+
+
+class CatalogSnapshot:
+    """
+    Last good copy of the whole catalog, kept in memory so catalog pages can
+    still be served (marked as possibly stale) while MongoDB is unavailable.
+    Refreshed in the background when the catalog version has moved on.
+    Books are held as compact BookView tuples, or in a memory-mapped
+    SharedCatalog when the app is preloaded before forking workers.
+    """
+
+    def __init__(self, refresh_seconds=60):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._last_attempt = 0.0
+        # (books sorted by title, {id: book}, catalog state, version, taken_at)
+        self._data = ((), {}, None, None, None)
+
+    @property
+    def available(self):
+        return self._data[4] is not None
+
+    @property
+    def taken_at(self):
+        return self._data[4]
+
+    @property
+    def state(self):
+        return self._data[2]
+
+    @property
+    def version(self):
+        """Catalog version the snapshot was taken at (None before the first one)"""
+        return self._data[3]
+
+    def replace(self, books, state):
+        """
+        Swap in a new snapshot. `books` may be Book documents, raw documents
+        (cheapest: load them with as_pymongo()) or BookViews.
+        """
+        books = [as_book_view(book) for book in books]
+        shared = self._data[0]
+        if isinstance(shared, SharedCatalog):
+            # Keep serving the shared file and record only what changed since
+            shared.apply(books)
+            self._data = (shared, shared, state, getattr(state, 'version', None), datetime.utcnow())
+            return
+
+        books = tuple(sorted(books, key=lambda book: book.title or ''))
+        self._data = (books, {str(book.id): book for book in books}, state,
+                      getattr(state, 'version', None), datetime.utcnow())
+
+    def preload_shared(self, path, books, state):
+        """
+        Pack the books into a file at `path` and serve the snapshot from a
+        memory map of it. Call in the master process before forking, so every
+        worker shares the same pages.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        write_shared_catalog(path, [as_book_view(book) for book in books], getattr(state, 'version', None))
+        shared = SharedCatalog.open(path)
+        self._data = (shared, shared, state, getattr(state, 'version', None), datetime.utcnow())
+
+    def refresh_if_needed(self, state, load_books):
+        """
+        Start a background refresh when the catalog version differs from the
+        snapshot's and the last attempt is older than `refresh_seconds`.
+        `load_books` is called in the background thread and returns all books.
+        """
+        version = getattr(state, 'version', None)
+        with self._lock:
+            if self._refreshing or (self.available and version == self._data[3]):
+                return
+            if time.monotonic() - self._last_attempt < self.refresh_seconds and self.available:
+                return
+            self._refreshing = True
+            self._last_attempt = time.monotonic()
+
+        def run():
+            try:
+                self.replace(load_books(), state)
+            except Exception as e:
+                print(f"Warning: Could not refresh catalog snapshot: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name='catalog-snapshot', daemon=True).start()
+
+    def get(self, book_id):
+        return self._data[1].get(str(book_id))
+
+    def query(self, filters):
+        """
+        Filter, sort and paginate the snapshot like Book.filter_books.
+
+        Returns:
+            Tuple of (books on the requested page, total matching books)
+        """
+        books = self._data[0]
+        category = filters['category']
+        genres = set(filters['genres'])
+        matches = [book for book in books
+                   if (category == 'All' or book.category == category)
+                   and genres.issubset(book.genres or [])
+                   and (not filters['available_only'] or (book.available or 0) > 0)]
+
+        # Matches are already in title order; the other options re-sort stably on their score
+        if filters.get('sort') == 'trending':
+            matches.sort(key=lambda book: -(book.trendingScore or 0))
+        elif filters.get('sort') == 'popular':
+            matches.sort(key=lambda book: -(book.borrowCount or 0))
+
+        if filters['per_page']:
+            page = matches[filters['skip']:filters['skip'] + filters['per_page']]
+        else:
+            page = matches
+        return page, len(matches)
+
+
+catalog_snapshot = CatalogSnapshot(CATALOG_SNAPSHOT['refresh_seconds'])
@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import deque
+
+from pymongo.errors import PyMongoError
+
+from app.config import CIRCUIT_BREAKER
+from app.services.metrics import metrics
+
+
+class DatabaseUnavailable(Exception):
+    """Raised instead of calling MongoDB while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker around MongoDB calls.
+
+    Outcomes of recent calls are kept in a sliding time window. When enough
+    calls have been made and the share of failures (errors or calls slower
+    than `slow_call_seconds`) reaches `failure_rate`, the breaker opens and
+    callers fail immediately for `open_seconds`. After that a single trial
+    call is let through (half-open); its outcome closes or re-opens the breaker.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, name, failure_rate=0.5, min_calls=5, window_seconds=30,
+                 open_seconds=15, slow_call_seconds=2.0):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.slow_call_seconds = slow_call_seconds
+
+        self._lock = threading.Lock()
+        self._outcomes = deque()  # (timestamp, failed)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def _set_state(self, state):
+        self._state = state
+        metrics.set_gauge(f"circuit.{self.name}.open", int(state != self.CLOSED))
+
+    def allow_request(self):
+        """True if a call may go to the database right now"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._set_state(self.HALF_OPEN)
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record(self, failed):
+        """Record the outcome of a call made after allow_request()"""
+        now = time.monotonic()
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._trial_in_flight = False
+                self._outcomes.clear()
+                if failed:
+                    self._opened_at = now
+                    self._set_state(self.OPEN)
+                else:
+                    self._set_state(self.CLOSED)
+                return
+
+            self._outcomes.append((now, failed))
+            while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+                self._outcomes.popleft()
+
+            failures = sum(1 for _, outcome in self._outcomes if outcome)
+            if (self._state == self.CLOSED and len(self._outcomes) >= self.min_calls
+                    and failures / len(self._outcomes) >= self.failure_rate):
+                self._opened_at = now
+                self._set_state(self.OPEN)
+                metrics.increment(f"circuit.{self.name}.tripped")
+
+    def call(self, func, *args, **kwargs):
+        """
+        Run `func` through the breaker. MongoDB errors are recorded as failures
+        and re-raised as DatabaseUnavailable; other exceptions pass through.
+        """
+        if not self.allow_request():
+            raise DatabaseUnavailable(f"{self.name} circuit is open")
+
+        started = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except PyMongoError as e:
+            self.record(True)
+            raise DatabaseUnavailable(str(e)) from e
+        except Exception:
+            self.record(False)
+            raise
+        self.record(time.monotonic() - started > self.slow_call_seconds)
+        return result
+
+
+db_breaker = CircuitBreaker('mongodb', **CIRCUIT_BREAKER)
@@ -0,0 +1,179 @@
+import hashlib
+import os
+import threading
+import urllib.request
+from io import BytesIO
+from urllib.parse import urlparse
+
+from flask import current_app
+from app.config import COVER_CONFIG
+
+try:
+    from PIL import Image  # Optional: thumbnails/WebP need Pillow
+except ImportError:
+    Image = None
+
+FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'webp': ('WEBP', 'image/webp'),
+}
+
+# Leading bytes of the image types an original may be served as
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+
+# Schemes a cover may be fetched from
+REMOTE_SCHEMES = ('http', 'https')
+
+_write_lock = threading.Lock()
+
+
+def source_key(url):
+    """Stable key for a cover's source URL, used in the public cover URLs"""
+    return hashlib.sha1((url or '').encode('utf-8')).hexdigest()[:20]
+
+
+def can_produce(fmt):
+    """True if variants in `fmt` can be generated here (needs Pillow)"""
+    return Image is not None and fmt in FORMATS
+
+
+def sniff_mimetype(path):
+    """Image type of a stored file from its first bytes, or None if it is not a known image"""
+    with open(path, 'rb') as handle:
+        head = handle.read(12)
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    for signature, mimetype in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return mimetype
+    return None
+
+
+class CoverStore:
+    """
+    Content-addressed store for book covers.
+
+    Originals are stored once under the SHA-256 of their bytes; a small ref
+    file maps each source URL to that digest. Thumbnails are generated once
+    per (digest, width, format) and kept next to the originals.
+    """
+
+    def __init__(self, root, source_dir=None):
+        self.root = root
+        self.source_dir = source_dir
+
+    def _path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    @staticmethod
+    def _write_atomic(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as handle:
+            handle.write(data)
+        os.replace(tmp_path, path)
+
+    def digest_for(self, key):
+        """Return the content digest stored for a source key, or None"""
+        try:
+            with open(self._path('refs', key), 'r') as handle:
+                return handle.read().strip() or None
+        except OSError:
+            return None
+
+    def original_path(self, digest):
+        return self._path('objects', digest[:2], digest)
+
+    def _read_source(self, url):
+        """Read cover bytes from the local source directory, falling back to the remote URL"""
+        if self.source_dir:
+            name = os.path.basename(urlparse(url).path)
+            for candidate in (name, source_key(url)):
+                path = os.path.join(self.source_dir, candidate)
+                if candidate and os.path.isfile(path):
+                    with open(path, 'rb') as handle:
+                        return handle.read()
+
+        if not COVER_CONFIG['fetch_remote']:
+            return None
+        # urlopen also reads file:// and ftp:// URLs; covers only come from the web
+        scheme = urlparse(url).scheme.lower()
+        if scheme not in REMOTE_SCHEMES:
+            raise Exception(f"Unsupported cover URL scheme '{scheme}'")
+        with urllib.request.urlopen(url, timeout=COVER_CONFIG['fetch_timeout']) as response:
+            return response.read(COVER_CONFIG['max_bytes'])
+
+    def store(self, url):
+        """
+        Make sure the cover for `url` is in the store.
+
+        Returns:
+            The content digest, or None if the cover could not be obtained
+        """
+        key = source_key(url)
+        digest = self.digest_for(key)
+        if digest and os.path.isfile(self.original_path(digest)):
+            return digest
+
+        try:
+            data = self._read_source(url)
+        except Exception as e:
+            current_app.logger.warning(f"Could not fetch cover {url}: {e}")
+            return None
+        if not data:
+            return None
+
+        digest = hashlib.sha256(data).hexdigest()
+        with _write_lock:
+            if not os.path.isfile(self.original_path(digest)):
+                self._write_atomic(self.original_path(digest), data)
+            self._write_atomic(self._path('refs', key), digest.encode('ascii'))
+        return digest
+
+    def variant(self, digest, width, fmt):
+        """
+        Return (path, mimetype) of a resized variant, generating it on first use.
+        When the variant cannot be made (no Pillow, or an original Pillow cannot
+        decode) the original is returned with its own type instead; the
+        mimetype is None if the original is not an image at all.
+        """
+        original = self.original_path(digest)
+        if not can_produce(fmt) or width not in COVER_CONFIG['widths']:
+            return original, sniff_mimetype(original)
+
+        pil_format, mimetype = FORMATS[fmt]
+        path = self._path('variants', digest[:2], f"{digest}-{width}.{fmt}")
+        if os.path.isfile(path):
+            return path, mimetype
+
+        try:
+            with open(original, 'rb') as handle:
+                image = Image.open(handle)
+                image.load()
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            if image.width > width:
+                height = max(1, round(image.height * width / image.width))
+                image = image.resize((width, height), Image.LANCZOS)
+
+            buffer = BytesIO()
+            image.save(buffer, pil_format, quality=COVER_CONFIG['quality'])
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            # Truncated or not an image (UnidentifiedImageError is an OSError)
+            current_app.logger.warning(f"Could not resize cover {digest}: {e}")
+            return original, sniff_mimetype(original)
+        with _write_lock:
+            if not os.path.isfile(path):
+                self._write_atomic(path, buffer.getvalue())
+        return path, mimetype
+
+
+def get_cover_store():
+    """Cover store for the current app, rooted in the configured (or instance) directory"""
+    root = COVER_CONFIG['cache_dir'] or os.path.join(current_app.instance_path, 'covers')
+    return CoverStore(root, COVER_CONFIG['source_dir'])
@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+from flask import current_app
+from markupsafe import Markup
+from app.config import FRAGMENT_CACHE
+
+
+def slot(name):
+    """Placeholder left in a cached fragment where a smaller fragment is spliced in"""
+    return Markup(f'<!--slot:{name}-->')
+
+
+class FragmentCache:
+    """
+    Thread-safe LRU cache of rendered HTML fragments.
+
+    Keys carry everything the fragment depends on (book id plus revision or
+    availability), so entries never need explicit invalidation - a changed
+    book simply asks for a new key and the stale one ages out.
+    """
+
+    def __init__(self, max_entries=2000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        """The cached fragment for `key`, or None"""
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return html
+
+    def get_or_render(self, key, template_name, make_context):
+        """
+        Return the cached fragment for `key`. On a miss, `make_context()` is
+        called and `template_name` rendered with the dict it returns. Fragments
+        are rendered without context processors, so they must only depend on
+        what is passed in.
+        """
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+
+        html = Markup(current_app.jinja_env.get_template(template_name).render(**make_context()))
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def assemble(html, **slots):
+    """Splice smaller fragments into the named slots of a cached fragment"""
+    for name, fragment in slots.items():
+        html = html.replace(slot(name), fragment)
+    return Markup(html)
+
+
+fragment_cache = FragmentCache(FRAGMENT_CACHE['max_entries'])
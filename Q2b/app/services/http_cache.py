@@ -0,0 +1,72 @@
+import hashlib
+from flask import request, make_response, session
+from flask_login import current_user
+from app.config import HTTP_CACHE
+
+
+def viewer_key():
+    """
+    Identify who the page is rendered for. Pages include the user's name and
+    role-dependent buttons, so validators must differ per viewer.
+    """
+    if current_user.is_authenticated:
+        return f"user:{current_user.get_id()}:{int(bool(current_user.is_admin))}"
+    return 'anon'
+
+
+def make_etag(*parts):
+    """Build a strong ETag value from the given parts"""
+    raw = '|'.join(str(part) for part in parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def cache_control_value():
+    """Cache-Control for HTML pages: shared caches only for anonymous viewers"""
+    if current_user.is_authenticated:
+        return 'private, no-cache'
+    return f"public, max-age={HTTP_CACHE['page_max_age']}, must-revalidate"
+
+
+def is_not_modified(etag, last_modified=None):
+    """
+    Check the request's If-None-Match / If-Modified-Since headers against the
+    current validators, before doing any rendering work.
+    """
+    if request.if_none_match:
+        # Weak comparison, as RFC 7232 requires for If-None-Match (compressed pages carry weak tags)
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+
+def apply_validators(response, etag, last_modified=None):
+    """Attach ETag, Last-Modified, Cache-Control and Vary headers to a response"""
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = cache_control_value()
+    response.vary.add('Cookie')
+    return response
+
+
+def not_modified_response(etag, last_modified=None):
+    """Empty 304 response carrying the same validators as the full page"""
+    response = make_response('', 304)
+    return apply_validators(response, etag, last_modified)
+
+
+def conditional_page(etag, last_modified, render):
+    """
+    Answer 304 when the client's copy is current; otherwise call `render`
+    and attach validators to the fresh response.
+    """
+    if session.get('_flashes'):
+        # A one-off message is waiting to be shown: always render, never cache
+        response = make_response(render())
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    response = make_response(render())
+    return apply_validators(response, etag, last_modified)
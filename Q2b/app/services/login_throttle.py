@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import deque
+
+from app.config import LOGIN_THROTTLE
+from app.services.metrics import metrics
+
+
+class LoginThrottle:
+    """
+    Counts failed logins per account from each client IP, and per client IP
+    over all accounts, in a sliding time window. Once either reaches its
+    limit, further attempts are refused before any password is hashed, so
+    guessing traffic costs no CPU. Keying the account limit by IP means a
+    stranger cannot lock a member out of their own account. A successful
+    login clears the account's failures from that IP. Counts are per process.
+    """
+
+    # Expired entries are swept once this many accounts/IPs are tracked
+    MAX_TRACKED = 10000
+
+    def __init__(self, max_account_failures=5, max_ip_failures=20, window_seconds=900):
+        self.limits = {'account': max_account_failures, 'ip': max_ip_failures}
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._failures = {}  # (kind, key) -> deque of failure times
+
+    def _recent(self, name, now):
+        # Called with the lock held; drops failures older than the window
+        failures = self._failures.get(name)
+        if failures is None:
+            return 0
+        while failures and failures[0] <= now - self.window_seconds:
+            failures.popleft()
+        if not failures:
+            del self._failures[name]
+            return 0
+        return len(failures)
+
+    @staticmethod
+    def _account(account, ip):
+        return 'account', ((account or '').strip().lower(), ip)
+
+    def _names(self, account, ip):
+        names = [self._account(account, ip)]
+        if ip:
+            names.append(('ip', ip))
+        return names
+
+    def allowed(self, account, ip):
+        """False while the account or the IP is over its failure limit"""
+        now = time.monotonic()
+        with self._lock:
+            for name in self._names(account, ip):
+                if self._recent(name, now) >= self.limits[name[0]]:
+                    metrics.increment(f'login.throttled.{name[0]}')
+                    return False
+        return True
+
+    def failed(self, account, ip):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._failures) > self.MAX_TRACKED:
+                for name in list(self._failures):
+                    self._recent(name, now)
+            for name in self._names(account, ip):
+                self._failures.setdefault(name, deque()).append(now)
+
+    def succeeded(self, account, ip):
+        with self._lock:
+            self._failures.pop(self._account(account, ip), None)
+
+
+login_throttle = LoginThrottle(LOGIN_THROTTLE['max_account_failures'], LOGIN_THROTTLE['max_ip_failures'],
+                               LOGIN_THROTTLE['window_seconds'])
@@ -0,0 +1,80 @@
+import threading
+from collections import defaultdict
+
+from pymongo import monitoring
+
+
+class Metrics:
+    """Small thread-safe registry of counters and gauges exposed on /metrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._gauges = {}
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def add_to_gauge(self, name, amount):
+        with self._lock:
+            self._gauges[name] = self._gauges.get(name, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return {'counters': dict(self._counters), 'gauges': dict(self._gauges)}
+
+
+metrics = Metrics()
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """
+    Records MongoDB connection pool utilization per server address:
+    open and checked-out connections, plus checkout waits and failures.
+    """
+
+    @staticmethod
+    def _name(event, metric):
+        host, port = event.address
+        return f"mongodb.pool.{host}:{port}.{metric}"
+
+    def pool_created(self, event):
+        metrics.set_gauge(self._name(event, 'max_size'), event.options.get('maxPoolSize'))
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        metrics.increment(self._name(event, 'cleared'))
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        metrics.add_to_gauge(self._name(event, 'open'), 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        metrics.add_to_gauge(self._name(event, 'open'), -1)
+
+    def connection_check_out_started(self, event):
+        metrics.increment(self._name(event, 'checkout_started'))
+
+    def connection_check_out_failed(self, event):
+        metrics.increment(self._name(event, f'checkout_failed.{event.reason}'))
+
+    def connection_checked_out(self, event):
+        metrics.add_to_gauge(self._name(event, 'in_use'), 1)
+
+    def connection_checked_in(self, event):
+        metrics.add_to_gauge(self._name(event, 'in_use'), -1)
+
+
+pool_listener = PoolMetricsListener()
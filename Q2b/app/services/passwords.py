@@ -0,0 +1,88 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from app.config import PASSWORDS
+from app.services.metrics import metrics
+
+
+def hash_cost(method):
+    """
+    Strength of a stored Werkzeug hash method, comparable between methods of
+    the same algorithm: (algorithm rank, parameters), or None if unknown.
+    scrypt (memory-hard) ranks above PBKDF2.
+    """
+    try:
+        name, *params = method.split(':')
+        if name == 'scrypt':  # scrypt:<n>:<r>:<p>
+            return 1, tuple(int(param) for param in params)
+        if name == 'pbkdf2':  # pbkdf2:<hash>:<iterations>
+            return 0, (int(params[1]),)
+    except (ValueError, IndexError):
+        pass
+    return None
+
+
+class PasswordHashingBusy(Exception):
+    """Raised when too many password hashes are already queued"""
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords on a small, bounded thread pool. Werkzeug's
+    PBKDF2 and scrypt run in hashlib, which releases the GIL, so at most
+    `workers` cores are spent on hashing however many logins arrive at once.
+    Up to `max_pending` more requests wait their turn; beyond that callers
+    get PasswordHashingBusy straight away instead of queueing without limit.
+    """
+
+    def __init__(self, method, workers=2, max_pending=16, timeout_seconds=10):
+        self.method = method
+        # Prefix Werkzeug stores for this method, with defaults filled in
+        # (e.g. 'scrypt' is stored as 'scrypt:32768:8:1')
+        self._stored_method = generate_password_hash('', method=method).split('$', 1)[0]
+        self.timeout_seconds = timeout_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def _run(self, function, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            metrics.increment('passwords.rejected')
+            raise PasswordHashingBusy()
+
+        future = self._executor.submit(function, *args, **kwargs)
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout_seconds)
+        except TimeoutError:
+            metrics.increment('passwords.timeouts')
+            raise PasswordHashingBusy()
+
+    def hash(self, password):
+        """Hash a password with the configured method"""
+        return self._run(generate_password_hash, password, method=self.method)
+
+    def verify(self, password_hash, password):
+        """Check a password against a stored hash (made with any method)"""
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """
+        True if a stored hash was made with weaker parameters than the
+        configured method. A hash is never replaced by a weaker (or not
+        comparable) one, e.g. scrypt by PBKDF2 or by fewer iterations.
+        """
+        stored_method = (password_hash or '').split('$', 1)[0]
+        if stored_method == self._stored_method:
+            return False
+        current, target = hash_cost(stored_method), hash_cost(self._stored_method)
+        if current is None or target is None:
+            return False
+        if current[0] != target[0]:
+            return target[0] > current[0]
+        return all(new >= old for new, old in zip(target[1], current[1]))
+
+
+password_hasher = PasswordHasher(PASSWORDS['method'], PASSWORDS['workers'], PASSWORDS['max_pending'],
+                                 PASSWORDS['timeout_seconds'])
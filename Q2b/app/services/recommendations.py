@@ -0,0 +1,179 @@
+import heapq
+import math
+import re
+
+try:
+    # Optional: vectorized similarity for large catalogs (sparse features and
+    # borrowers, dense scores only for one batch of books at a time)
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+from app.config import RECOMMENDATIONS
+
+
+def normalize_author(name):
+    """'J.R.R. Tolkien ' and 'j r r tolkien' become the same token"""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', (name or '').lower()).split())
+
+
+def book_features(book):
+    """
+    Weighted feature tokens of a raw book document: its genres, category and
+    normalized authors.
+
+    Returns:
+        Dict of token -> weight
+    """
+    weights = RECOMMENDATIONS['weights']
+    features = {}
+    for genre in book.get('genres') or []:
+        features[f"g:{genre.strip().lower()}"] = weights['genre']
+    if book.get('category'):
+        features[f"c:{book['category'].strip().lower()}"] = weights['category']
+    for author in book.get('authors') or []:
+        author = normalize_author(author)
+        if author:
+            features[f"a:{author}"] = weights['author']
+    return features
+
+
+def _top_k(pairs, top_k, min_score):
+    return heapq.nlargest(top_k, ((other, score) for other, score in pairs if score >= min_score),
+                          key=lambda pair: pair[1])
+
+
+def _normalized_rows(rows, cols, values, shape):
+    """Sparse CSR float32 matrix with every non-empty row scaled to unit length"""
+    matrix = sparse.csr_matrix((np.asarray(values, dtype=np.float32), (rows, cols)), shape=shape)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return (sparse.diags(1 / norms) @ matrix).astype(np.float32).tocsr()
+
+
+def _feature_matrix(feature_sets):
+    """Row-normalized sparse (books x tokens) matrix of the weighted features"""
+    vocabulary = {}
+    rows, cols, values = [], [], []
+    for row, features in enumerate(feature_sets):
+        for token, weight in features.items():
+            rows.append(row)
+            cols.append(vocabulary.setdefault(token, len(vocabulary)))
+            values.append(weight)
+    return _normalized_rows(rows, cols, values, (len(feature_sets), max(len(vocabulary), 1)))
+
+
+def _borrower_matrix(book_ids, borrowers):
+    """Row-normalized sparse (books x members) matrix of who borrowed what"""
+    members = {}
+    rows, cols = [], []
+    for row, book_id in enumerate(book_ids):
+        for member in borrowers.get(book_id, ()):
+            rows.append(row)
+            cols.append(members.setdefault(member, len(members)))
+    return _normalized_rows(rows, cols, [1] * len(rows), (len(book_ids), max(len(members), 1)))
+
+
+def _compute_numpy(book_ids, feature_sets, borrowers, top_k, co_weight, min_score, batch_size):
+    content = _feature_matrix(feature_sets)
+    loans = _borrower_matrix(book_ids, borrowers) if borrowers else None
+    content_t = content.T.tocsr()
+    loans_t = loans.T.tocsr() if loans is not None else None
+    count = len(book_ids)
+    k = min(top_k, count - 1)
+
+    results = {}
+    for start in range(0, count, batch_size):
+        stop = min(start + batch_size, count)
+        # Cosine similarity of this batch of books against the whole catalog;
+        # only this (batch x books) block is ever dense
+        scores = (content[start:stop] @ content_t).toarray()
+        if loans is not None:
+            scores = (1 - co_weight) * scores + co_weight * (loans[start:stop] @ loans_t).toarray()
+        scores[np.arange(stop - start), np.arange(start, stop)] = -1  # never recommend a book to itself
+
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        for offset, candidates in enumerate(best):
+            row = scores[offset]
+            ranked = sorted(candidates, key=lambda col: -row[col])
+            results[book_ids[start + offset]] = [(book_ids[col], float(row[col]))
+                                                 for col in ranked if row[col] >= min_score]
+    return results
+
+
+def _cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    dot = sum(weight * b[token] for token, weight in a.items() if token in b)
+    if not dot:
+        return 0.0
+    return dot / (math.sqrt(sum(w * w for w in a.values())) * math.sqrt(sum(w * w for w in b.values())))
+
+
+def _co_borrow(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / math.sqrt(len(a) * len(b))
+
+
+def _compute_python(book_ids, feature_sets, borrowers, top_k, co_weight, min_score):
+    results = {}
+    for i, book_id in enumerate(book_ids):
+        pairs = []
+        for j, other_id in enumerate(book_ids):
+            if i == j:
+                continue
+            score = _cosine(feature_sets[i], feature_sets[j])
+            if borrowers:
+                score = (1 - co_weight) * score + co_weight * _co_borrow(
+                    borrowers.get(book_id, set()), borrowers.get(other_id, set()))
+            pairs.append((other_id, score))
+        results[book_id] = _top_k(pairs, top_k, min_score)
+    return results
+
+
+def compute_similar(books, borrowers=None, top_k=None):
+    """
+    Top-k most similar books for every book: cosine similarity of weighted
+    genre/category/author features, optionally blended with co-borrowing
+    (cosine over the sets of members who borrowed each book).
+
+    Args:
+        books: Raw book documents with _id, genres, category and authors
+        borrowers: Optional dict of book id -> set of member ids
+        top_k: Neighbours per book (defaults to RECOMMENDATIONS['top_k'])
+
+    Returns:
+        Dict of book id -> list of (other book id, score), best first
+    """
+    top_k = top_k or RECOMMENDATIONS['top_k']
+    book_ids = [book['_id'] for book in books]
+    if len(book_ids) < 2:
+        return {book_id: [] for book_id in book_ids}
+
+    feature_sets = [book_features(book) for book in books]
+    co_weight = RECOMMENDATIONS['co_borrow_weight'] if borrowers else 0
+    if np is not None:
+        return _compute_numpy(book_ids, feature_sets, borrowers, top_k, co_weight,
+                              RECOMMENDATIONS['min_score'], RECOMMENDATIONS['batch_size'])
+    return _compute_python(book_ids, feature_sets, borrowers, top_k, co_weight, RECOMMENDATIONS['min_score'])
+
+
+def similarities_to(book, others):
+    """
+    Content similarity of one book against a list of others (used when a
+    book is added, before it has any loans).
+
+    Returns:
+        List of (other book id, score) in the order of `others`
+    """
+    target = book_features(book)
+    feature_sets = [book_features(other) for other in others]
+    if not feature_sets:
+        return []
+    if np is not None:
+        matrix = _feature_matrix([target] + feature_sets)
+        scores = (matrix[1:] @ matrix[0].T).toarray().ravel()
+        return [(other['_id'], float(score)) for other, score in zip(others, scores)]
+    return [(other['_id'], _cosine(target, features)) for other, features in zip(others, feature_sets)]
@@ -0,0 +1,133 @@
+import base64
+import json
+from datetime import datetime
+
+try:
+    import orjson  # Optional: faster JSON encoding for the API
+except ImportError:
+    orjson = None
+
+
+def dumps(data):
+    """Encode API data as compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def iso(value):
+    """UTC datetime (stored naive) as an ISO 8601 string"""
+    return value.isoformat(timespec='seconds') + 'Z' if isinstance(value, datetime) else value
+
+
+def encode_cursor(values):
+    """Opaque pagination cursor for the sort key of the last item on a page"""
+    return base64.urlsafe_b64encode(dumps(values)).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Inverse of encode_cursor.
+
+    Raises:
+        ValueError if the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+class Field:
+    """
+    One output field of a schema.
+
+    Args:
+        source: Dotted path of the value in the raw MongoDB document
+        convert: Optional function applied to non-null values
+        compute: Alternatively, a function of the whole raw document
+        requires: Top-level document fields the value needs (defaults to the source's)
+    """
+
+    def __init__(self, source=None, convert=None, compute=None, requires=None):
+        self.source = source
+        self.convert = convert
+        self.compute = compute
+        if requires is None:
+            requires = (source.split('.')[0],) if source else ()
+        self.requires = tuple(requires)
+
+    def getter(self):
+        if self.compute is not None:
+            return self.compute
+
+        path = self.source.split('.')
+        convert = self.convert
+        if len(path) == 1:
+            key = path[0]
+            if convert is None:
+                return lambda doc: doc.get(key)
+
+            def get(doc):
+                value = doc.get(key)
+                return convert(value) if value is not None else None
+            return get
+
+        def get_nested(doc):
+            value = doc
+            for part in path:
+                value = value.get(part) if isinstance(value, dict) else None
+                if value is None:
+                    return None
+            return convert(value) if convert is not None else value
+        return get_nested
+
+
+class Schema:
+    """
+    Declarative serializer for raw MongoDB documents. Clients pick a sparse
+    fieldset; the schema tells the query which fields to project and turns
+    each document into a dict with a function compiled once per fieldset.
+    """
+
+    def __init__(self, fields, default=None):
+        self.fields = fields
+        self.default = tuple(default or fields)
+        self._compiled = {}
+
+    def select(self, requested=None):
+        """
+        Parse a `fields=a,b,c` parameter into a tuple of field names.
+
+        Raises:
+            ValueError for unknown field names
+        """
+        if not requested:
+            return self.default
+        names = tuple(dict.fromkeys(name.strip() for name in requested.split(',') if name.strip()))
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        return names or self.default
+
+    def projection(self, names):
+        """Top-level database fields needed to produce the given output fields"""
+        needed = []
+        for name in names:
+            needed.extend(self.fields[name].requires)
+        return list(dict.fromkeys(needed))
+
+    def serializer(self, names):
+        """Function turning one raw document into a dict of the given fields"""
+        compiled = self._compiled.get(names)
+        if compiled is None:
+            getters = tuple((name, self.fields[name].getter()) for name in names)
+
+            def compiled(doc):
+                return {name: get(doc) for name, get in getters}
+            self._compiled[names] = compiled
+        return compiled
@@ -0,0 +1,211 @@
+import heapq
+import json
+import mmap
+import os
+import struct
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from app.models.read_models import BookView
+
+# File layout (all integers little-endian):
+#   header   magic, number of books, catalog version
+#   entries  one fixed-size record per book, in title order: ObjectId bytes,
+#            offset and length of its JSON fields in the blob, and the
+#            counters that change with borrows
+#   id index entry numbers sorted by ObjectId bytes (binary searched)
+#   blob     JSON of the descriptive fields of every book
+MAGIC = b'SGCAT\x00\x00\x01'
+HEADER = struct.Struct('<8sIq')
+ENTRY = struct.Struct('<12sIIiiIId')
+POSITION = struct.Struct('<I')
+
+# Fields kept in the fixed-size entries; they are also the only ones a worker
+# overrides (per book) when its snapshot refresh finds them changed
+COUNTER_FIELDS = ('available', 'copies', 'revision', 'borrowCount', 'trendingScore')
+DELTA_FIELDS = COUNTER_FIELDS + ('updatedAt',)
+STATIC_FIELDS = ('title', 'authors', 'category', 'genres', 'url', 'description', 'pages', 'updatedAt')
+
+
+def _encode_fields(book):
+    fields = {name: getattr(book, name) for name in STATIC_FIELDS}
+    if fields['updatedAt'] is not None:
+        fields['updatedAt'] = fields['updatedAt'].isoformat()
+    return json.dumps(fields, separators=(',', ':')).encode('utf-8')
+
+
+def write_shared_catalog(path, books, version):
+    """
+    Pack the catalog into a flat file for SharedCatalog. Written to a
+    temporary file and renamed, so readers never see a partial catalog.
+
+    Args:
+        path: File to write
+        books: BookViews
+        version: Catalog version the books were read at
+    """
+    books = sorted(books, key=lambda book: book.title or '')
+    blob = bytearray()
+    entries = bytearray()
+    for book in books:
+        fields = _encode_fields(book)
+        entries += ENTRY.pack(ObjectId(book.id).binary, len(blob), len(fields),
+                              int(book.available or 0), int(book.copies or 0), int(book.revision or 0),
+                              int(book.borrowCount or 0), float(book.trendingScore or 0))
+        blob += fields
+
+    by_id = sorted(range(len(books)), key=lambda number: ObjectId(books[number].id).binary)
+    index = b''.join(POSITION.pack(number) for number in by_id)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as handle:
+        handle.write(HEADER.pack(MAGIC, len(books), int(version or 0)))
+        handle.write(entries)
+        handle.write(index)
+        handle.write(blob)
+    os.replace(tmp_path, path)
+
+
+class SharedCatalog:
+    """
+    Read-only catalog in a memory-mapped file. Mapped once in the master
+    before the server forks, its pages are shared by every worker and never
+    copied, since nothing writes to them (unlike Python objects, whose
+    reference counts dirty the pages they live on). Books are decoded into
+    BookViews on access.
+
+    Each worker keeps only what changed since the file was written: `deltas`
+    holds the counters (availability, popularity) of changed books, and
+    `overlay` holds whole BookViews of books added or edited since, which
+    hide their stale entries, as `removed` hides deleted books.
+    """
+
+    def __init__(self, buffer):
+        magic, self.count, self.version = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise Exception("Not a shared catalog file")
+        self._buffer = buffer
+        self._entries_at = HEADER.size
+        self._index_at = self._entries_at + self.count * ENTRY.size
+        self._blob_at = self._index_at + self.count * POSITION.size
+        # (deltas, overlay, removed, overlay books in title order), swapped
+        # as one tuple so readers never mix two refreshes
+        self._changes = ({}, {}, frozenset(), ())
+
+    @property
+    def deltas(self):
+        """str(id) -> counters that changed"""
+        return self._changes[0]
+
+    @property
+    def overlay(self):
+        """str(id) -> BookView of a book added or edited since the file was written"""
+        return self._changes[1]
+
+    @property
+    def removed(self):
+        """str(id) of books no longer in the catalog"""
+        return self._changes[2]
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as handle:
+            return cls(mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self):
+        _, overlay, removed, _ = self._changes
+        hidden = sum(1 for book_id in overlay if self._find(ObjectId(book_id).binary) is not None)
+        return self.count - hidden - len(removed) + len(overlay)
+
+    def _entry(self, number):
+        return ENTRY.unpack_from(self._buffer, self._entries_at + number * ENTRY.size)
+
+    def _find(self, oid_bytes):
+        # Binary search of the id index
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            number = POSITION.unpack_from(self._buffer, self._index_at + middle * POSITION.size)[0]
+            found = self._entry(number)[0]
+            if found == oid_bytes:
+                return number
+            if found < oid_bytes:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def _book(self, number, deltas):
+        oid_bytes, offset, length, *counters = self._entry(number)
+        start = self._blob_at + offset
+        fields = json.loads(self._buffer[start:start + length])
+        if fields['updatedAt'] is not None:
+            fields['updatedAt'] = datetime.fromisoformat(fields['updatedAt'])
+        fields.update(zip(COUNTER_FIELDS, counters))
+
+        book_id = ObjectId(oid_bytes)
+        fields.update(deltas.get(str(book_id), ()))
+        return BookView.build(book_id, fields)
+
+    def _mapped_books(self, changes):
+        # Entries of the file that are neither replaced nor removed
+        deltas, overlay, removed, _ = changes
+        for number in range(self.count):
+            book_id = str(ObjectId(self._entry(number)[0]))
+            if book_id not in overlay and book_id not in removed:
+                yield self._book(number, deltas)
+
+    def __iter__(self):
+        """Books in title order"""
+        changes = self._changes
+        return heapq.merge(self._mapped_books(changes), changes[3], key=lambda book: book.title or '')
+
+    def get(self, book_id):
+        deltas, overlay, removed, _ = self._changes
+        book_id = str(book_id)
+        if book_id in overlay:
+            return overlay[book_id]
+        if book_id in removed:
+            return None
+        try:
+            oid_bytes = ObjectId(book_id).binary
+        except (InvalidId, TypeError):
+            return None
+        number = self._find(oid_bytes)
+        return None if number is None else self._book(number, deltas)
+
+    def apply(self, books):
+        """
+        Bring the per-worker changes up to date with a fresh read of every
+        book. Books added or edited since the file was written go to the
+        overlay; the mapped pages stay shared however the catalog changes.
+
+        Args:
+            books: BookViews of the whole catalog
+        """
+        deltas, overlay, seen = {}, {}, set()
+        for book in books:
+            number = self._find(ObjectId(book.id).binary)
+            if number is None:
+                overlay[str(book.id)] = book
+                continue
+            seen.add(number)
+            counters = dict(zip(COUNTER_FIELDS, self._entry(number)[3:]))
+            if (book.revision or 0) != counters['revision']:
+                overlay[str(book.id)] = book
+                continue
+            changed = {name: getattr(book, name) for name in DELTA_FIELDS
+                       if name not in counters or getattr(book, name) != counters[name]}
+            # updatedAt moves with every borrow; only keep it with a counter change
+            if set(changed) - {'updatedAt'}:
+                deltas[str(book.id)] = changed
+
+        removed = frozenset()
+        if len(seen) != self.count:
+            removed = frozenset(str(ObjectId(self._entry(number)[0]))
+                                for number in range(self.count) if number not in seen)
+
+        order = tuple(sorted(overlay.values(), key=lambda book: book.title or ''))
+        self._changes = (deltas, overlay, removed, order)
@@ -0,0 +1,51 @@
+# Gunicorn settings for running the app with pre-forked workers. From Q2b:
+#
+#     pip install gunicorn
+#     gunicorn -c gunicorn.conf.py app.app:app
+#
+# The app is loaded once in the master (database seeding, typeahead index,
+# catalog snapshot packed into a memory-mapped file) and every worker is
+# forked from it, so workers start serving at once and share that memory.
+import gc
+import multiprocessing
+import os
+
+os.environ['PREFORK_PRELOAD'] = '1'
+preload_app = True
+
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Threaded workers: each open live-availability (SSE) page holds a thread
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+
+def when_ready(server):
+    # MongoClient is not fork-safe: close the client the master used while
+    # loading the app, so that no worker inherits it (each connects in post_fork)
+    from mongoengine import disconnect
+
+    disconnect()
+
+
+def pre_fork(server, worker):
+    # Keep the collector away from everything the master has loaded: a
+    # collection in a worker would touch, and so copy, those shared pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # A client of the worker's own, created before anything touches the database
+    from mongoengine import connect
+    from app import app
+
+    connect(**app.config['MONGODB_SETTINGS'])
+
+    # Threads are not inherited by fork; each worker watches the change stream itself
+    from app.config import AVAILABILITY_EVENTS
+
+    if AVAILABILITY_EVENTS['source'] == 'change_stream':
+        from app.models.books import Book
+        from app.services.availability_events import watch_availability
+
+        watch_availability(Book._get_collection())
@@ -0,0 +1,133 @@
+"""
+State transitions of the MongoDB circuit breaker, on a fake clock. Run from Q2b:
+
+    python -m unittest discover tests
+"""
+import unittest
+from unittest import mock
+
+from pymongo.errors import PyMongoError
+
+from app.services.circuit_breaker import CircuitBreaker, DatabaseUnavailable
+
+
+class FakeClock:
+    """Stands in for the time module; only moves when told to"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def fail():
+    raise PyMongoError("connection refused")
+
+
+def succeed():
+    return 'ok'
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('app.services.circuit_breaker.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker('test', failure_rate=0.5, min_calls=4, window_seconds=30,
+                                      open_seconds=15, slow_call_seconds=2.0)
+
+    def fail_calls(self, count):
+        for _ in range(count):
+            with self.assertRaises(DatabaseUnavailable):
+                self.breaker.call(fail)
+
+    def trip(self):
+        self.fail_calls(self.breaker.min_calls)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_stays_closed_below_min_calls(self):
+        self.fail_calls(3)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_stays_closed_below_failure_rate(self):
+        for _ in range(3):
+            self.assertEqual(self.breaker.call(succeed), 'ok')
+        self.fail_calls(2)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_opens_at_failure_rate_and_fails_fast(self):
+        self.breaker.call(succeed)
+        self.breaker.call(succeed)
+        self.fail_calls(2)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+        database = mock.Mock()
+        with self.assertRaises(DatabaseUnavailable):
+            self.breaker.call(database)
+        database.assert_not_called()
+
+    def test_slow_calls_count_as_failures(self):
+        def slow():
+            self.clock.advance(3)
+            return 'ok'
+
+        for _ in range(4):
+            self.assertEqual(self.breaker.call(slow), 'ok')
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_other_errors_pass_through_as_successes(self):
+        def invalid():
+            raise ValueError("bad input")
+
+        for _ in range(4):
+            with self.assertRaises(ValueError):
+                self.breaker.call(invalid)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_old_failures_leave_the_window(self):
+        self.fail_calls(3)
+        self.clock.advance(31)
+        self.breaker.call(succeed)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_lets_one_trial_through(self):
+        self.trip()
+        self.clock.advance(14)
+        self.assertFalse(self.breaker.allow_request())
+
+        self.clock.advance(1)
+        self.assertTrue(self.breaker.allow_request())
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        # Everyone else keeps failing fast while the trial is in flight
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_successful_trial_closes(self):
+        self.trip()
+        self.clock.advance(15)
+
+        self.assertEqual(self.breaker.call(succeed), 'ok')
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        # The failures from before the outage no longer count
+        self.fail_calls(3)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_failed_trial_reopens(self):
+        self.trip()
+        self.clock.advance(15)
+
+        self.fail_calls(1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.clock.advance(14)
+        self.assertFalse(self.breaker.allow_request())
+        self.clock.advance(1)
+        self.assertTrue(self.breaker.allow_request())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Borrow/return semantics of the in-memory storage backend. Run from Q2b:
+
+    python -m unittest discover tests
+"""
+import threading
+import unittest
+
+from app.repositories.memory import MemoryRepository
+
+BOOK = {
+    'title': 'The Test Book',
+    'authors': ['A. Author'],
+    'category': 'Adults',
+    'genres': ['Fiction'],
+    'url': '',
+    'description': ['One paragraph.'],
+    'pages': 100,
+    'available': 1,
+    'copies': 1
+}
+
+
+class MemoryRepositoryLoanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.repository = MemoryRepository()
+        self.book = self.repository.create_book(BOOK)
+        self.members = [self.repository.create_user(f'member{number}@example.com', f'Member {number}', 'secret')
+                        for number in range(8)]
+
+    def test_borrow_takes_a_copy_and_return_releases_it(self):
+        loan = self.repository.create_loan(self.members[0], self.book)
+        self.assertEqual(self.repository.get_book(self.book.id).available, 0)
+        self.assertEqual(self.repository.count_active_loans(self.members[0]), 1)
+
+        returned = self.repository.return_loan(loan)
+        self.assertTrue(returned.is_returned)
+        self.assertEqual(self.repository.get_book(self.book.id).available, 1)
+        self.assertEqual(self.repository.count_active_loans(self.members[0]), 0)
+
+    def test_last_copy_is_lent_only_once(self):
+        barrier = threading.Barrier(len(self.members))
+        loans, errors = [], []
+
+        def borrow(member):
+            barrier.wait()
+            try:
+                loans.append(self.repository.create_loan(member, self.book))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=borrow, args=(member,)) for member in self.members]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(loans), 1)
+        self.assertEqual(len(errors), len(self.members) - 1)
+        self.assertEqual(self.repository.get_book(self.book.id).available, 0)
+
+    def test_loan_is_returned_only_once(self):
+        loan = self.repository.create_loan(self.members[0], self.book)
+        barrier = threading.Barrier(4)
+        returns, errors = [], []
+
+        def give_back():
+            barrier.wait()
+            try:
+                returns.append(self.repository.return_loan(loan))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=give_back) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(returns), 1)
+        self.assertEqual(len(errors), 3)
+        self.assertEqual(self.repository.get_book(self.book.id).available, 1)
+
+    def test_member_cannot_borrow_the_same_title_twice(self):
+        book = self.repository.create_book(dict(BOOK, title='Another Book', available=2, copies=2))
+        self.repository.create_loan(self.members[0], book)
+        with self.assertRaisesRegex(Exception, 'already have an unreturned loan'):
+            self.repository.create_loan(self.members[0], book)
+        self.assertEqual(self.repository.get_book(book.id).available, 1)
+
+    def test_only_returned_loans_can_be_deleted(self):
+        loan = self.repository.create_loan(self.members[0], self.book)
+        with self.assertRaises(Exception):
+            self.repository.delete_loan(loan)
+
+        self.repository.delete_loan(self.repository.return_loan(loan))
+        self.assertIsNone(self.repository.get_loan(loan.id))
+
+
+if __name__ == '__main__':
+    unittest.main()
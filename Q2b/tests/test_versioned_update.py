@@ -0,0 +1,141 @@
+"""
+Optimistic concurrency retries of versioned_update, against an in-process
+stand-in for a MongoDB collection. Run from Q2b:
+
+    python -m unittest discover tests
+"""
+import unittest
+
+from bson import ObjectId
+
+from app.config import CONCURRENCY
+from app.models.concurrency import versioned_update, ConcurrentUpdateError
+from app.services.metrics import metrics
+
+
+class FakeCollection:
+    """One stored document; `interfere` lets a 'concurrent writer' bump its version first"""
+
+    def __init__(self, fields):
+        self.stored = dict(fields)
+        self.updates = 0
+        self.interfere = lambda attempt: False
+
+    def update_one(self, query, update, session=None):
+        self.updates += 1
+        if self.interfere(self.updates):
+            self.stored['version'] = (self.stored.get('version') or 0) + 1
+
+        wanted = query['version']
+        current = self.stored.get('version')
+        matches = current in wanted['$in'] if isinstance(wanted, dict) else current == wanted
+        if matches:
+            self.stored.update(update['$set'])
+            self.stored['version'] = (current or 0) + update['$inc']['version']
+        return type('UpdateResult', (), {'modified_count': int(matches)})()
+
+
+class FakeDocument:
+    """The parts of a MongoEngine document versioned_update uses"""
+
+    collection = None
+
+    def __init__(self, **fields):
+        self.id = ObjectId()
+        self.version = fields.pop('version', 0)
+        self.__dict__.update(fields)
+
+    @classmethod
+    def _get_collection(cls):
+        return cls.collection
+
+    def reload(self):
+        self.__dict__.update(self.collection.stored)
+
+    def _clear_changed_fields(self):
+        pass
+
+
+def counter(name):
+    return metrics.snapshot()['counters'].get(name, 0)
+
+
+def renew(document):
+    if document.renewCount >= 2:
+        raise Exception("Maximum renewal limit (2) reached")
+    return {'renewCount': document.renewCount + 1}
+
+
+class VersionedUpdateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.collection = FakeCollection({'renewCount': 0, 'version': 3})
+        FakeDocument.collection = self.collection
+        self.document = FakeDocument(renewCount=0, version=3)
+
+    def test_update_applies_and_bumps_the_version(self):
+        versioned_update(self.document, renew, 'test')
+
+        self.assertEqual(self.collection.updates, 1)
+        self.assertEqual(self.collection.stored, {'renewCount': 1, 'version': 4})
+        self.assertEqual((self.document.renewCount, self.document.version), (1, 4))
+
+    def test_documents_saved_before_versioning_match(self):
+        self.collection.stored['version'] = None
+        self.document.version = None
+
+        versioned_update(self.document, renew, 'test')
+
+        self.assertEqual(self.collection.stored['version'], 1)
+        self.assertEqual(self.document.version, 1)
+
+    def test_conflict_reloads_and_retries(self):
+        # Another request renews the loan just before our first write
+        def concurrent_renewal(attempt):
+            if attempt == 1:
+                self.collection.stored['renewCount'] += 1
+                return True
+            return False
+        self.collection.interfere = concurrent_renewal
+        conflicts = counter('occ.conflicts.test')
+
+        versioned_update(self.document, renew, 'test')
+
+        # The retry re-evaluated the change against the reloaded count
+        self.assertEqual(self.collection.updates, 2)
+        self.assertEqual(self.collection.stored, {'renewCount': 2, 'version': 5})
+        self.assertEqual(self.document.renewCount, 2)
+        self.assertEqual(counter('occ.conflicts.test'), conflicts + 1)
+
+    def test_retry_revalidates_the_change(self):
+        # The concurrent renewal uses up the last one, so the retry must refuse
+        def concurrent_renewals(attempt):
+            self.collection.stored['renewCount'] = 2
+            return True
+        self.collection.interfere = concurrent_renewals
+
+        with self.assertRaisesRegex(Exception, 'Maximum renewal limit'):
+            versioned_update(self.document, renew, 'test')
+        self.assertEqual(self.collection.updates, 1)
+
+    def test_gives_up_after_max_retries(self):
+        self.collection.interfere = lambda attempt: True
+        exhausted = counter('occ.exhausted.test')
+
+        with self.assertRaises(ConcurrentUpdateError):
+            versioned_update(self.document, lambda document: {'note': 'x'}, 'test')
+
+        self.assertEqual(self.collection.updates, CONCURRENCY['max_retries'])
+        self.assertNotIn('note', self.collection.stored)
+        self.assertEqual(counter('occ.exhausted.test'), exhausted + 1)
+
+    def test_invalid_change_writes_nothing(self):
+        self.collection.stored['renewCount'] = self.document.renewCount = 2
+
+        with self.assertRaisesRegex(Exception, 'Maximum renewal limit'):
+            versioned_update(self.document, renew, 'test')
+        self.assertEqual(self.collection.updates, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()